@@ -35,6 +35,15 @@ class BlogPostAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
 
 
+@admin.register(Artist)
+class ArtistAdmin(admin.ModelAdmin):
+    list_display = ('name', 'track_count', 'album_count', 'total_downloads', 'created_at')
+    search_fields = ('name',)
+    prepopulated_fields = {"slug": ("name",)}
+    ordering = ('-track_count',)
+    readonly_fields = ('track_count', 'album_count', 'total_downloads')
+
+
 @admin.register(Album)
 class AlbumAdmin(admin.ModelAdmin):
     list_display = ('title', 'artist', 'genre', 'release_date', 'uploader', 'downloads')
@@ -88,3 +97,8 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
     ordering = ('-created_at',)
     readonly_fields = ('charge_id', 'created_at', 'completed_at', 'response_data')
+
+@admin.register(HomepageSnapshot)
+class HomepageSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('key', 'version', 'built_version', 'built_at')
+    readonly_fields = ('payload', 'version', 'built_version', 'built_at')
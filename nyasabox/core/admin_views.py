@@ -2,12 +2,13 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.contrib.auth.models import User
-from .models import Album, Track, DistributionRequest, DistributionPlatform
+from .models import Album, Track, DistributionRequest, DistributionPlatform, RevenueAggregate
 from .models import BlogPost, BlogCategory
 from django.db.models import Sum, Count, Q  # Add Q import
 from django.utils import timezone
 from datetime import timedelta
 from django import forms  # Add forms import
+from . import ledger, paychangu, perf, rollups
 from django.db import models  # Add models import
 
 # Check if user is peza/superuser
@@ -17,24 +18,46 @@ def is_admin(user):
 @login_required
 @user_passes_test(is_admin)
 def admin_dashboard(request):
-    # Statistics
-    total_users = User.objects.count()
-    total_albums = Album.objects.count()
-    total_tracks = Track.objects.count()
-    total_blogs = BlogPost.objects.count()
-    
-    # Distribution stats
-    distribution_stats = DistributionRequest.objects.aggregate(
-        total_requests=Count('id'),
-        total_revenue=Sum('total_amount'),
-        pending_requests=Count('id', filter=Q(status='pending')),
-        paid_requests=Count('id', filter=Q(status='paid'))
-    )
-    
+    # Totals and trends come from the DailyMetrics rollup (manage.py
+    # rollup_metrics); the live counts are only a fallback before its first run
+    rows = rollups.recent(90)
+    latest = rows[-1] if rows else None
+    if latest:
+        total_users = latest.users_total
+        total_albums = latest.albums_total
+        total_tracks = latest.tracks_total
+        total_blogs = latest.blog_posts_total
+        distribution_stats = {
+            'total_requests': latest.requests_total,
+            'total_revenue': latest.revenue_total,
+            'pending_requests': latest.requests_by_status.get('pending', 0),
+            'paid_requests': latest.requests_by_status.get('paid', 0),
+        }
+    else:
+        total_users = User.objects.count()
+        total_albums = Album.objects.count()
+        total_tracks = Track.objects.count()
+        total_blogs = BlogPost.objects.count()
+        distribution_stats = DistributionRequest.objects.aggregate(
+            total_requests=Count('id'),
+            pending_requests=Count('id', filter=Q(status='pending')),
+            paid_requests=Count('id', filter=Q(status='paid'))
+        )
+        overall = RevenueAggregate.objects.filter(period='all', platform_key=0).first()
+        distribution_stats['total_revenue'] = overall.amount if overall else 0
+
+    last_30 = rows[-30:]
+    trends = {
+        'new_users': sum(row.new_users for row in last_30),
+        'uploads': sum(row.new_albums + row.new_tracks for row in last_30),
+        'downloads': sum(row.downloads or 0 for row in last_30),
+        'revenue': sum(row.revenue for row in last_30),
+    }
+
     # Recent activity
     recent_users = User.objects.order_by('-date_joined')[:5]
-    recent_distributions = DistributionRequest.objects.select_related('artist').order_by('-requested_at')[:5]
-    
+    recent_distributions = DistributionRequest.objects.select_related('artist').annotate(track_count=Count('tracks')).order_by('-requested_at')[:5]
+
     context = {
         'total_users': total_users,
         'total_albums': total_albums,
@@ -43,6 +66,9 @@ def admin_dashboard(request):
         'distribution_stats': distribution_stats,
         'recent_users': recent_users,
         'recent_distributions': recent_distributions,
+        'metrics_updated_at': latest.computed_at if latest else None,
+        'trends': trends,
+        'metrics_series': rollups.series(rows),
     }
     return render(request, 'peza/dashboard.html', context)
 
@@ -144,31 +170,47 @@ def admin_blog_management(request):
 @login_required
 @user_passes_test(is_admin)
 def admin_revenue(request):
-    # Revenue statistics
-    revenue_stats = DistributionRequest.objects.filter(status='paid').aggregate(
-        total_revenue=Sum('total_amount'),
-        total_requests=Count('id')
-    )
-    
-    # Monthly revenue
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    monthly_revenue = DistributionRequest.objects.filter(
-        status='paid',
-        payment_date__gte=thirty_days_ago
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-    
-    # Revenue by platform
-    revenue_by_platform = DistributionPlatform.objects.annotate(
-        total_revenue=Sum('distribution_requests__total_amount', 
-                         filter=Q(distribution_requests__status='paid')),
-        request_count=Count('distribution_requests', 
-                           filter=Q(distribution_requests__status='paid'))
+    # Everything here is read from the ledger's running aggregates (core.ledger)
+    today = timezone.localdate()
+    this_month = today.replace(day=1)
+    last_month = (this_month - timedelta(days=1)).replace(day=1)
+    year_ago = (this_month - timedelta(days=335)).replace(day=1)
+
+    overall = RevenueAggregate.objects.filter(period='all', platform_key=0).first()
+    revenue_stats = {
+        'total_revenue': overall.amount if overall else 0,
+        'total_requests': overall.payments if overall else 0,
+    }
+
+    monthly = ledger.aggregates('month', since=year_ago)
+    by_month = {row.period_start: row.amount for row in monthly}
+    monthly_revenue = by_month.get(this_month, 0)
+    previous_month_revenue = by_month.get(last_month, 0)
+    month_change = (
+        round((monthly_revenue - previous_month_revenue) / previous_month_revenue * 100, 1)
+        if previous_month_revenue else None
     )
-    
+
+    totals = {row.platform_key: row for row in RevenueAggregate.objects.filter(period='all', platform_key__gt=0)}
+    revenue_by_platform = list(DistributionPlatform.objects.filter(Q(pk__in=list(totals)) | Q(is_active=True)))
+    for platform in revenue_by_platform:
+        aggregate = totals.get(platform.pk)
+        platform.total_revenue = aggregate.amount if aggregate else 0
+        platform.request_count = aggregate.payments if aggregate else 0
+    revenue_by_platform.sort(key=lambda platform: platform.total_revenue, reverse=True)
+
+    daily = ledger.aggregates('day', since=today - timedelta(days=29))
+
     context = {
         'revenue_stats': revenue_stats,
         'monthly_revenue': monthly_revenue,
+        'previous_month_revenue': previous_month_revenue,
+        'month_change': month_change,
         'revenue_by_platform': revenue_by_platform,
+        'revenue_series': {
+            'monthly': [{'period': row.period_start.strftime('%b %Y'), 'amount': float(row.amount)} for row in monthly],
+            'daily': [{'period': row.period_start.isoformat(), 'amount': float(row.amount)} for row in daily],
+        },
     }
     return render(request, 'peza/revenue.html', context)
 
@@ -251,4 +293,22 @@ def admin_edit_blog(request, post_id):
     return render(request, 'peza/edit_blog.html', {
         'post': post,
         'categories': categories,
-    })
\ No newline at end of file
+    })
+
+@login_required
+@user_passes_test(is_admin)
+def admin_perf(request):
+    if request.method == 'POST' and request.POST.get('action') == 'reset':
+        perf.reset()
+        messages.success(request, 'Query statistics cleared.')
+        return redirect('admin_perf')
+
+    views, recent = perf.snapshot()
+    max_queries, max_sql_ms, max_repeats = perf.budget_for(None)
+    return render(request, 'peza/perf.html', {
+        'views': views,
+        'recent': recent,
+        'default_budget': {'queries': max_queries, 'sql_ms': max_sql_ms, 'repeats': max_repeats},
+        'monitoring': perf.enabled(),
+        'paychangu': paychangu.metrics(),
+    })
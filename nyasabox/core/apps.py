@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import typeahead
+
+        # Warm lazily in each worker: a thread started at import would not
+        # survive a pre-forking server's fork
+        request_started.connect(typeahead.warm_on_request, dispatch_uid='core.typeahead.warm')
@@ -0,0 +1,333 @@
+"""
+Streaming audio metadata extraction for MP3 and WAV uploads.
+
+Only the bytes that are needed are read: the ID3v2 header and its text frames
+(picture frames are skipped with a seek), the first MPEG frame with its
+Xing/Info or VBRI header, the 128-byte ID3v1 trailer, or the RIFF chunk
+headers of a WAV file. Nothing is decoded, so a multi-megabyte upload costs a
+few kilobytes of I/O.
+"""
+import os
+import struct
+from datetime import timedelta
+from django.utils import timezone
+
+# Bitrates in kbps, indexed by (version is MPEG-1, layer) then bitrate index
+BITRATES = {
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG-1
+    2: [22050, 24000, 16000],  # MPEG-2
+    0: [11025, 12000, 8000],   # MPEG-2.5
+}
+
+ID3_TEXT_FRAMES = {
+    'TIT2': 'title', 'TPE1': 'artist', 'TALB': 'album', 'TCON': 'genre',
+    'TRCK': 'track_number', 'TYER': 'year', 'TDRC': 'year',
+    # ID3v2.2 three-character ids
+    'TT2': 'title', 'TP1': 'artist', 'TAL': 'album', 'TCO': 'genre', 'TRK': 'track_number', 'TYE': 'year',
+}
+RIFF_INFO_TAGS = {b'INAM': 'title', b'IART': 'artist', b'IPRD': 'album', b'IGNR': 'genre', b'ICRD': 'year', b'ITRK': 'track_number'}
+
+# How far past the ID3 tag to look for the first frame sync
+SYNC_SEARCH_BYTES = 64 * 1024
+
+
+class AudioMetadataError(Exception):
+    pass
+
+
+def _synchsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_text(data):
+    if not data:
+        return ''
+    encoding, body = data[0], data[1:]
+    if encoding == 1:
+        text = body.decode('utf-16', errors='replace')
+    elif encoding == 2:
+        text = body.decode('utf-16-be', errors='replace')
+    elif encoding == 3:
+        text = body.decode('utf-8', errors='replace')
+    else:
+        text = body.decode('latin-1', errors='replace')
+    return text.split('\x00')[0].strip()
+
+
+def _read_id3v2(fileobj):
+    """Return ``(tags, audio_start)``; the file is left positioned at audio_start."""
+    fileobj.seek(0)
+    header = fileobj.read(10)
+    if len(header) < 10 or header[:3] != b'ID3':
+        fileobj.seek(0)
+        return {}, 0
+
+    major, flags = header[3], header[5]
+    tag_size = _synchsafe(header[6:10])
+    audio_start = 10 + tag_size + (10 if flags & 0x10 else 0)
+    tags = {}
+    position = 10
+    if flags & 0x40 and major >= 3:
+        # Extended header; its size is synchsafe in v2.4 and plain in v2.3
+        ext = fileobj.read(4)
+        ext_size = _synchsafe(ext) if major == 4 else struct.unpack('>I', ext)[0] + 4
+        position += ext_size
+        fileobj.seek(position)
+
+    id_len, header_len = (3, 6) if major == 2 else (4, 10)
+    while position + header_len <= 10 + tag_size:
+        frame_header = fileobj.read(header_len)
+        if len(frame_header) < header_len or frame_header[0] == 0:
+            break  # padding
+        frame_id = frame_header[:id_len].decode('latin-1', errors='replace')
+        if major == 2:
+            size = int.from_bytes(frame_header[3:6], 'big')
+        elif major == 4:
+            size = _synchsafe(frame_header[4:8])
+        else:
+            size = struct.unpack('>I', frame_header[4:8])[0]
+        position += header_len
+        key = ID3_TEXT_FRAMES.get(frame_id)
+        if key and size and key not in tags:
+            value = _decode_text(fileobj.read(size))
+            if value:
+                tags[key] = value
+        position += size
+        fileobj.seek(position)
+
+    fileobj.seek(audio_start)
+    return tags, audio_start
+
+
+def _read_id3v1(fileobj, file_size):
+    if file_size < 128:
+        return {}
+    fileobj.seek(file_size - 128)
+    data = fileobj.read(128)
+    if data[:3] != b'TAG':
+        return {}
+    fields = {'title': data[3:33], 'artist': data[33:63], 'album': data[63:93], 'year': data[93:97]}
+    tags = {}
+    for key, raw in fields.items():
+        value = raw.split(b'\x00')[0].decode('latin-1', errors='replace').strip()
+        if value:
+            tags[key] = value
+    return tags
+
+
+def _parse_frame_header(data):
+    """Decode a 4-byte MPEG audio frame header, or return None if invalid."""
+    if len(data) < 4 or data[0] != 0xFF or (data[1] & 0xE0) != 0xE0:
+        return None
+    version = (data[1] >> 3) & 0x03
+    layer_bits = (data[1] >> 1) & 0x03
+    bitrate_index = (data[2] >> 4) & 0x0F
+    sample_rate_index = (data[2] >> 2) & 0x03
+    if version == 1 or layer_bits == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    layer = 4 - layer_bits
+    mpeg1 = version == 3
+    bitrate = BITRATES[(mpeg1, layer)][bitrate_index]
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+    padding = (data[2] >> 1) & 0x01
+    mono = ((data[3] >> 6) & 0x03) == 3
+
+    if layer == 1:
+        samples = 384
+        frame_length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or mpeg1) else 576
+        frame_length = samples // 8 * bitrate * 1000 // sample_rate + padding
+    return {
+        'mpeg1': mpeg1,
+        'layer': layer,
+        'bitrate': bitrate,
+        'sample_rate': sample_rate,
+        'samples': samples,
+        'frame_length': frame_length,
+        'channels': 1 if mono else 2,
+    }
+
+
+def _find_first_frame(fileobj, start):
+    fileobj.seek(start)
+    buffer = fileobj.read(SYNC_SEARCH_BYTES)
+    offset = 0
+    while True:
+        offset = buffer.find(b'\xff', offset)
+        if offset == -1 or offset + 4 > len(buffer):
+            return None, None
+        frame = _parse_frame_header(buffer[offset:offset + 4])
+        if frame:
+            # Require the next frame to line up to rule out a false sync
+            next_offset = offset + frame['frame_length']
+            following = buffer[next_offset:next_offset + 4]
+            if len(following) < 4 or _parse_frame_header(following):
+                return start + offset, frame
+        offset += 1
+
+
+def parse_mp3(fileobj, file_size):
+    tags, audio_start = _read_id3v2(fileobj)
+    for key, value in _read_id3v1(fileobj, file_size).items():
+        tags.setdefault(key, value)
+
+    frame_offset, frame = _find_first_frame(fileobj, audio_start)
+    if frame is None:
+        raise AudioMetadataError('No MPEG audio frame found')
+
+    fileobj.seek(frame_offset)
+    first_frame = fileobj.read(max(frame['frame_length'], 64))
+    if frame['mpeg1']:
+        xing_offset = 4 + (17 if frame['channels'] == 1 else 32)
+    else:
+        xing_offset = 4 + (9 if frame['channels'] == 1 else 17)
+
+    audio_bytes = file_size - frame_offset
+    if file_size >= 128:
+        fileobj.seek(file_size - 128)
+        if fileobj.read(3) == b'TAG':
+            audio_bytes -= 128
+
+    frame_count = None
+    marker = first_frame[xing_offset:xing_offset + 4]
+    if marker in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', first_frame[xing_offset + 4:xing_offset + 8])[0]
+        cursor = xing_offset + 8
+        if flags & 0x01:
+            frame_count = struct.unpack('>I', first_frame[cursor:cursor + 4])[0]
+            cursor += 4
+        if flags & 0x02:
+            audio_bytes = struct.unpack('>I', first_frame[cursor:cursor + 4])[0]
+    elif first_frame[36:40] == b'VBRI':
+        audio_bytes, frame_count = struct.unpack('>II', first_frame[46:54])
+
+    if frame_count:
+        duration = frame_count * frame['samples'] / frame['sample_rate']
+        bitrate = round(audio_bytes * 8 / duration / 1000) if duration else frame['bitrate']
+    else:
+        # Constant bitrate: size over rate
+        bitrate = frame['bitrate']
+        duration = audio_bytes * 8 / (bitrate * 1000)
+
+    return {
+        'format': 'mp3',
+        'duration': duration,
+        'bitrate': bitrate,
+        'sample_rate': frame['sample_rate'],
+        'channels': frame['channels'],
+        'tags': tags,
+    }
+
+
+def parse_wav(fileobj, file_size):
+    fileobj.seek(0)
+    header = fileobj.read(12)
+    if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        raise AudioMetadataError('Not a RIFF/WAVE file')
+
+    fmt = None
+    data_size = None
+    tags = {}
+    position = 12
+    while position + 8 <= file_size:
+        fileobj.seek(position)
+        chunk_id, chunk_size = struct.unpack('<4sI', fileobj.read(8))
+        body_start = position + 8
+        if chunk_id == b'fmt ':
+            _, channels, sample_rate, byte_rate, _, _ = struct.unpack('<HHIIHH', fileobj.read(16))
+            fmt = {'channels': channels, 'sample_rate': sample_rate, 'byte_rate': byte_rate}
+        elif chunk_id == b'data':
+            # Streaming writers may leave the size unset; clamp to what is on disk
+            data_size = min(chunk_size, file_size - body_start)
+        elif chunk_id == b'LIST' and fileobj.read(4) == b'INFO':
+            cursor = body_start + 4
+            while cursor + 8 <= body_start + chunk_size:
+                fileobj.seek(cursor)
+                sub_id, sub_size = struct.unpack('<4sI', fileobj.read(8))
+                key = RIFF_INFO_TAGS.get(sub_id)
+                if key:
+                    value = fileobj.read(sub_size).split(b'\x00')[0].decode('latin-1', errors='replace').strip()
+                    if value:
+                        tags[key] = value
+                cursor += 8 + sub_size + (sub_size & 1)
+        position = body_start + chunk_size + (chunk_size & 1)
+
+    if not fmt or data_size is None or not fmt['byte_rate']:
+        raise AudioMetadataError('WAV file is missing fmt or data chunk')
+    return {
+        'format': 'wav',
+        'duration': data_size / fmt['byte_rate'],
+        'bitrate': round(fmt['byte_rate'] * 8 / 1000),
+        'sample_rate': fmt['sample_rate'],
+        'channels': fmt['channels'],
+        'tags': tags,
+    }
+
+
+def extract_metadata(fileobj, file_size, name=''):
+    """
+    Parse an open binary file; dispatches on the magic bytes, not the name.
+
+    Truncated or corrupt headers raise ``AudioMetadataError`` like any other
+    unreadable file, never the ``struct``/indexing errors of the parsers.
+    """
+    fileobj.seek(0)
+    magic = fileobj.read(12)
+    try:
+        if magic[:4] == b'RIFF' and magic[8:12] == b'WAVE':
+            return parse_wav(fileobj, file_size)
+        if magic[:3] == b'ID3' or _parse_frame_header(magic[:4]) or name.lower().endswith('.mp3'):
+            return parse_mp3(fileobj, file_size)
+    except (struct.error, IndexError) as e:
+        raise AudioMetadataError(f'Truncated or corrupt header in {name or "audio file"}: {e}') from e
+    raise AudioMetadataError(f'Unsupported audio format: {name or "unknown"}')
+
+
+def extract_path(path):
+    """Process-pool friendly wrapper: metadata for a file on disk."""
+    with open(path, 'rb') as fileobj:
+        return extract_metadata(fileobj, os.path.getsize(path), path)
+
+
+def metadata_fields(metadata):
+    """Map parsed metadata onto Track field values."""
+    return {
+        'duration': timedelta(seconds=round(metadata['duration'])),
+        'bitrate': metadata['bitrate'],
+        'sample_rate': metadata['sample_rate'],
+        'channels': metadata['channels'],
+        'audio_tags': metadata['tags'],
+        'metadata_extracted_at': timezone.now(),
+    }
+
+
+def fill_track_metadata(track):
+    """
+    Populate a Track's audio fields from its (possibly not yet saved) file.
+
+    Returns True on success; unreadable files leave the track unchanged.
+    """
+    audio = track.audio_file
+    if not audio:
+        return False
+    try:
+        audio.open('rb')
+        try:
+            metadata = extract_metadata(audio, audio.size, audio.name)
+        finally:
+            audio.seek(0)
+    except (AudioMetadataError, OSError, ValueError):
+        return False
+    for field, value in metadata_fields(metadata).items():
+        setattr(track, field, value)
+    return True
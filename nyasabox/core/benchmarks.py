@@ -0,0 +1,214 @@
+"""
+Request benchmarks for the hot pages, run with ``manage.py run_benchmarks``.
+
+Each scenario is a request made through Django's test ``Client`` (the full
+middleware, view and template stack, without a web server), timed serially
+and then under concurrent load from a thread pool. Results are plain dicts
+ready to be written as JSON, and ``check`` compares them with thresholds
+(absolute budgets, and regressions against an earlier results file).
+
+Run it against a database filled by ``manage.py generate_catalog`` so the
+numbers mean something. The run writes to that database (likes, sessions,
+two users), so ``benchmark_users`` removes what it added when it finishes.
+"""
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from .models import Album, Track, recount_likes
+from .perf import recording
+
+BENCHMARK_USERNAME = 'bench-runner'
+BENCHMARK_ADMIN_USERNAME = 'bench-admin'
+
+
+class Scenario:
+    def __init__(self, name, url, method='get', login=False, admin=False):
+        self.name = name
+        self.url = url
+        self.method = method
+        self.admin = admin
+        self.login = login or admin
+
+    def request(self, client):
+        return getattr(client, self.method)(self.url)
+
+
+def _popular(model):
+    return model.objects.order_by('-downloads', 'id').only('slug').first()
+
+
+def default_scenarios():
+    track = _popular(Track)
+    album = _popular(Album)
+    word = track.title.split()[0] if track else 'love'
+    scenarios = [
+        Scenario('index', reverse('index')),
+        Scenario('website', reverse('website')),
+        Scenario('search', f"{reverse('search')}?q={word}"),
+        Scenario('search_typeahead', f"{reverse('search')}?q={word[:3]}&format=json"),
+        Scenario('track_list', reverse('track_list')),
+        Scenario('album_list', reverse('album_list')),
+        Scenario('admin_dashboard', reverse('admin_dashboard'), admin=True),
+        Scenario('admin_revenue', reverse('admin_revenue'), admin=True),
+        Scenario('admin_albums', reverse('admin_albums'), admin=True),
+        Scenario('admin_tracks', reverse('admin_tracks'), admin=True),
+    ]
+    if album:
+        scenarios.append(Scenario('album_detail', reverse('album_detail', kwargs={'slug': album.slug})))
+    if track:
+        scenarios.append(Scenario('track_detail', reverse('track_detail', kwargs={'slug': track.slug})))
+        # Toggles on every call, so it alternates like/unlike
+        scenarios.append(Scenario('like_track', reverse('like_track', kwargs={'slug': track.slug}), method='post', login=True))
+    return scenarios
+
+
+def _benchmark_account(username, **flags):
+    user, _ = User.objects.update_or_create(
+        username=username, defaults={'email': f'{username}@example.com', **flags},
+    )
+    user.set_unusable_password()
+    user.save(update_fields=['password'])
+    return user
+
+
+@contextmanager
+def benchmark_users():
+    """
+    ``(user, admin)`` for the run: a plain account, and a superuser used only
+    by the admin scenarios. Both are deleted afterwards, and the like counts
+    of tracks the plain account left liked are recounted.
+    """
+    user = _benchmark_account(BENCHMARK_USERNAME, is_staff=False, is_superuser=False)
+    admin = _benchmark_account(BENCHMARK_ADMIN_USERNAME, is_staff=True, is_superuser=True)
+    try:
+        yield user, admin
+    finally:
+        liked = list(Track.likes.through.objects.filter(user_id=user.pk).values_list('track_id', flat=True))
+        User.objects.filter(pk__in=[user.pk, admin.pk]).delete()
+        if liked:
+            recount_likes(liked)
+
+
+def _client(scenario, user):
+    # Count a crashing view as a 500 rather than aborting the run
+    client = Client(raise_request_exception=False)
+    if scenario.login:
+        client.force_login(user)
+    return client
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _summary(latencies):
+    return {
+        'mean_ms': round(statistics.fmean(latencies), 2),
+        'p50_ms': round(_percentile(latencies, 0.50), 2),
+        'p95_ms': round(_percentile(latencies, 0.95), 2),
+        'p99_ms': round(_percentile(latencies, 0.99), 2),
+        'max_ms': round(max(latencies), 2),
+    }
+
+
+def _timed(scenario, client):
+    started = time.perf_counter()
+    response = scenario.request(client)
+    return (time.perf_counter() - started) * 1000, response.status_code
+
+
+def run_scenario(scenario, users, iterations=20, warmup=3, concurrency=8, concurrent_requests=100):
+    """Time ``scenario``; ``users`` is the ``(user, admin)`` pair from ``benchmark_users``."""
+    user = users[1] if scenario.admin else users[0]
+    client = _client(scenario, user)
+    for _ in range(warmup):
+        scenario.request(client)
+
+    # Query profile of one request, then serial latency
+    with recording() as recorder:
+        response = scenario.request(client)
+    latencies = []
+    errors = 0
+    for _ in range(iterations):
+        elapsed, status = _timed(scenario, client)
+        latencies.append(elapsed)
+        errors += status >= 500
+
+    result = {
+        'url': scenario.url,
+        'status': response.status_code,
+        'queries': recorder.count,
+        'sql_ms': round(recorder.duration_ms, 2),
+        'serial': _summary(latencies),
+    }
+
+    if concurrency > 1 and concurrent_requests:
+        def worker(count):
+            worker_client = _client(scenario, user)
+            try:
+                return [_timed(scenario, worker_client) for _ in range(count)]
+            finally:
+                worker_client.logout()
+                # Each thread opened its own database connection
+                connections.close_all()
+
+        shares = [concurrent_requests // concurrency + (index < concurrent_requests % concurrency) for index in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = [timing for batch in pool.map(worker, shares) for timing in batch]
+        wall = time.perf_counter() - started
+        result['concurrent'] = dict(
+            _summary([elapsed for elapsed, _ in timings]),
+            workers=concurrency,
+            requests=len(timings),
+            throughput_rps=round(len(timings) / wall, 1),
+        )
+        errors += sum(status >= 500 for _, status in timings)
+    client.logout()
+    result['errors'] = errors
+    return result
+
+
+def check(results, thresholds, baseline=None):
+    """
+    Return a list of threshold failures for ``results``.
+
+    ``thresholds`` maps a scenario name (or ``"default"``) to limits:
+    ``max_queries``, ``max_p95_ms``, ``max_concurrent_p95_ms`` and
+    ``max_regression`` (a fraction: 0.25 fails a p95 25% slower than in
+    ``baseline``, ignoring slowdowns under ``regression_floor_ms``).
+    """
+    failures = []
+    defaults = thresholds.get('default', {})
+    baseline_scenarios = (baseline or {}).get('scenarios', {})
+    for name, result in results['scenarios'].items():
+        limits = dict(defaults, **thresholds.get(name, {}))
+        if result['errors'] or result['status'] >= 400:
+            failures.append(f"{name}: HTTP {result['status']}, {result['errors']} server errors")
+        if 'max_queries' in limits and result['queries'] > limits['max_queries']:
+            failures.append(f"{name}: {result['queries']} queries > {limits['max_queries']}")
+        if 'max_p95_ms' in limits and result['serial']['p95_ms'] > limits['max_p95_ms']:
+            failures.append(f"{name}: p95 {result['serial']['p95_ms']}ms > {limits['max_p95_ms']}ms")
+        concurrent = result.get('concurrent')
+        if concurrent and 'max_concurrent_p95_ms' in limits and concurrent['p95_ms'] > limits['max_concurrent_p95_ms']:
+            failures.append(f"{name}: concurrent p95 {concurrent['p95_ms']}ms > {limits['max_concurrent_p95_ms']}ms")
+        previous = baseline_scenarios.get(name)
+        if previous and 'max_regression' in limits:
+            # A few milliseconds either way on a fast page is noise
+            allowed = max(
+                previous['serial']['p95_ms'] * (1 + limits['max_regression']),
+                previous['serial']['p95_ms'] + limits.get('regression_floor_ms', 5),
+            )
+            if result['serial']['p95_ms'] > allowed:
+                failures.append(
+                    f"{name}: p95 {result['serial']['p95_ms']}ms regressed from {previous['serial']['p95_ms']}ms"
+                )
+            if result['queries'] > previous['queries']:
+                failures.append(f"{name}: {result['queries']} queries, up from {previous['queries']}")
+    return failures
@@ -0,0 +1,83 @@
+"""
+Cached rendering of catalog cards.
+
+Each card fragment is cached under a key built from the template, the
+object's primary key, its ``updated_at`` and the counters shown on cards
+(``downloads``, ``like_count``, ``views``). Saving an object therefore moves
+it to a fresh key on its own, and counter flushes, which bypass ``save()``,
+do too. Albums are touched whenever one of their tracks changes, so album
+cards pick up new track counts the same way, and tracks are touched when
+their album or artist is saved. Code that changes what a card
+shows with ``update()``/``bulk_update()`` (metadata backfills, image
+derivatives) calls ``touch`` to do what ``save()`` would have. A page of
+cards costs one ``get_many`` plus rendering of the misses only.
+
+Card templates must not contain anything user-specific (CSRF tokens, "liked"
+state); the fragments are shared by every visitor.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+COUNTER_FIELDS = ('downloads', 'like_count', 'views')
+
+
+def _timeout():
+    return getattr(settings, 'CARD_CACHE_SECONDS', 3600)
+
+
+def _version():
+    # Bump on deploys that change card markup
+    return getattr(settings, 'CARD_CACHE_VERSION', 1)
+
+
+def card_key(template, obj, extra=None):
+    parts = [template, obj._meta.label_lower, str(obj.pk)]
+    updated_at = getattr(obj, 'updated_at', None)
+    if updated_at is not None:
+        parts.append(f'{updated_at.timestamp():.6f}')
+    parts += [str(getattr(obj, field)) for field in COUNTER_FIELDS if hasattr(obj, field)]
+    if extra:
+        parts += [f'{name}={value}' for name, value in sorted(extra.items())]
+    return 'card:' + ':'.join(parts)
+
+
+def touch(model, pks):
+    """Move the cards of ``model`` rows ``pks`` and of the tracks or albums showing them to new keys."""
+    from .models import Album, Track
+
+    pks = list(pks)
+    if not pks:
+        return
+    now = timezone.now()
+    model.objects.filter(pk__in=pks).update(updated_at=now)
+    if model is Album:
+        # Track cards show the album's cover art
+        Track.objects.filter(album__in=pks).update(updated_at=now)
+    if model is Track:
+        albums = Track.objects.filter(pk__in=pks, album__isnull=False).values('album_id')
+        Album.objects.filter(pk__in=albums).update(updated_at=now)
+
+
+def touch_image(name):
+    """Move the cards showing the stored image ``name`` to new keys."""
+    from .models import Album, Track
+
+    for model in (Album, Track):
+        touch(model, model.objects.filter(cover_art=name).values_list('pk', flat=True))
+
+
+def render_cards(objects, template, request=None, **extra):
+    """Render ``template`` once per object, reusing cached fragments."""
+    objects = list(objects)
+    keys = [card_key(template, obj, extra) for obj in objects]
+    fragments = cache.get_many(keys, version=_version())
+    missing = {}
+    for key, obj in zip(keys, objects):
+        if key not in fragments:
+            context = {obj._meta.model_name: obj, **extra}
+            fragments[key] = missing[key] = render_to_string(template, context, request=request)
+    if missing:
+        cache.set_many(missing, _timeout(), version=_version())
+    return ''.join(fragments[key] for key in keys)
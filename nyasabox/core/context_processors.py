@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from .likes import liked_track_ids
+
+
+def liked_tracks(request):
+    """``liked_track_ids`` for templates, loaded only if a template uses it."""
+    return {'liked_track_ids': SimpleLazyObject(lambda: liked_track_ids(request.user))}
+
+
+def hls_player(request):
+    """The hls.js script URL and its subresource integrity hash for ``base.html``."""
+    return {
+        'hls_js_url': getattr(settings, 'HLS_JS_URL', 'https://cdn.jsdelivr.net/npm/hls.js@1.5.13/dist/hls.min.js'),
+        'hls_js_integrity': getattr(settings, 'HLS_JS_INTEGRITY', ''),
+    }
@@ -0,0 +1,139 @@
+"""
+Write-behind counters for hot columns (track/album downloads, blog views).
+
+Increments are buffered per worker process and written in batches with
+``F()`` updates, so a burst of downloads on one track becomes a single
+``UPDATE ... SET downloads = downloads + N`` instead of one full-row save per
+hit. Requests only add to the buffer; a background thread per process,
+started by the first increment (so it exists in every forked worker),
+flushes it every ``COUNTER_FLUSH_INTERVAL`` seconds, sooner once
+``COUNTER_FLUSH_THRESHOLD`` rows are buffered, and again at interpreter exit.
+A failed flush is logged and its increments are kept for the next one.
+
+Download counts order the homepage's popular sections, so a flush marks the
+homepage snapshot stale at most every ``COUNTER_SNAPSHOT_REFRESH_SECONDS``.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = defaultdict(int)  # (model, field, pk) -> delta
+_wakeup = threading.Event()
+_worker = None
+_worker_pid = None
+_last_snapshot_bump = 0.0
+
+
+def _flush_interval():
+    return getattr(settings, 'COUNTER_FLUSH_INTERVAL', 10)
+
+
+def _flush_threshold():
+    return getattr(settings, 'COUNTER_FLUSH_THRESHOLD', 100)
+
+
+def _run():
+    while True:
+        _wakeup.wait(_flush_interval())
+        _wakeup.clear()
+        # This thread keeps its own connection; drop it if the server closed it
+        close_old_connections()
+        flush()
+
+
+def _ensure_worker():
+    global _worker, _worker_pid
+    with _lock:
+        if _worker is not None and _worker_pid == os.getpid() and _worker.is_alive():
+            return
+        _worker = threading.Thread(target=_run, name='counter-flush', daemon=True)
+        _worker_pid = os.getpid()
+        _worker.start()
+
+
+def increment(model, pk, field, amount=1):
+    """Buffer ``amount`` to be added to ``model.field`` for row ``pk``."""
+    if not pk or not amount:
+        return
+    with _lock:
+        _pending[(model, field, pk)] += amount
+        due = len(_pending) >= _flush_threshold()
+    _ensure_worker()
+    if due:
+        _wakeup.set()
+
+
+def record_download(track):
+    """Count a track download and roll it up into its album and artist totals."""
+    from .models import Album, Artist, Track
+
+    increment(Track, track.pk, 'downloads')
+    increment(Album, track.album_id, 'downloads')
+    increment(Artist, track.artist_ref_id, 'total_downloads')
+
+
+def record_blog_view(post):
+    from .models import BlogPost
+
+    increment(BlogPost, post.pk, 'views')
+
+
+def pending_count():
+    with _lock:
+        return len(_pending)
+
+
+def flush():
+    """Write all buffered increments; returns the number of rows touched (0 on failure)."""
+    global _last_snapshot_bump
+    with _lock:
+        batch = dict(_pending)
+        _pending.clear()
+    if not batch:
+        return 0
+
+    # Group rows sharing the same delta so each group is one UPDATE
+    grouped = defaultdict(list)
+    for (model, field, pk), amount in batch.items():
+        grouped[(model, field, amount)].append(pk)
+
+    from .models import HomepageSnapshot, Track
+
+    refresh_snapshot = (
+        any(model is Track for model, _, _ in grouped)
+        and time.monotonic() - _last_snapshot_bump >= getattr(settings, 'COUNTER_SNAPSHOT_REFRESH_SECONDS', 300)
+    )
+    try:
+        with transaction.atomic():
+            # A stable order keeps concurrent flushes from deadlocking on row locks
+            for (model, field, amount), pks in sorted(
+                grouped.items(), key=lambda item: (item[0][0]._meta.label, item[0][1], item[0][2])
+            ):
+                model.objects.filter(pk__in=sorted(pks)).update(**{field: F(field) + amount})
+            if refresh_snapshot:
+                # Popular-track ordering changed; .update() bypasses the save signals
+                HomepageSnapshot.objects.update(version=F('version') + 1)
+    except Exception:
+        # Put the increments back so they are retried on the next flush
+        with _lock:
+            for key, amount in batch.items():
+                _pending[key] += amount
+        logger.exception("Failed to flush %d buffered counters", len(batch))
+        return 0
+    if refresh_snapshot:
+        _last_snapshot_bump = time.monotonic()
+    return len(batch)
+
+
+@atexit.register
+def _flush_at_exit():
+    flush()
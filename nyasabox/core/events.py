@@ -0,0 +1,111 @@
+"""
+Publish/subscribe for pushing state changes to open browser connections.
+
+Publishers call ``publish(channel, message)`` from ordinary sync code (a
+view, a management command); async views ``subscribe(channel)`` and get an
+``asyncio.Queue`` of the messages published while they listen.
+
+Without ``EVENTS_BROKER_URL`` the broker lives in the process, which is
+enough for ``runserver`` and single-worker deployments. With several
+workers -- or with the webhook and the reconciler publishing from other
+processes -- point it at Redis so every subscriber sees every message.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            # Publishers run in worker threads; queues belong to event loops
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+        return len(subscribers)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[channel].add(entry)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(entry)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class RedisBroker:
+    PREFIX = 'nyasabox:events:'
+
+    def __init__(self, url):
+        import redis
+
+        self.url = url
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        return self._client.publish(self.PREFIX + channel, json.dumps(message))
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        import redis.asyncio
+
+        client = redis.asyncio.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(self.PREFIX + channel)
+        queue = asyncio.Queue()
+
+        async def pump():
+            async for item in pubsub.listen():
+                if item['type'] == 'message':
+                    queue.put_nowait(json.loads(item['data']))
+
+        task = asyncio.create_task(pump())
+        try:
+            yield queue
+        finally:
+            task.cancel()
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+            await client.aclose()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            url = getattr(settings, 'EVENTS_BROKER_URL', '')
+            _broker = RedisBroker(url) if url else LocalBroker()
+        return _broker
+
+
+def publish(channel, message):
+    """Deliver ``message`` to current subscribers; never raises."""
+    try:
+        return broker().publish(channel, message)
+    except Exception as e:
+        # Subscribers still get the state from their final read or polling
+        logger.warning(f"Could not publish to {channel}: {e}")
+        return 0
+
+
+def subscribe(channel):
+    return broker().subscribe(channel)
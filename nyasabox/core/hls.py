@@ -0,0 +1,158 @@
+"""
+HLS packaging for uploaded tracks.
+
+Each track is transcoded once by ffmpeg into AAC renditions at
+``HLS_BITRATES`` and segmented into ``HLS_SEGMENT_SECONDS`` chunks under
+``MEDIA_ROOT/hls/<track id>/``, with a master playlist that lets the player
+switch bitrate as bandwidth changes. New uploads are queued with
+``hls_status='pending'`` and picked up by ``manage.py package_hls``.
+
+A claim moves the track to ``'processing'`` and stamps ``updated_at``; a
+packager that dies mid-run leaves the row there, so claims older than
+``HLS_PROCESSING_LEASE_SECONDS`` are taken over by the next pass. ffmpeg
+writes into ``HLS_WORK_DIR`` and is killed after
+``HLS_FFMPEG_TIMEOUT_SECONDS``; only a finished rendition is moved into
+``MEDIA_ROOT``.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import HomepageSnapshot, Track
+
+logger = logging.getLogger(__name__)
+
+HLS_DIR = 'hls'
+
+
+class PackagingError(Exception):
+    pass
+
+
+def _bitrates():
+    return getattr(settings, 'HLS_BITRATES', [48, 96, 160])
+
+
+def _segment_seconds():
+    return getattr(settings, 'HLS_SEGMENT_SECONDS', 6)
+
+
+def _lease():
+    return timedelta(seconds=getattr(settings, 'HLS_PROCESSING_LEASE_SECONDS', 3600))
+
+
+def claimable():
+    """Tracks waiting for a packager, including abandoned claims."""
+    abandoned = Q(hls_status='processing', updated_at__lt=timezone.now() - _lease())
+    return Track.objects.filter(Q(hls_status='pending') | abandoned)
+
+
+def _bump_snapshot():
+    # The outcome is written with update(), which skips save(); the homepage
+    # snapshot carries hls_url too (card keys move with updated_at)
+    HomepageSnapshot.objects.update(version=F('version') + 1)
+
+
+def _work_root():
+    # Scratch output stays out of the publicly served MEDIA_ROOT
+    return getattr(settings, 'HLS_WORK_DIR', None) or tempfile.gettempdir()
+
+
+def ffmpeg_command(source, output_dir):
+    bitrates = _bitrates()
+    command = [getattr(settings, 'FFMPEG_BINARY', 'ffmpeg'), '-hide_banner', '-loglevel', 'error', '-y', '-i', source]
+    for _ in bitrates:
+        # Only the first audio stream; embedded cover art is ignored
+        command += ['-map', '0:a:0']
+    command += ['-c:a', 'aac', '-ac', '2', '-ar', '44100']
+    for index, bitrate in enumerate(bitrates):
+        command += [f'-b:a:{index}', f'{bitrate}k']
+    command += [
+        '-f', 'hls',
+        '-hls_time', str(_segment_seconds()),
+        '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(output_dir, '%v', 'segment_%03d.ts'),
+        '-master_pl_name', 'master.m3u8',
+        '-var_stream_map', ' '.join(f'a:{index}' for index in range(len(bitrates))),
+        os.path.join(output_dir, '%v', 'index.m3u8'),
+    ]
+    return command
+
+
+def build_rendition(track):
+    """Transcode and segment one track into a scratch directory; returns its path."""
+    work_dir = tempfile.mkdtemp(prefix=f'hls-{track.pk}-', dir=_work_root())
+    try:
+        result = subprocess.run(
+            ffmpeg_command(track.audio_file.path, work_dir), capture_output=True, text=True,
+            timeout=getattr(settings, 'HLS_FFMPEG_TIMEOUT_SECONDS', 1800),
+        )
+    except subprocess.TimeoutExpired as e:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise PackagingError(f'ffmpeg did not finish within {e.timeout} seconds')
+    except OSError:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    if result.returncode != 0:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise PackagingError(result.stderr.strip() or f'ffmpeg exited with {result.returncode}')
+    return work_dir
+
+
+def publish(track_id, work_dir):
+    """Move a finished rendition into MEDIA_ROOT; returns the manifest's storage path."""
+    relative_dir = os.path.join(HLS_DIR, str(track_id))
+    final_dir = os.path.join(settings.MEDIA_ROOT, relative_dir)
+    if os.path.isdir(final_dir):
+        shutil.rmtree(final_dir)
+    os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+    # shutil.move copies when the scratch directory is on another filesystem
+    shutil.move(work_dir, final_dir)
+    return os.path.join(relative_dir, 'master.m3u8').replace(os.sep, '/')
+
+
+def process_track(track_id):
+    """
+    Claim a pending track, package it and record the outcome.
+
+    The outcome is only written while the claim still stands: if the audio
+    was replaced meanwhile, ``Track.save`` has re-queued the track and this
+    run's output is thrown away.
+    """
+    claimed = claimable().filter(pk=track_id).update(hls_status='processing', updated_at=timezone.now())
+    if not claimed:
+        return False
+    track = Track.objects.get(pk=track_id)
+    claim = Track.objects.filter(pk=track_id, hls_status='processing', audio_file=track.audio_file.name)
+    try:
+        work_dir = build_rendition(track)
+    except (PackagingError, OSError) as e:
+        logger.error(f"HLS packaging failed for track {track_id}: {e}")
+        if claim.update(hls_status='failed', updated_at=timezone.now()):
+            _bump_snapshot()
+        return False
+    try:
+        with transaction.atomic():
+            # Holding the row keeps an audio replacement from slipping in between
+            if not claim.select_for_update().exists():
+                logger.info(f"Track {track_id} changed while packaging; HLS output discarded")
+                return False
+            manifest = publish(track_id, work_dir)
+            claim.update(
+                hls_status='ready',
+                hls_manifest=manifest,
+                hls_packaged_at=timezone.now(),
+                updated_at=timezone.now(),
+            )
+    finally:
+        if os.path.isdir(work_dir):
+            shutil.rmtree(work_dir, ignore_errors=True)
+    _bump_snapshot()
+    logger.info(f"Packaged track {track_id} as HLS ({manifest})")
+    return True
@@ -0,0 +1,129 @@
+import json
+from django.core.cache import cache
+from django.db.models import Count, Min
+from django.utils import timezone
+from .models import Album, Artist, Track, HomepageSnapshot
+
+SNAPSHOT_KEY = 'homepage'
+REBUILD_LOCK_KEY = 'homepage:rebuilding'
+REBUILD_LOCK_SECONDS = 60
+
+
+def _file_url(field):
+    return field.url if field else ''
+
+
+def _track_cover_url(track):
+    if track.album and track.album.cover_art:
+        return track.album.cover_art.url
+    return _file_url(track.cover_art)
+
+
+def _serialize_track(track):
+    return {
+        'id': track.id,
+        'slug': track.slug,
+        'title': track.title,
+        'artist': track.artist,
+        'cover_url': _file_url(track.cover_art) or _track_cover_url(track),
+        'duration': track.get_formatted_duration(),
+    }
+
+
+def _serialize_album(album, **extra):
+    data = {
+        'id': album.id,
+        'slug': album.slug,
+        'title': album.title,
+        'artist': album.artist,
+        'cover_url': _file_url(album.cover_art),
+    }
+    data.update(extra)
+    return data
+
+
+def build_homepage_snapshot():
+    """Run the homepage queries once and return a JSON-serializable payload."""
+    latest_albums = Album.objects.order_by('-created_at').annotate(track_count=Count('tracks'))[:8]
+
+    latest_tracks = list(
+        Track.objects.filter(album__isnull=True).select_related('album').order_by('-created_at')[:12]
+    )
+    popular_tracks = list(Track.objects.select_related('album').order_by('-downloads')[:10])
+
+    # Album.downloads is the rolled-up total of its tracks' downloads
+    popular_albums = Album.objects.order_by('-downloads')[:6]
+
+    top_artists_data = list(Artist.objects.filter(track_count__gt=0).order_by('-track_count')[:8])
+
+    # Two bounded queries for all sample tracks instead of one per artist
+    sample_ids = Track.objects.filter(artist_ref__in=top_artists_data).values('artist_ref').annotate(
+        first_id=Min('id')
+    ).values_list('first_id', flat=True)
+    sample_tracks = {
+        track.artist_ref_id: track
+        for track in Track.objects.filter(id__in=list(sample_ids)).select_related('album')
+    }
+
+    top_artists = []
+    for artist in top_artists_data:
+        sample_track = sample_tracks.get(artist.id)
+        top_artists.append({
+            'name': artist.name,
+            'slug': artist.slug,
+            'cover_url': _file_url(artist.cover_art),
+            'track_count': artist.track_count,
+            'total_downloads': artist.total_downloads,
+            'sample_track': _serialize_track(sample_track) if sample_track else None,
+        })
+
+    tracks_data = []
+    for track in latest_tracks + popular_tracks:
+        tracks_data.append({
+            'id': track.id,
+            'title': track.title,
+            'artist': track.artist,
+            'url': track.get_stream_url() if track.audio_file else '',
+            'hls_url': track.get_hls_url(),
+            'cover_image': _track_cover_url(track),
+            'duration': track.get_formatted_duration(),
+        })
+
+    return {
+        'latest_albums': [_serialize_album(album, track_count=album.track_count) for album in latest_albums],
+        'latest_tracks': [_serialize_track(track) for track in latest_tracks],
+        'popular_tracks': [_serialize_track(track) for track in popular_tracks],
+        'popular_albums': [
+            _serialize_album(album, total_downloads=album.downloads) for album in popular_albums
+        ],
+        'top_artists': top_artists,
+        'tracks_json': json.dumps(tracks_data),
+    }
+
+
+def get_homepage_snapshot():
+    """
+    Return the homepage payload with a single lookup when the snapshot is fresh.
+
+    Track/Album signals bump ``HomepageSnapshot.version``; a stale snapshot is
+    rebuilt here by one request at a time, while the others serve the previous
+    payload, and only stored if no write happened while it was being built.
+    """
+    snapshot, _ = HomepageSnapshot.objects.get_or_create(key=SNAPSHOT_KEY)
+    if not snapshot.is_stale():
+        return snapshot.payload
+    # One request rebuilds; the rest keep serving the previous payload
+    if snapshot.payload is not None and not cache.add(REBUILD_LOCK_KEY, 1, REBUILD_LOCK_SECONDS):
+        return snapshot.payload
+
+    version = snapshot.version
+    try:
+        payload = build_homepage_snapshot()
+        HomepageSnapshot.objects.filter(pk=snapshot.pk, version=version).update(
+            payload=payload,
+            built_version=version,
+            built_at=timezone.now(),
+        )
+    finally:
+        cache.delete(REBUILD_LOCK_KEY)
+    return payload
@@ -0,0 +1,185 @@
+"""
+Responsive derivatives for uploaded cover art and profile pictures.
+
+Every source image gets resized copies at ``IMAGE_DERIVATIVE_WIDTHS`` in WebP
+and, when Pillow was built with it, AVIF. Derivatives live under
+``derivatives/<original name without extension>/<width>.<ext>`` so their URLs
+can be computed from the original's name without a database lookup; the
+``responsive_img`` template tag turns them into ``srcset`` candidates. An
+image narrower than the largest width also gets a copy at its own width, so
+the full resolution stays on offer.
+
+Saves only queue the work: ``queue_derivatives`` hands the name to a
+background thread in the saving process once the transaction commits, so an
+upload request never waits on resizing. ``manage.py
+generate_image_derivatives`` backfills anything a restart dropped.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, close_old_connections, transaction
+from PIL import Image, ImageOps, features
+from . import cards
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_DIR = 'derivatives'
+
+
+def derivative_widths():
+    return getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', [160, 320, 640])
+
+
+def derivative_formats():
+    formats = [('webp', 'WEBP')]
+    if features.check('avif'):
+        formats.insert(0, ('avif', 'AVIF'))
+    return formats
+
+
+def derivative_name(name, width, extension):
+    base, _ = os.path.splitext(name)
+    return f'{DERIVATIVE_DIR}/{base}/{width}.{extension}'
+
+
+def _manifest_name(name):
+    base, _ = os.path.splitext(name)
+    return f'{DERIVATIVE_DIR}/{base}/widths.txt'
+
+
+# Original name -> (widths, or None when there was no manifest, time checked),
+# least recently used first. Misses are only trusted for a short while.
+_known = OrderedDict()
+_known_lock = threading.Lock()
+
+
+def _remember(name, widths):
+    with _known_lock:
+        _known[name] = (widths, time.monotonic())
+        _known.move_to_end(name)
+        while len(_known) > getattr(settings, 'IMAGE_KNOWN_MAX_ENTRIES', 10000):
+            _known.popitem(last=False)
+
+
+def _recall(name):
+    """``(found, widths)`` from the memo."""
+    with _known_lock:
+        entry = _known.get(name)
+        if entry is None:
+            return False, None
+        widths, checked_at = entry
+        if widths is None and time.monotonic() - checked_at >= getattr(settings, 'IMAGE_MISSING_RECHECK_SECONDS', 60):
+            del _known[name]
+            return False, None
+        _known.move_to_end(name)
+        return True, widths
+
+
+def available_widths(name):
+    """Widths that exist for ``name``, or None until derivatives are generated."""
+    found, widths = _recall(name)
+    if found:
+        return widths
+    manifest = _manifest_name(name)
+    if not default_storage.exists(manifest):
+        _remember(name, None)
+        return None
+    with default_storage.open(manifest, 'rb') as handle:
+        widths = [int(width) for width in handle.read().decode().split()]
+    _remember(name, widths)
+    return widths
+
+
+def generate_derivatives(name, force=False):
+    """
+    Create every derivative for the stored image ``name``.
+
+    Returns the widths generated. The manifest is written last, so a partial
+    run is never advertised in ``srcset``.
+    """
+    if not name or name.startswith(DERIVATIVE_DIR + '/'):
+        return []
+    if not force:
+        existing = available_widths(name)
+        if existing is not None:
+            return existing
+
+    with default_storage.open(name, 'rb') as handle:
+        image = Image.open(handle)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    widths = []
+    for width in sorted({min(width, image.width) for width in derivative_widths()}):
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for extension, pil_format in derivative_formats():
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, quality=getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 75))
+            target = derivative_name(name, width, extension)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+        widths.append(width)
+
+    manifest = _manifest_name(name)
+    if default_storage.exists(manifest):
+        default_storage.delete(manifest)
+    default_storage.save(manifest, ContentFile(' '.join(str(width) for width in widths).encode()))
+    _remember(name, widths)
+    # Cached cards still hold the plain <img> fallback
+    cards.touch_image(name)
+    return widths
+
+
+def _generate_logged(name):
+    try:
+        return generate_derivatives(name)
+    except (OSError, ValueError, DatabaseError) as e:
+        logger.warning(f"Could not generate derivatives for {name}: {e}")
+        return []
+
+
+def ensure_derivatives(field):
+    """Generate derivatives for an image field, logging instead of raising."""
+    if not field:
+        return []
+    return _generate_logged(field.name)
+
+
+_lock = threading.Lock()
+_executor = None
+_executor_pid = None
+
+
+def _submit(name):
+    global _executor, _executor_pid
+    with _lock:
+        # A pool inherited through fork has no threads; start one per process
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-derivatives')
+            _executor_pid = os.getpid()
+    _executor.submit(_generate_in_background, name)
+
+
+def _generate_in_background(name):
+    # The pool thread keeps its own connection; drop it if the server closed it
+    close_old_connections()
+    _generate_logged(name)
+
+
+def queue_derivatives(field):
+    """Generate derivatives for an image field in the background after commit."""
+    if not field or _recall(field.name)[1] is not None:
+        return
+    name = field.name
+    transaction.on_commit(lambda: _submit(name))
@@ -0,0 +1,142 @@
+"""
+Append-only revenue ledger behind ``/adminxy/revenue/``.
+
+When a payment succeeds, ``post_payment`` (called from
+``core.payments.apply_result``, under that payment's row lock) splits its
+amount across the request's platforms to the cent, appends one
+``RevenueEntry`` per share, and bumps the matching ``RevenueAggregate``
+rows: day, month and all time, for all platforms together and for each
+platform. Entries sum exactly to the payment, so the all-platform
+aggregates reconcile with the successful transactions; ``manage.py
+post_revenue`` backfills payments that predate the ledger and checks that
+they still agree.
+"""
+from datetime import date
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from .models import PaymentTransaction, RevenueAggregate, RevenueEntry
+
+ALL_TIME = date(1970, 1, 1)
+CENT = Decimal('0.01')
+
+
+def allocate(amount, platform_ids):
+    """
+    Split ``amount`` evenly over ``platform_ids`` (sorted), the leftover
+    cents going to the first ones; ``{None: amount}`` with no platforms.
+    """
+    if not platform_ids:
+        return {None: amount}
+    platform_ids = sorted(platform_ids)
+    cents = int((amount / CENT).to_integral_value())
+    share, leftover = divmod(cents, len(platform_ids))
+    return {
+        platform_id: (share + (index < leftover)) * CENT
+        for index, platform_id in enumerate(platform_ids)
+    }
+
+
+def buckets(day):
+    return (('day', day), ('month', day.replace(day=1)), ('all', ALL_TIME))
+
+
+def _bump(period, period_start, platform_id, amount):
+    key = dict(period=period, period_start=period_start, platform_key=platform_id or 0)
+    changes = dict(amount=F('amount') + amount, payments=F('payments') + 1, updated_at=timezone.now())
+    if RevenueAggregate.objects.filter(**key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            RevenueAggregate.objects.create(platform_id=platform_id, amount=amount, payments=1, **key)
+    except IntegrityError:
+        # Another payment created the bucket first
+        RevenueAggregate.objects.filter(**key).update(**changes)
+
+
+def post_payment(payment):
+    """
+    Book a successful ``payment`` once; returns the new entries, or [] if it
+    was already booked. Run it inside the transaction that locks the payment.
+    """
+    if RevenueEntry.objects.filter(charge_id=payment.charge_id).exists():
+        return []
+    booked_on = timezone.localdate(payment.completed_at or payment.created_at)
+    platform_ids = list(payment.distribution_request.platforms.values_list('pk', flat=True))
+    shares = allocate(payment.amount, platform_ids)
+    entries = RevenueEntry.objects.bulk_create([
+        RevenueEntry(
+            payment=payment, charge_id=payment.charge_id, platform_id=platform_id,
+            platform_key=platform_id or 0, amount=amount, currency=payment.currency, booked_on=booked_on,
+        )
+        for platform_id, amount in shares.items()
+    ])
+    for period, period_start in buckets(booked_on):
+        _bump(period, period_start, None, payment.amount)
+        for platform_id, amount in shares.items():
+            if platform_id is not None:
+                _bump(period, period_start, platform_id, amount)
+    return entries
+
+
+def unposted():
+    return PaymentTransaction.objects.filter(status='success').exclude(
+        charge_id__in=RevenueEntry.objects.values('charge_id'),
+    )
+
+
+def backfill(batch_size=500):
+    """Post every successful payment missing from the ledger; returns how many."""
+    posted = 0
+    while True:
+        ids = list(unposted().order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return posted
+        for pk in ids:
+            with transaction.atomic():
+                payment = (
+                    PaymentTransaction.objects.select_for_update()
+                    .select_related('distribution_request').get(pk=pk)
+                )
+                posted += bool(post_payment(payment))
+
+
+def check():
+    """Differences between transactions, entries and aggregates; empty when they reconcile."""
+    problems = []
+    transactions = PaymentTransaction.objects.filter(status='success').aggregate(total=Sum('amount'), count=Count('pk'))
+    entries = RevenueEntry.objects.filter(payment__isnull=False).aggregate(total=Sum('amount'), count=Count('charge_id', distinct=True))
+    if (transactions['total'] or 0) != (entries['total'] or 0) or transactions['count'] != entries['count']:
+        problems.append(
+            f"transactions {transactions['total'] or 0} over {transactions['count']} payments, "
+            f"ledger {entries['total'] or 0} over {entries['count']}"
+        )
+
+    ledger = RevenueEntry.objects.aggregate(total=Sum('amount'), count=Count('charge_id', distinct=True))
+    overall = RevenueAggregate.objects.filter(period='all', platform_key=0).first()
+    aggregated_total = (overall.amount, overall.payments) if overall else (0, 0)
+    if aggregated_total != (ledger['total'] or 0, ledger['count']):
+        problems.append(
+            f"all-time aggregate {aggregated_total[0]} over {aggregated_total[1]} payments, "
+            f"ledger {ledger['total'] or 0} over {ledger['count']}"
+        )
+    by_platform = dict(
+        RevenueEntry.objects.filter(platform__isnull=False).values_list('platform_id').annotate(Sum('amount'))
+    )
+    aggregated = dict(
+        RevenueAggregate.objects.filter(period='all', platform_key__gt=0).values_list('platform_key', 'amount')
+    )
+    for platform_id in by_platform.keys() | aggregated.keys():
+        if by_platform.get(platform_id, 0) != aggregated.get(platform_id, 0):
+            problems.append(
+                f"platform {platform_id}: aggregate {aggregated.get(platform_id, 0)}, ledger {by_platform.get(platform_id, 0)}"
+            )
+    return problems
+
+
+def aggregates(period, since=None, platform_key=0):
+    rows = RevenueAggregate.objects.filter(period=period, platform_key=platform_key)
+    if since:
+        rows = rows.filter(period_start__gte=since)
+    return list(rows.order_by('period_start'))
@@ -0,0 +1,74 @@
+"""
+Track likes: toggling with an atomically maintained ``Track.like_count`` and a
+cached per-user set of liked track ids.
+
+``liked_track_ids(user)`` is one cache read per request, after which "is this
+liked?" is a set lookup for every card on the page. The set is refreshed in
+place when the user toggles a like and dropped whenever ``Track.likes`` is
+changed through the ORM (see ``sync_like_counts`` in ``core.models``).
+
+Those refreshes only reach the process that made them when the default cache
+is per-process (``LocMemCache``, no ``REDIS_URL``), so there the set is kept
+for ``LIKED_TRACKS_LOCAL_CACHE_SECONDS`` only, bounding how long another
+worker can show a stale heart.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def _cache_key(user_id):
+    return f'liked_tracks:{user_id}'
+
+
+def _timeout():
+    backend = settings.CACHES['default']['BACKEND']
+    if backend.endswith(('LocMemCache', 'DummyCache')):
+        return getattr(settings, 'LIKED_TRACKS_LOCAL_CACHE_SECONDS', 5)
+    return getattr(settings, 'LIKED_TRACKS_CACHE_SECONDS', 600)
+
+
+def liked_track_ids(user):
+    if not user.is_authenticated:
+        return frozenset()
+    key = _cache_key(user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(user.liked_tracks.through.objects.filter(user_id=user.pk).values_list('track_id', flat=True))
+        cache.set(key, ids, _timeout())
+    return ids
+
+
+def forget_liked_tracks(user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+
+def _update_cached_set(user_id, track_id, liked):
+    key = _cache_key(user_id)
+    ids = cache.get(key)
+    if ids is not None:
+        cache.set(key, ids | {track_id} if liked else ids - {track_id}, _timeout())
+
+
+def toggle_like(track, user):
+    """Like or unlike ``track``; returns ``(liked, like_count)``."""
+    through = track.likes.through
+    tracks = type(track).objects.filter(pk=track.pk)
+    with transaction.atomic():
+        # Deleting first makes the toggle a single round trip either way
+        removed, _ = through.objects.filter(track_id=track.pk, user_id=user.pk).delete()
+        if removed:
+            liked, delta = False, -removed
+        else:
+            try:
+                with transaction.atomic():
+                    through.objects.create(track_id=track.pk, user_id=user.pk)
+                liked, delta = True, 1
+            except IntegrityError:
+                # A concurrent request liked it first
+                liked, delta = True, 0
+        if delta:
+            tracks.update(like_count=F('like_count') + delta)
+        transaction.on_commit(lambda: _update_cached_set(user.pk, track.pk, liked))
+    return liked, tracks.values_list('like_count', flat=True).first() or 0
@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from core import cards
+from core.audio_meta import AudioMetadataError, extract_path, metadata_fields
+from django.db.models import F
+from core.models import HomepageSnapshot, Track
+
+
+def _extract(job):
+    track_id, path = job
+    try:
+        return track_id, extract_path(path), None
+    except (AudioMetadataError, OSError, ValueError) as e:
+        return track_id, None, str(e)
+
+
+class Command(BaseCommand):
+    help = "Backfill duration, bitrate, sample rate and tags for existing tracks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Re-extract tracks that already have metadata")
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+        parser.add_argument('--batch-size', type=int, default=200, help="Rows written per bulk_update")
+
+    def handle(self, *args, **options):
+        tracks = Track.objects.exclude(audio_file='')
+        if not options['all']:
+            tracks = tracks.filter(metadata_extracted_at__isnull=True)
+
+        jobs = []
+        for track in tracks.only('id', 'audio_file').iterator():
+            try:
+                jobs.append((track.id, track.audio_file.path))
+            except NotImplementedError:
+                self.stderr.write(f"Track {track.id}: storage has no local path, skipped")
+
+        fields = ['duration', 'bitrate', 'sample_rate', 'channels', 'audio_tags', 'metadata_extracted_at']
+        updated = failed = 0
+        batch = []
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            # Parsing reads a few KB per file, so hand out work in chunks
+            for track_id, metadata, error in executor.map(_extract, jobs, chunksize=16):
+                if error:
+                    failed += 1
+                    self.stderr.write(f"Track {track_id}: {error}")
+                    continue
+                track = Track(id=track_id, **metadata_fields(metadata))
+                batch.append(track)
+                if len(batch) >= options['batch_size']:
+                    self.write(batch, fields)
+                    updated += len(batch)
+                    batch = []
+        if batch:
+            self.write(batch, fields)
+            updated += len(batch)
+
+        if updated:
+            # bulk_update skips the save signals that refresh the homepage
+            HomepageSnapshot.objects.update(version=F('version') + 1)
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} tracks, {failed} failed"))
+
+    def write(self, batch, fields):
+        Track.objects.bulk_update(batch, fields)
+        # Cards show the duration; bulk_update does not move their keys
+        cards.touch(Track, [track.id for track in batch])
@@ -0,0 +1,259 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from core.models import (
+    GENRE_CHOICES, Album, Artist, Comment, DistributionPlatform, DistributionRequest, Profile, Track,
+    invalidate_homepage_snapshot, recount_likes,
+)
+from core.search import rebuild_index
+
+# Every generated row is tagged with this prefix (slugs, usernames) so
+# --clear can remove exactly what was generated
+PREFIX = 'bench-'
+
+WORDS = (
+    'moto', 'chikondi', 'lake', 'malawi', 'night', 'sunrise', 'dance', 'mama', 'dziko', 'zomba',
+    'blantyre', 'rhythm', 'fire', 'rain', 'gold', 'heart', 'road', 'home', 'city', 'dream',
+    'soul', 'river', 'shadow', 'light', 'mountain', 'freedom', 'story', 'wave', 'time', 'love',
+)
+
+
+def _title(rng, words=3):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, words))).title()
+
+
+def _skewed(rng, size):
+    # Squaring a uniform draw piles picks onto low indexes: a few very
+    # popular rows and a long tail, like real play and like counts
+    return int(size * rng.random() ** 2)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """Let bulk_create keep the ``created_at`` values we set."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate a synthetic catalog (users, artists, albums, tracks, likes, comments, distributions) for benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20000)
+        parser.add_argument('--artists', type=int, default=5000)
+        parser.add_argument('--albums', type=int, default=20000)
+        parser.add_argument('--tracks', type=int, default=200000)
+        parser.add_argument('--likes', type=int, default=1000000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--distribution-requests', type=int, default=10000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42, help="Same seed, same catalog")
+        parser.add_argument('--clear', action='store_true', help="Delete previously generated rows first")
+        parser.add_argument('--force', action='store_true', help="Allow running with DEBUG off")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError("Refusing to generate synthetic data with DEBUG off; pass --force if you mean it.")
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+
+        if options['clear']:
+            self.clear()
+
+        with explicit_timestamps(User, Artist, Album, Track, Comment, DistributionRequest):
+            user_ids = self.step('users', self.create_users, options['users'])
+            artists = self.step('artists', self.create_artists, options['artists'])
+            album_ids = self.step('albums', self.create_albums, options['albums'], artists, user_ids)
+            track_ids = self.step('tracks', self.create_tracks, options['tracks'], artists, album_ids, user_ids)
+            self.step('likes', self.create_likes, options['likes'], user_ids, track_ids)
+            self.step('comments', self.create_comments, options['comments'], user_ids, album_ids, track_ids)
+            self.step(
+                'distribution requests', self.create_distribution_requests,
+                options['distribution_requests'], user_ids, track_ids,
+            )
+
+        # bulk_create skips the save() and signal paths that maintain the
+        # denormalised columns and the search index, so settle them here
+        self.step('like counts', self.recount_likes, track_ids)
+        self.step('album downloads', self.recount_album_downloads, album_ids)
+        self.step('artist counters', self.recalculate_artists, artists)
+        self.step('search documents', rebuild_index)
+        invalidate_homepage_snapshot(None)
+        self.stdout.write(self.style.SUCCESS("Catalog generated"))
+
+    def step(self, label, function, *args):
+        started = time.perf_counter()
+        result = function(*args)
+        count = result if isinstance(result, int) else len(result)
+        self.stdout.write(f"{label}: {count} in {time.perf_counter() - started:.1f}s")
+        return result
+
+    def past(self, days=730):
+        return self.now - timedelta(seconds=self.rng.randint(0, days * 86400))
+
+    def bulk(self, model, objects, key=None, **kwargs):
+        """
+        bulk_create in batches and return the new primary keys in order.
+
+        MySQL does not return keys from a bulk INSERT, so rows that are needed
+        later are read back through their unique ``key`` column.
+        """
+        pks = []
+        for start in range(0, len(objects), self.batch_size):
+            batch = objects[start:start + self.batch_size]
+            with transaction.atomic():
+                model.objects.bulk_create(batch, **kwargs)
+            if key and any(obj.pk is None for obj in batch):
+                values = [getattr(obj, key) for obj in batch]
+                found = dict(model.objects.filter(**{f'{key}__in': values}).values_list(key, 'pk'))
+                for obj in batch:
+                    obj.pk = found[getattr(obj, key)]
+            pks += [obj.pk for obj in batch]
+        return pks
+
+    def clear(self):
+        started = time.perf_counter()
+        DistributionRequest.objects.filter(payment_reference__startswith=PREFIX).delete()
+        Track.objects.filter(slug__startswith=PREFIX).delete()
+        Album.objects.filter(slug__startswith=PREFIX).delete()
+        Artist.objects.filter(slug__startswith=PREFIX).delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
+        self.stdout.write(f"cleared previous catalog in {time.perf_counter() - started:.1f}s")
+
+    def create_users(self, count):
+        password = make_password(None)
+        users = [
+            User(
+                username=f'{PREFIX}user{number}', email=f'{PREFIX}user{number}@example.com',
+                password=password, date_joined=self.past(),
+            )
+            for number in range(count)
+        ]
+        user_ids = self.bulk(User, users, key='username')
+        self.bulk(Profile, [Profile(user_id=user_id) for user_id in user_ids])
+        return user_ids
+
+    def create_artists(self, count):
+        artists = [
+            Artist(name=f'{_title(self.rng, 2)} {number}', slug=f'{PREFIX}artist-{number}', created_at=self.past())
+            for number in range(count)
+        ]
+        self.bulk(Artist, artists, key='slug')
+        return artists
+
+    def create_albums(self, count, artists, user_ids):
+        genres = [genre for genre, _ in GENRE_CHOICES]
+        albums = []
+        for number in range(count):
+            artist = artists[_skewed(self.rng, len(artists))]
+            created_at = self.past()
+            albums.append(Album(
+                title=_title(self.rng), slug=f'{PREFIX}album-{number}',
+                artist=artist.name, artist_ref_id=artist.pk, genre=self.rng.choice(genres),
+                release_date=created_at.date(), cover_art=f'album_covers/{PREFIX}cover.jpg',
+                description=_title(self.rng, 12), uploader_id=self.rng.choice(user_ids),
+                created_at=created_at,
+            ))
+        return self.bulk(Album, albums, key='slug')
+
+    def create_tracks(self, count, artists, album_ids, user_ids):
+        genres = [genre for genre, _ in GENRE_CHOICES]
+        tracks = []
+        for number in range(count):
+            artist = artists[_skewed(self.rng, len(artists))]
+            # Most tracks belong to an album; the rest are singles
+            album_id = self.rng.choice(album_ids) if album_ids and self.rng.random() < 0.8 else None
+            tracks.append(Track(
+                title=_title(self.rng), slug=f'{PREFIX}track-{number}',
+                album_id=album_id, track_number=self.rng.randint(1, 15) if album_id else None,
+                artist=artist.name, artist_ref_id=artist.pk, genre=self.rng.choice(genres),
+                audio_file=f'tracks/{PREFIX}audio.mp3', cover_art=f'track_covers/{PREFIX}cover.jpg',
+                duration=timedelta(seconds=self.rng.randint(120, 360)),
+                uploader_id=self.rng.choice(user_ids), created_at=self.past(),
+                downloads=_skewed(self.rng, 20000),
+            ))
+        return self.bulk(Track, tracks, key='slug')
+
+    def create_likes(self, count, user_ids, track_ids):
+        through = Track.likes.through
+        pairs = set()
+        while len(pairs) < count and len(pairs) < len(user_ids) * len(track_ids):
+            pairs.add((self.rng.choice(user_ids), track_ids[_skewed(self.rng, len(track_ids))]))
+        likes = [through(user_id=user_id, track_id=track_id) for user_id, track_id in pairs]
+        self.bulk(through, likes, ignore_conflicts=True)
+        return likes
+
+    def recount_likes(self, track_ids):
+        for start in range(0, len(track_ids), self.batch_size):
+            recount_likes(track_ids[start:start + self.batch_size])
+        return track_ids
+
+    def recount_album_downloads(self, album_ids):
+        # An album's downloads are its tracks' downloads (record_download bumps both)
+        totals = Track.objects.filter(album=OuterRef('pk')).values('album').annotate(total=Sum('downloads')).values('total')
+        for start in range(0, len(album_ids), self.batch_size):
+            Album.objects.filter(pk__in=album_ids[start:start + self.batch_size]).update(
+                downloads=Coalesce(Subquery(totals), 0),
+            )
+        return album_ids
+
+    def recalculate_artists(self, artists):
+        for artist in Artist.objects.filter(slug__startswith=PREFIX).iterator():
+            artist.recalculate()
+        return artists
+
+    def create_comments(self, count, user_ids, album_ids, track_ids):
+        comments = []
+        for _ in range(count):
+            on_track = not album_ids or self.rng.random() < 0.7
+            comments.append(Comment(
+                track_id=track_ids[_skewed(self.rng, len(track_ids))] if on_track else None,
+                album_id=None if on_track else album_ids[_skewed(self.rng, len(album_ids))],
+                user_id=self.rng.choice(user_ids), text=_title(self.rng, 15), created_at=self.past(),
+            ))
+        return self.bulk(Comment, comments)
+
+    def create_distribution_requests(self, count, user_ids, track_ids):
+        platforms = list(DistributionPlatform.objects.filter(is_active=True).values_list('pk', flat=True))
+        statuses = [status for status, _ in DistributionRequest.STATUS_CHOICES]
+        requests = []
+        for number in range(count):
+            status = self.rng.choice(statuses)
+            requested_at = self.past(365)
+            requests.append(DistributionRequest(
+                artist_id=self.rng.choice(user_ids), status=status, requested_at=requested_at,
+                total_amount=Decimal(self.rng.choice([5000, 10000, 15000, 25000])),
+                payment_date=requested_at + timedelta(hours=1) if status != 'pending' else None,
+                payment_reference=f'{PREFIX}{number}',
+            ))
+        request_ids = self.bulk(DistributionRequest, requests, key='payment_reference')
+
+        track_links, platform_links = [], []
+        for request_id in request_ids:
+            for track_id in self.rng.sample(track_ids, min(len(track_ids), self.rng.randint(1, 4))):
+                track_links.append(DistributionRequest.tracks.through(distributionrequest_id=request_id, track_id=track_id))
+            for platform_id in self.rng.sample(platforms, min(len(platforms), self.rng.randint(1, 3))):
+                platform_links.append(DistributionRequest.platforms.through(distributionrequest_id=request_id, distributionplatform_id=platform_id))
+        self.bulk(DistributionRequest.tracks.through, track_links, ignore_conflicts=True)
+        self.bulk(DistributionRequest.platforms.through, platform_links, ignore_conflicts=True)
+        return request_ids
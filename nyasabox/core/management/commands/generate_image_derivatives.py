@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from core.images import generate_derivatives
+from core.models import Album, BlogPost, Profile, Track
+
+IMAGE_FIELDS = (
+    (Album, 'cover_art'),
+    (Track, 'cover_art'),
+    (Profile, 'profile_picture'),
+    (BlogPost, 'featured_image'),
+)
+
+
+class Command(BaseCommand):
+    help = "Backfill resized WebP/AVIF derivatives for cover art, profile pictures and blog images"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate existing derivatives")
+        parser.add_argument('--workers', type=int, default=4, help="Concurrent resize threads")
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field in IMAGE_FIELDS:
+            names.update(
+                model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .values_list(field, flat=True).distinct()
+            )
+
+        def generate(name):
+            try:
+                return name, generate_derivatives(name, force=options['force']), None
+            except (OSError, ValueError) as e:
+                return name, None, str(e)
+
+        generated = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for name, widths, error in executor.map(generate, sorted(names)):
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                else:
+                    generated += 1
+        self.stdout.write(self.style.SUCCESS(f"Processed {generated} images, {failed} failed"))
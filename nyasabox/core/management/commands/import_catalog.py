@@ -0,0 +1,350 @@
+import csv
+import hashlib
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from core.audio_meta import AudioMetadataError, extract_path, metadata_fields
+from core.images import ensure_derivatives
+from core.models import (
+    GENRE_CHOICES, Album, Artist, SearchDocument, Track, allocate_slugs, invalidate_homepage_snapshot,
+)
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+# Preferred cover file names in an album directory, before any other image
+COVER_NAMES = ('cover', 'folder', 'front', 'album')
+MANIFEST_COLUMNS = ('path', 'title', 'artist', 'album', 'genre', 'track_number', 'cover', 'release_date')
+
+GENRE_BY_LABEL = {label.lower(): key for key, label in GENRE_CHOICES}
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+
+
+def _inspect(path):
+    """Worker process: content hash and parsed tags for one audio file."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as handle:
+            for block in iter(lambda: handle.read(1024 * 1024), b''):
+                digest.update(block)
+    except OSError as e:
+        return path, None, None, str(e)
+    try:
+        metadata = extract_path(path)
+    except (AudioMetadataError, OSError, ValueError):
+        # Still importable; the title falls back to the file name
+        metadata = None
+    return path, digest.hexdigest(), metadata, None
+
+
+def _genre(value):
+    value = (value or '').strip().lower()
+    if value in GENRE_BY_LABEL:
+        return GENRE_BY_LABEL[value]
+    return value if value in dict(GENRE_CHOICES) else ''
+
+
+def _track_number(value):
+    # "3/12" in ID3 TRCK frames
+    value = str(value or '').split('/')[0].strip()
+    return int(value) if value.isdigit() else None
+
+
+def _normalise(value):
+    """Grouping key for a tag: case, punctuation and spacing ignored."""
+    return ' '.join(PUNCTUATION_RE.sub(' ', value.casefold()).split())
+
+
+def _most_common(values):
+    return Counter(values).most_common(1)[0][0]
+
+
+def _find_cover(directory):
+    images = sorted(name for name in os.listdir(directory) if name.lower().endswith(IMAGE_EXTENSIONS))
+    for preferred in COVER_NAMES:
+        for name in images:
+            if os.path.splitext(name)[0].lower() == preferred:
+                return os.path.join(directory, name)
+    return os.path.join(directory, images[0]) if images else None
+
+
+class Command(BaseCommand):
+    help = "Import a directory tree or CSV manifest of audio and cover files as albums and tracks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="Directory to walk, or a CSV manifest with columns: " + ', '.join(MANIFEST_COLUMNS))
+        parser.add_argument('--uploader', required=True, help="Username that will own the imported albums and tracks")
+        parser.add_argument('--artist', help="Artist for files whose tags and manifest row name none")
+        parser.add_argument('--genre', default='other', help="Genre for albums whose tags and manifest rows name none")
+        parser.add_argument('--workers', type=int, default=None, help="Tag-parsing processes (default: CPU count)")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows per bulk_create")
+        parser.add_argument('--dry-run', action='store_true', help="Parse and report without writing anything")
+
+    def handle(self, *args, **options):
+        try:
+            self.uploader = User.objects.get(username=options['uploader'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['uploader']}")
+        self.batch_size = options['batch_size']
+        self.default_genre = _genre(options['genre']) or 'other'
+
+        source = options['source']
+        if os.path.isdir(source):
+            rows = self.walk(source)
+        elif os.path.isfile(source):
+            rows = self.read_manifest(source)
+        else:
+            raise CommandError(f"{source} is neither a directory nor a file")
+        if not rows:
+            raise CommandError("No audio files found")
+
+        entries, failed = self.inspect(rows, options['workers'], options['artist'])
+        entries, duplicates = self.dedupe(entries)
+        albums = self.group(entries)
+        self.stdout.write(
+            f"{len(entries)} tracks in {len(albums.keys() - {None})} albums to import; "
+            f"{duplicates} duplicates and {failed} unreadable files skipped"
+        )
+        if options['dry_run'] or not entries:
+            return
+
+        self.stored = []
+        try:
+            # One transaction: a failed batch leaves no half-imported albums
+            with transaction.atomic():
+                album_objects = self.create_albums(albums)
+                tracks = self.create_tracks(albums, album_objects)
+        except BaseException:
+            # Nothing was committed, so nothing refers to the copied files
+            for name in self.stored:
+                default_storage.delete(name)
+            raise
+        self.finish(album_objects, tracks)
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(tracks)} tracks into {len(album_objects)} albums"))
+
+    def walk(self, root):
+        """One row per audio file; album and artist default to the folder names (Artist/Album/track.mp3)."""
+        rows = []
+        for directory, _, files in os.walk(root):
+            audio = sorted(name for name in files if name.lower().endswith(AUDIO_EXTENSIONS))
+            if not audio:
+                continue
+            cover = _find_cover(directory)
+            relative = os.path.relpath(directory, root)
+            parts = [] if relative == '.' else relative.split(os.sep)
+            for name in audio:
+                rows.append({
+                    'path': os.path.join(directory, name),
+                    'album': parts[-1] if parts else '',
+                    'artist': parts[-2] if len(parts) > 1 else '',
+                    'cover': cover,
+                    'from_folders': True,
+                })
+        return rows
+
+    def read_manifest(self, path):
+        base = os.path.dirname(os.path.abspath(path))
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            reader = csv.DictReader(handle)
+            if 'path' not in (reader.fieldnames or []):
+                raise CommandError(f"Manifest needs a 'path' column; optional: {', '.join(MANIFEST_COLUMNS[1:])}")
+            rows = []
+            for row in reader:
+                row = {key: (value or '').strip() for key, value in row.items() if key in MANIFEST_COLUMNS}
+                for column in ('path', 'cover'):
+                    if row.get(column):
+                        row[column] = os.path.join(base, row[column])
+                rows.append(row)
+        return rows
+
+    def inspect(self, rows, workers, default_artist):
+        """Hash and parse every file in worker processes; merge tags under the row's own values."""
+        by_path = {row['path']: row for row in rows}
+        entries, failed = [], 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for path, digest, metadata, error in executor.map(_inspect, list(by_path), chunksize=16):
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{path}: {error}")
+                    continue
+                row = by_path[path]
+                tags = (metadata or {}).get('tags', {})
+                # Explicit manifest values win over tags; folder names only fill gaps
+                if row.get('from_folders'):
+                    pick = lambda name: tags.get(name) or row.get(name)
+                else:
+                    pick = lambda name: row.get(name) or tags.get(name)
+                entries.append({
+                    'path': path,
+                    'sha256': digest,
+                    'metadata': metadata,
+                    'title': pick('title') or os.path.splitext(os.path.basename(path))[0],
+                    'artist': pick('artist') or default_artist or '',
+                    'album': pick('album') or '',
+                    'genre': _genre(pick('genre')),
+                    # "01 Intro.mp3" numbers a track when its tags do not
+                    'track_number': _track_number(pick('track_number')) or _track_number(os.path.basename(path)[:3].split(' ')[0]),
+                    'year': tags.get('year', ''),
+                    'release_date': row.get('release_date', ''),
+                    'cover': row.get('cover'),
+                    # Set for files inside an Artist/Album folder of a directory walk
+                    'folder': os.path.dirname(path) if row.get('from_folders') and row.get('album') else None,
+                })
+        missing_artist = [entry['path'] for entry in entries if not entry['artist']]
+        if missing_artist:
+            raise CommandError(f"{len(missing_artist)} files have no artist (first: {missing_artist[0]}); pass --artist")
+        return entries, failed
+
+    def dedupe(self, entries):
+        """Drop files already imported (same SHA-256) and repeats within this import."""
+        digests = list({entry['sha256'] for entry in entries})
+        seen = set()
+        for start in range(0, len(digests), self.batch_size):
+            seen.update(Track.objects.filter(audio_sha256__in=digests[start:start + self.batch_size]).values_list('audio_sha256', flat=True))
+        unique = []
+        for entry in entries:
+            if entry['sha256'] in seen:
+                continue
+            seen.add(entry['sha256'])
+            unique.append(entry)
+        return unique, len(entries) - len(unique)
+
+    def group(self, entries):
+        """
+        Album key -> entries; tracks without an album stay singles under key None.
+
+        Files from a directory walk group by folder, so tags spelled slightly
+        differently within one folder cannot split it into several albums;
+        manifest rows group by their normalised artist and album tags.
+        """
+        albums = {}
+        for entry in entries:
+            if entry['folder']:
+                key = ('folder', entry['folder'])
+            elif entry['album']:
+                key = ('tags', _normalise(entry['artist']), _normalise(entry['album']))
+            else:
+                key = None
+            albums.setdefault(key, []).append(entry)
+        for tracks in albums.values():
+            tracks.sort(key=lambda entry: (entry['track_number'] or 0, entry['path']))
+        return albums
+
+    def store(self, path, prefix):
+        with open(path, 'rb') as handle:
+            name = default_storage.save(f'{prefix}/{os.path.basename(path)}', File(handle))
+        self.stored.append(name)
+        return name
+
+    def insert(self, model, objects, allocate):
+        """
+        bulk_create in batches, re-allocating a batch's slugs once if another
+        writer took one meanwhile. Objects get their primary keys back (read by
+        slug where the backend does not return them).
+        """
+        for start in range(0, len(objects), self.batch_size):
+            batch = objects[start:start + self.batch_size]
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(batch)
+            except IntegrityError:
+                for obj, slug in zip(batch, allocate(model, [obj.title for obj in batch])):
+                    obj.slug = slug
+                with transaction.atomic():
+                    model.objects.bulk_create(batch)
+            if any(obj.pk is None for obj in batch):
+                found = dict(model.objects.filter(slug__in=[obj.slug for obj in batch]).values_list('slug', 'pk'))
+                for obj in batch:
+                    obj.pk = found[obj.slug]
+
+    def create_albums(self, albums):
+        artists = {}
+        album_objects = {}
+        for key, tracks in albums.items():
+            if key is None:
+                continue
+            # The tags most of the album's tracks agree on name it
+            artist_name = _most_common(entry['artist'] for entry in tracks)
+            title = _most_common(entry['album'] for entry in tracks)
+            if artist_name not in artists:
+                artists[artist_name] = Artist.for_name(artist_name)
+            first = tracks[0]
+            cover = next((entry['cover'] for entry in tracks if entry['cover']), None)
+            album_objects[key] = Album(
+                title=title,
+                artist=artist_name,
+                artist_ref=artists[artist_name],
+                genre=next((entry['genre'] for entry in tracks if entry['genre']), self.default_genre),
+                release_date=self.release_date(first),
+                cover_art=self.store(cover, 'album_covers') if cover else '',
+                uploader=self.uploader,
+            )
+        objects = list(album_objects.values())
+        for album, slug in zip(objects, allocate_slugs(Album, [album.title for album in objects], fallback='album')):
+            album.slug = slug
+        self.insert(Album, objects, lambda model, titles: allocate_slugs(model, titles, fallback='album'))
+        self.artists = artists
+        return album_objects
+
+    def release_date(self, entry):
+        for value in (entry['release_date'], entry['year']):
+            try:
+                if len(value) >= 10:
+                    return date.fromisoformat(value[:10])
+                if value[:4].isdigit():
+                    return date(int(value[:4]), 1, 1)
+            except ValueError:
+                continue
+        return date.today()
+
+    def create_tracks(self, albums, album_objects):
+        tracks = []
+        for key, entries in albums.items():
+            album = album_objects.get(key)
+            for entry in entries:
+                artist_name = entry['artist']
+                if artist_name not in self.artists:
+                    self.artists[artist_name] = Artist.for_name(artist_name)
+                track = Track(
+                    title=entry['title'],
+                    album=album,
+                    artist=artist_name,
+                    artist_ref=self.artists[artist_name],
+                    genre=entry['genre'] or (album.genre if album else self.default_genre),
+                    audio_file=self.store(entry['path'], 'tracks'),
+                    cover_art=album.cover_art.name if album else (self.store(entry['cover'], 'track_covers') if entry['cover'] else ''),
+                    track_number=entry['track_number'],
+                    audio_sha256=entry['sha256'],
+                    uploader=self.uploader,
+                )
+                if entry['metadata']:
+                    for field, value in metadata_fields(entry['metadata']).items():
+                        setattr(track, field, value)
+                tracks.append(track)
+        for track, slug in zip(tracks, allocate_slugs(Track, [track.title for track in tracks], fallback='track')):
+            track.slug = slug
+        self.insert(Track, tracks, lambda model, titles: allocate_slugs(model, titles, fallback='track'))
+        return tracks
+
+    def finish(self, album_objects, tracks):
+        """The save() receivers did not run for bulk_create; do their work in bulk."""
+        documents = [SearchDocument.for_object('album', album) for album in album_objects.values()]
+        documents += [SearchDocument.for_object('track', track) for track in tracks]
+        SearchDocument.objects.bulk_create(documents, batch_size=self.batch_size, ignore_conflicts=True)
+
+        for artist in self.artists.values():
+            artist.recalculate()
+        for album in album_objects.values():
+            ensure_derivatives(album.cover_art)
+        for track in tracks:
+            if not track.album_id:
+                ensure_derivatives(track.cover_art)
+        # New tracks are picked up by package_hls, generate_waveforms and
+        # each worker's next typeahead refresh; the homepage rebuilds on demand
+        invalidate_homepage_snapshot(None)
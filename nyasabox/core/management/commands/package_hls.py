@@ -0,0 +1,34 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from core.hls import claimable, process_track
+from core.models import Track
+
+
+class Command(BaseCommand):
+    help = "Package pending tracks into multi-bitrate HLS renditions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Concurrent ffmpeg processes")
+        parser.add_argument('--limit', type=int, default=None, help="Maximum tracks per pass")
+        parser.add_argument('--retry-failed', action='store_true', help="Re-queue tracks that failed before")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new uploads")
+        parser.add_argument('--interval', type=int, default=30, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = Track.objects.filter(hls_status='failed').update(hls_status='pending')
+            self.stdout.write(f"Re-queued {requeued} failed tracks")
+
+        while True:
+            pending = claimable().exclude(audio_file='').order_by('created_at')
+            track_ids = list(pending.values_list('id', flat=True)[:options['limit']])
+            if track_ids:
+                with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+                    results = list(executor.map(process_track, track_ids))
+                self.stdout.write(self.style.SUCCESS(
+                    f"Packaged {sum(results)} of {len(track_ids)} tracks"
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,155 @@
+import hashlib
+import hmac
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+OPERATORS = [
+    {'id': 1, 'name': 'Airtel Money', 'ref_id': 'stub-airtel'},
+    {'id': 2, 'name': 'TNM Mpamba', 'ref_id': 'stub-tnm'},
+]
+
+VERIFY_RE = re.compile(r'^/mobile-money/payments/(?P<charge_id>[^/]+)/verify/?$')
+
+
+class StubPayChangu:
+    """Charges held in memory; each settles ``settle_after`` seconds after it starts."""
+
+    def __init__(self, options):
+        self.latency = options['latency_ms'] / 1000
+        self.jitter = options['jitter_ms'] / 1000
+        self.error_rate = options['error_rate']
+        self.settle_after = options['settle_after']
+        self.outcome = options['outcome']
+        self.webhook = options['webhook']
+        self.rng = random.Random(options['seed'])
+        self.charges = {}
+        self.lock = threading.Lock()
+
+    def delay(self):
+        time.sleep(max(0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+    def settle(self, charge_id):
+        status = self.rng.choice(['success', 'failed', 'cancelled']) if self.outcome == 'random' else self.outcome
+        with self.lock:
+            self.charges[charge_id]['status'] = status
+        if self.webhook:
+            with self.lock:
+                charge = self.charges[charge_id]
+            body = json.dumps({
+                'charge_id': charge_id, 'status': status,
+                'amount': charge.get('amount'), 'currency': 'MWK',
+            }).encode()
+            secret = getattr(settings, 'PAYCHANGU_WEBHOOK_SECRET', '')
+            headers = {'Content-Type': 'application/json'}
+            if secret:
+                headers['Signature'] = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+            try:
+                requests.post(self.webhook, data=body, headers=headers, timeout=10)
+            except requests.RequestException:
+                pass  # the reconciler covers lost webhooks, as in production
+
+    def initialize(self, payload):
+        charge_id = payload.get('charge_id')
+        if not charge_id or not payload.get('mobile'):
+            return 400, {'status': 'failed', 'message': 'charge_id and mobile are required'}
+        with self.lock:
+            if charge_id in self.charges:
+                return 400, {'status': 'failed', 'message': 'Duplicate charge_id'}
+            self.charges[charge_id] = dict(payload, status='pending')
+        timer = threading.Timer(self.settle_after, self.settle, [charge_id])
+        timer.daemon = True
+        timer.start()
+        return 200, {'status': 'success', 'message': 'Payment initiated', 'data': {'charge_id': charge_id, 'status': 'pending'}}
+
+    def verify(self, charge_id):
+        with self.lock:
+            charge = self.charges.get(charge_id)
+        if charge is None:
+            return 404, {'status': 'failed', 'message': 'Charge not found'}
+        message = {'cancelled': 'user_cancelled', 'failed': 'Insufficient balance'}.get(charge['status'], '')
+        return 200, {
+            'status': 'success',
+            'message': 'Payment details fetched',
+            'data': {
+                'charge_id': charge_id, 'status': charge['status'], 'message': message,
+                'amount': charge.get('amount'), 'currency': 'MWK',
+            },
+            'gateway_response': {'status': {'success': charge['status'] == 'success'}},
+        }
+
+
+def handler_for(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+        def log_message(self, format, *args):
+            pass
+
+        def respond(self, status, data):
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def route(self, method):
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            stub.delay()
+            if stub.error_rate and stub.rng.random() < stub.error_rate:
+                return self.respond(503, {'status': 'failed', 'message': 'Service unavailable'})
+            path = self.path.split('?')[0]
+            if method == 'GET' and path.rstrip('/') == '/mobile-money':
+                return self.respond(200, {'status': 'success', 'data': OPERATORS})
+            if method == 'POST' and path.rstrip('/') == '/mobile-money/payments/initialize':
+                try:
+                    payload = json.loads(raw or b'{}')
+                except ValueError:
+                    return self.respond(400, {'status': 'failed', 'message': 'Invalid JSON'})
+                return self.respond(*stub.initialize(payload))
+            match = VERIFY_RE.match(path)
+            if method == 'GET' and match:
+                return self.respond(*stub.verify(match['charge_id']))
+            self.respond(404, {'status': 'failed', 'message': 'Not found'})
+
+        def do_GET(self):
+            self.route('GET')
+
+        def do_POST(self):
+            self.route('POST')
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = "Serve a local stand-in for the PayChangu API (set PAYCHANGU_API_URL to it) for offline load tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency-ms', type=float, default=150, help="Added to every response")
+        parser.add_argument('--jitter-ms', type=float, default=50)
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of calls answered with 503")
+        parser.add_argument('--settle-after', type=float, default=5.0, help="Seconds until a charge leaves pending")
+        parser.add_argument('--outcome', choices=['success', 'failed', 'cancelled', 'random'], default='success')
+        parser.add_argument('--webhook', default='', help="URL to POST a webhook to when a charge settles")
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer((options['host'], options['port']), handler_for(StubPayChangu(options)))
+        server.daemon_threads = True
+        self.stdout.write(f"PayChangu stub on http://{options['host']}:{options['port']} (Ctrl-C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import ledger
+
+
+class Command(BaseCommand):
+    help = "Post successful payments missing from the revenue ledger and check that it reconciles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Only check; post nothing")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            posted = ledger.backfill(options['batch_size'])
+            self.stdout.write(f"Posted {posted} payments")
+        problems = ledger.check()
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError("Revenue ledger does not reconcile")
+        self.stdout.write(self.style.SUCCESS("Revenue ledger reconciles with transactions"))
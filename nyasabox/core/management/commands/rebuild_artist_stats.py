@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from core.models import Album, Artist, Track
+
+
+class Command(BaseCommand):
+    help = "Link tracks/albums to Artist rows and recompute the denormalized artist counters"
+
+    def handle(self, *args, **options):
+        linked = 0
+        for model in (Track, Album):
+            for obj in model.objects.filter(artist_ref__isnull=True).exclude(artist='').only('id', 'artist'):
+                artist = Artist.for_name(obj.artist)
+                model.objects.filter(pk=obj.pk).update(artist_ref=artist)
+                linked += 1
+
+        artists = Artist.objects.all()
+        for artist in artists.iterator():
+            artist.recalculate()
+
+        self.stdout.write(self.style.SUCCESS(f"Linked {linked} rows, recalculated {artists.count()} artists"))
@@ -0,0 +1,33 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core.payments import reconcile
+
+
+class Command(BaseCommand):
+    help = "Verify stale pending PayChangu charges with the API and record their outcome"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running, one pass every PAYCHANGU_RECONCILE_INTERVAL_SECONDS")
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4, help="Concurrent verify calls")
+
+    def handle(self, *args, **options):
+        interval = getattr(settings, 'PAYCHANGU_RECONCILE_INTERVAL_SECONDS', 60)
+        try:
+            while True:
+                # One pass pages through every stale charge exactly once
+                cursor = None
+                while True:
+                    checked, settled, cursor = reconcile(options['batch_size'], options['workers'], after=cursor)
+                    if checked:
+                        self.stdout.write(f"Checked {checked}, settled {settled}")
+                    if cursor is None:
+                        break
+                if not options['loop']:
+                    break
+                close_old_connections()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
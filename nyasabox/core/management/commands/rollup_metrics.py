@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from core.models import DailyMetrics
+from core.rollups import rollup
+
+
+class Command(BaseCommand):
+    help = "Roll up daily site metrics for the admin dashboard (run every few minutes from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Delete every rollup and backfill from the first recorded activity; history is otherwise never rewritten",
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            deleted, _ = DailyMetrics.objects.all().delete()
+            self.stdout.write(f"Deleted {deleted} rollup rows")
+        rows = rollup()
+        final = sum(row.is_final for row in rows)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {final} final days and today's partial row"))
@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+import platform
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from core import benchmarks
+
+BENCHMARK_DIR = os.path.join(settings.BASE_DIR, 'benchmarks')
+
+
+class Command(BaseCommand):
+    help = "Time the hot pages serially and under concurrent load, write the results as JSON and check thresholds"
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help="Scenario names to run (default: all)")
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--concurrency', type=int, default=8, help="Worker threads; 1 skips the load phase")
+        parser.add_argument('--concurrent-requests', type=int, default=100)
+        parser.add_argument('--output', help="Results file (default: benchmarks/results-<timestamp>.json)")
+        parser.add_argument('--thresholds', default=os.path.join(BENCHMARK_DIR, 'thresholds.json'))
+        parser.add_argument('--baseline', help="Earlier results file to check for regressions against")
+        parser.add_argument('--no-check', action='store_true', help="Record results without failing on thresholds")
+        parser.add_argument('--force', action='store_true', help="Allow running with DEBUG off")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError(
+                "Refusing to benchmark with DEBUG off: the run creates users and writes likes. "
+                "Point it at a dedicated benchmark database and pass --force."
+            )
+        scenarios = benchmarks.default_scenarios()
+        if options['scenarios']:
+            unknown = set(options['scenarios']) - {scenario.name for scenario in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+            scenarios = [scenario for scenario in scenarios if scenario.name in options['scenarios']]
+
+        # Query counts are reported below; skip the middleware's per-request warnings
+        logging.getLogger('core.perf').setLevel(logging.ERROR)
+        results = {
+            'started_at': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'database': connection.vendor,
+                'debug': settings.DEBUG,
+                'iterations': options['iterations'],
+                'concurrency': options['concurrency'],
+            },
+            'scenarios': {},
+        }
+        with benchmarks.benchmark_users() as users:
+            for scenario in scenarios:
+                result = benchmarks.run_scenario(
+                    scenario, users,
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    concurrency=options['concurrency'],
+                    concurrent_requests=options['concurrent_requests'],
+                )
+                results['scenarios'][scenario.name] = result
+                concurrent = result.get('concurrent')
+                self.stdout.write(
+                    f"{scenario.name:<30} {result['status']} {result['queries']:>4}q "
+                    f"p50 {result['serial']['p50_ms']:>8.1f}ms p95 {result['serial']['p95_ms']:>8.1f}ms"
+                    + (f"  load p95 {concurrent['p95_ms']:>8.1f}ms {concurrent['throughput_rps']:>7.1f} req/s" if concurrent else '')
+                )
+
+        output = options['output'] or os.path.join(
+            BENCHMARK_DIR, f"results-{timezone.now().strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        with open(output, 'w') as handle:
+            json.dump(results, handle, indent=2)
+        self.stdout.write(f"Results written to {output}")
+
+        if options['no_check']:
+            return
+        thresholds = {}
+        if os.path.exists(options['thresholds']):
+            with open(options['thresholds']) as handle:
+                thresholds = json.load(handle)
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+        failures = benchmarks.check(results, thresholds, baseline)
+        if failures:
+            raise CommandError("Benchmark thresholds exceeded:\n  " + "\n  ".join(failures))
+        self.stdout.write(self.style.SUCCESS("All benchmarks within thresholds"))
@@ -0,0 +1,40 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from core.outbox import OutboxWorker
+
+# How often the long-running worker deletes old sent rows
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox over a persistent SMTP connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Drain the due emails once and exit (for cron)")
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        worker = OutboxWorker(batch_size=options['batch_size'])
+        poll = getattr(settings, 'EMAIL_OUTBOX_POLL_SECONDS', 2)
+        last_purge = 0.0
+        try:
+            while True:
+                sent, failed = worker.run_batch()
+                if sent or failed:
+                    self.stdout.write(f"Sent {sent}, failed {failed}")
+                    continue
+                if options['once']:
+                    break
+                if time.monotonic() - last_purge > PURGE_INTERVAL:
+                    worker.purge()
+                    last_purge = time.monotonic()
+                worker.close_if_idle()
+                # Don't hold a database connection open across idle polls forever
+                close_old_connections()
+                time.sleep(poll)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            worker.close()
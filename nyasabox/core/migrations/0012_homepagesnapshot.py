@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:03
+
+import jsonfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_track_cover_art'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HomepageSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('payload', jsonfield.fields.JSONField(blank=True, help_text='Serialized homepage sections and player payload', null=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('built_version', models.PositiveIntegerField(blank=True, null=True)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.utils.text import slugify
+
+
+def backfill_artists(apps, schema_editor):
+    Artist = apps.get_model('core', 'Artist')
+    Album = apps.get_model('core', 'Album')
+    Track = apps.get_model('core', 'Track')
+
+    # Group the free-text names case-insensitively, keeping the first spelling seen
+    names = {}
+    for model in (Track, Album):
+        for name in model.objects.order_by('id').values_list('artist', flat=True).distinct():
+            name = (name or '').strip()
+            if name:
+                names.setdefault(name.lower(), name)
+
+    used_slugs = set(Artist.objects.values_list('slug', flat=True))
+    for key, name in names.items():
+        base_slug = slugify(name) or 'artist'
+        slug = base_slug
+        counter = 1
+        while slug in used_slugs:
+            slug = f"{base_slug}-{counter}"
+            counter += 1
+        used_slugs.add(slug)
+        artist = Artist.objects.create(name=name, slug=slug)
+
+        tracks = Track.objects.filter(artist__iexact=name)
+        albums = Album.objects.filter(artist__iexact=name)
+        tracks.update(artist_ref=artist)
+        albums.update(artist_ref=artist)
+
+        stats = Track.objects.filter(artist_ref=artist).aggregate(count=Count('id'), downloads=Sum('downloads'))
+        cover = (
+            Album.objects.filter(artist_ref=artist).exclude(cover_art='').order_by('-created_at').values_list('cover_art', flat=True).first()
+            or Track.objects.filter(artist_ref=artist).exclude(cover_art='').order_by('-created_at').values_list('cover_art', flat=True).first()
+            or ''
+        )
+        Artist.objects.filter(pk=artist.pk).update(
+            track_count=stats['count'] or 0,
+            total_downloads=stats['downloads'] or 0,
+            album_count=Album.objects.filter(artist_ref=artist).count(),
+            cover_art=cover,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_homepagesnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Artist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('slug', models.SlugField(max_length=200, unique=True)),
+                ('cover_art', models.ImageField(blank=True, upload_to='artist_covers/')),
+                ('track_count', models.PositiveIntegerField(default=0)),
+                ('album_count', models.PositiveIntegerField(default=0)),
+                ('total_downloads', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['slug'], name='idx_artist_slug'), models.Index(fields=['-track_count'], name='idx_artist_track_count'), models.Index(fields=['-total_downloads'], name='idx_artist_downloads')],
+            },
+        ),
+        migrations.AddField(
+            model_name='album',
+            name='artist_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='albums', to='core.artist'),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='artist_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tracks', to='core.artist'),
+        ),
+        migrations.RunPython(backfill_artists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:06
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_album_downloads(apps, schema_editor):
+    Album = apps.get_model('core', 'Album')
+    Track = apps.get_model('core', 'Track')
+    track_totals = Track.objects.filter(album=OuterRef('pk')).values('album').annotate(
+        total=Sum('downloads')
+    ).values('total')
+    Album.objects.update(downloads=Coalesce(Subquery(track_totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_artist'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['downloads'], name='idx_album_downloads'),
+        ),
+        migrations.RunPython(backfill_album_downloads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_album_downloads_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='hls_manifest',
+            field=models.CharField(blank=True, help_text='Master playlist path relative to MEDIA_ROOT', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='hls_packaged_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='hls_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['hls_status'], name='idx_track_hls_status'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:10
+
+import jsonfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_track_hls'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='audio_tags',
+            field=jsonfield.fields.JSONField(blank=True, help_text='Embedded ID3/RIFF tags', null=True),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='bitrate',
+            field=models.PositiveIntegerField(blank=True, help_text='Average bitrate in kbps', null=True),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='channels',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='metadata_extracted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='sample_rate',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
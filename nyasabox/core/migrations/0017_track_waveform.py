@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_track_audio_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='waveform',
+            field=models.FileField(blank=True, help_text='int8 min/max peak pairs', upload_to='waveforms/'),
+        ),
+    ]
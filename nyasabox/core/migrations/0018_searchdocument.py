@@ -0,0 +1,106 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:15
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+TABLE = 'core_searchdocument'
+FTS_TABLE = 'core_searchdocument_fts'
+
+
+def create_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        # InnoDB builds one FULLTEXT index per ALTER; MATCH() needs an index
+        # per column list it is called with
+        for name, columns in (
+            ('ft_searchdocument_title', 'title'),
+            ('ft_searchdocument_people', 'people'),
+            ('ft_searchdocument_body', 'body'),
+            ('ft_searchdocument_all', 'title, people, body'),
+        ):
+            schema_editor.execute(f"ALTER TABLE {TABLE} ADD FULLTEXT INDEX {name} ({columns})")
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            f"title, people, body, content='{TABLE}', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        # Keep the external-content table in step with ORM writes
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, title, people, body) VALUES (new.id, new.title, new.people, new.body); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, people, body) "
+            "VALUES ('delete', old.id, old.title, old.people, old.body); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON {TABLE} BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, people, body) "
+            "VALUES ('delete', old.id, old.title, old.people, old.body); "
+            f"INSERT INTO {FTS_TABLE}(rowid, title, people, body) VALUES (new.id, new.title, new.people, new.body); END"
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for suffix in ('ai', 'ad', 'au'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    # MySQL FULLTEXT indexes go away with the table
+
+
+def backfill_documents(apps, schema_editor):
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+    Track = apps.get_model('core', 'Track')
+    Album = apps.get_model('core', 'Album')
+    BlogPost = apps.get_model('core', 'BlogPost')
+
+    documents = []
+    for track in Track.objects.select_related('album').iterator():
+        album = track.album.title if track.album else ''
+        genre = f"{track.genre} {track.get_genre_display()}" if track.genre else ''
+        documents.append(SearchDocument(
+            kind='track', object_id=track.pk, title=track.title[:255], people=track.artist[:255],
+            body=f"{album} {genre}".strip(),
+        ))
+    for album in Album.objects.iterator():
+        documents.append(SearchDocument(
+            kind='album', object_id=album.pk, title=album.title[:255], people=album.artist[:255],
+            body=f"{album.genre} {album.get_genre_display()} {album.description}".strip(),
+        ))
+    for post in BlogPost.objects.select_related('author', 'category').iterator():
+        category = post.category.name if post.category else ''
+        documents.append(SearchDocument(
+            kind='blog', object_id=post.pk, title=post.title[:255], people=post.author.username[:255],
+            body=f"{category} {strip_tags(post.content)}".strip(),
+        ))
+    SearchDocument.objects.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_track_waveform'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('track', 'Track'), ('album', 'Album'), ('blog', 'Blog post')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('people', models.CharField(blank=True, help_text='Artist or author name', max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='uniq_searchdocument_object')],
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
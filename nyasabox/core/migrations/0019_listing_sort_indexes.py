@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_searchdocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='album',
+            index=models.Index(fields=['title', 'id'], name='idx_album_title'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['title', 'id'], name='idx_track_title'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:21
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_counts(apps, schema_editor):
+    Track = apps.get_model('core', 'Track')
+    through = Track.likes.through
+    counts = through.objects.filter(track_id=OuterRef('pk')).values('track_id').annotate(total=Count('*')).values('total')
+    Track.objects.update(like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_listing_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, help_text='Denormalised size of likes'),
+        ),
+        migrations.RunPython(backfill_like_counts, migrations.RunPython.noop),
+    ]
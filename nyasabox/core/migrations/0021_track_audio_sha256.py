@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_track_like_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='audio_sha256',
+            field=models.CharField(blank=True, help_text='SHA-256 of the audio file, set by import_catalog', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['audio_sha256'], name='idx_track_audio_sha256'),
+        ),
+    ]
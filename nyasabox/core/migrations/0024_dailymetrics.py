@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:39
+
+import jsonfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_paymenttransaction_status_created'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('new_users', models.PositiveIntegerField(default=0)),
+                ('new_albums', models.PositiveIntegerField(default=0)),
+                ('new_tracks', models.PositiveIntegerField(default=0)),
+                ('new_blog_posts', models.PositiveIntegerField(default=0)),
+                ('new_requests', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Distribution requests paid that day', max_digits=12)),
+                ('downloads', models.PositiveBigIntegerField(blank=True, help_text='Unknown for days backfilled after the fact', null=True)),
+                ('downloads_total', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('users_total', models.PositiveIntegerField(default=0)),
+                ('albums_total', models.PositiveIntegerField(default=0)),
+                ('tracks_total', models.PositiveIntegerField(default=0)),
+                ('blog_posts_total', models.PositiveIntegerField(default=0)),
+                ('requests_total', models.PositiveIntegerField(default=0)),
+                ('revenue_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('requests_by_status', jsonfield.fields.JSONField(blank=True, default=dict)),
+                ('is_final', models.BooleanField(default=False)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'daily metrics',
+                'ordering': ['date'],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_dailymetrics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('month', 'Month'), ('all', 'All time')], max_length=5)),
+                ('period_start', models.DateField(help_text='First day of the period; 1970-01-01 for all time')),
+                ('platform_key', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('platform', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='revenue_aggregates', to='core.distributionplatform')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('period', 'period_start', 'platform_key'), name='uniq_revenueaggregate_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RevenueEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('charge_id', models.CharField(max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('currency', models.CharField(default='MWK', max_length=3)),
+                ('booked_on', models.DateField(help_text='Local date the payment completed')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='revenue_entries', to='core.paymenttransaction')),
+                ('platform', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='revenue_entries', to='core.distributionplatform')),
+            ],
+            options={
+                'verbose_name_plural': 'revenue entries',
+                'indexes': [models.Index(fields=['booked_on'], name='idx_revenueentry_booked_on')],
+                'constraints': [models.UniqueConstraint(fields=('charge_id', 'platform'), name='uniq_revenueentry_charge_platform')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:58
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_platform_key(apps, schema_editor):
+    RevenueEntry = apps.get_model('core', 'RevenueEntry')
+    RevenueEntry.objects.filter(platform__isnull=False).update(platform_key=F('platform_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_revenue_ledger'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='revenueentry',
+            name='uniq_revenueentry_charge_platform',
+        ),
+        migrations.AddField(
+            model_name='revenueentry',
+            name='platform_key',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_platform_key, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='revenueentry',
+            constraint=models.UniqueConstraint(fields=('charge_id', 'platform_key'), name='uniq_revenueentry_charge_platform'),
+        ),
+    ]
@@ -1,17 +1,25 @@
-from django.db import models
+from django.db import models, transaction
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils.text import slugify
 from django.urls import reverse
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models.signals import post_save
+from django.db.models import Count, F, OuterRef, Subquery, DEFERRED
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from decimal import Decimal
+import os
 import random
 import string
 from datetime import timedelta
 from django.utils import timezone
+from django.utils.html import strip_tags
 import uuid
 from jsonfield import JSONField
+from .images import queue_derivatives
+from . import typeahead
+from .likes import forget_liked_tracks
 
 # Genre choices
 GENRE_CHOICES = (
@@ -36,6 +44,13 @@ GENRE_CHOICES = (
     ('other', 'Other'),
 )
 
+HLS_STATUS_CHOICES = (
+    ('pending', 'Pending'),
+    ('processing', 'Processing'),
+    ('ready', 'Ready'),
+    ('failed', 'Failed'),
+)
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     bio = models.TextField(max_length=500, blank=True)
@@ -140,13 +155,107 @@ class BlogPost(models.Model):
     def get_absolute_url(self):
         return reverse('blog_detail', kwargs={'slug': self.slug})
 
+    def get_search_fields(self):
+        category = self.category.name if self.category else ''
+        return self.title, self.author.username, f"{category} {strip_tags(self.content)}"
+
     def __str__(self):
         return self.title
 
+def allocate_slugs(model, titles, fallback='item', chunk_size=500):
+    """
+    Unique slugs for ``titles`` in a handful of queries, for bulk inserts.
+
+    Same scheme as the per-row loops in ``save()`` ("title", "title-1", ...),
+    but the taken slugs are fetched per chunk instead of one ``exists()`` per
+    candidate. Duplicate titles within ``titles`` get distinct slugs too.
+    """
+    bases = [slugify(title)[:190] or fallback for title in titles]
+    unique = list(dict.fromkeys(bases))
+    taken = set()
+    for start in range(0, len(unique), chunk_size):
+        taken.update(model.objects.filter(slug__in=unique[start:start + chunk_size]).values_list('slug', flat=True))
+    seen = set()
+    repeated = {base for base in bases if base in seen or seen.add(base)}
+    for base in (taken | repeated) & set(unique):
+        taken.update(model.objects.filter(slug__startswith=f'{base}-').values_list('slug', flat=True))
+
+    slugs = []
+    for base in bases:
+        slug, counter = base, 1
+        while slug in taken:
+            slug = f"{base}-{counter}"
+            counter += 1
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+class Artist(models.Model):
+    name = models.CharField(max_length=200, unique=True)
+    slug = models.SlugField(unique=True, max_length=200)
+    cover_art = models.ImageField(upload_to='artist_covers/', blank=True)
+    track_count = models.PositiveIntegerField(default=0)
+    album_count = models.PositiveIntegerField(default=0)
+    total_downloads = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['slug'], name='idx_artist_slug'),
+            models.Index(fields=['-track_count'], name='idx_artist_track_count'),
+            models.Index(fields=['-total_downloads'], name='idx_artist_downloads'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            base_slug = slugify(self.name) or 'artist'
+            slug = base_slug
+            counter = 1
+            while Artist.objects.filter(slug=slug).exists():
+                slug = f"{base_slug}-{counter}"
+                counter += 1
+            self.slug = slug
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def for_name(cls, name):
+        """Return the Artist for a free-text artist name, creating it if needed."""
+        name = (name or '').strip()
+        if not name:
+            return None
+        artist = cls.objects.filter(name__iexact=name).first()
+        if artist is None:
+            artist, _ = cls.objects.get_or_create(name=name)
+        return artist
+
+    def recalculate(self):
+        """Recompute the counters from scratch (used for backfills and repairs)."""
+        stats = self.tracks.aggregate(track_count=models.Count('id'), total_downloads=models.Sum('downloads'))
+        self.track_count = stats['track_count'] or 0
+        self.total_downloads = stats['total_downloads'] or 0
+        self.album_count = self.albums.count()
+        if not self.cover_art:
+            album = self.albums.exclude(cover_art='').order_by('-created_at').first()
+            track = self.tracks.exclude(cover_art='').order_by('-created_at').first()
+            cover = album or track
+            if cover:
+                self.cover_art = cover.cover_art.name
+        self.save()
+
+    def get_absolute_url(self):
+        return reverse('artist_detail', kwargs={'slug': self.slug})
+
+    def __str__(self):
+        return self.name
+
 class Album(models.Model):
+    # Column values as last read from / written to the database, used for counter deltas
+    _loaded_values = {}
+
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, max_length=200)
     artist = models.CharField(max_length=200)
+    artist_ref = models.ForeignKey(Artist, on_delete=models.SET_NULL, related_name='albums', null=True, blank=True)
     genre = models.CharField(max_length=20, choices=GENRE_CHOICES)
     release_date = models.DateField()
     cover_art = models.ImageField(upload_to='album_covers/')
@@ -161,6 +270,8 @@ class Album(models.Model):
             models.Index(fields=['slug'], name='idx_album_slug'),
             models.Index(fields=['created_at'], name='idx_album_created_at'),
             models.Index(fields=['uploader'], name='idx_album_uploader'),
+            models.Index(fields=['downloads'], name='idx_album_downloads'),
+            models.Index(fields=['title', 'id'], name='idx_album_title'),
         ]
 
     def save(self, *args, **kwargs):
@@ -172,29 +283,60 @@ class Album(models.Model):
                 slug = f"{base_slug}-{counter}"
                 counter += 1
             self.slug = slug
+        if self.artist_ref_id is None or self.artist != self._loaded_values.get('artist'):
+            self.artist_ref = Artist.for_name(self.artist)
         super().save(*args, **kwargs)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not DEFERRED
+        }
+        return instance
+
     def get_absolute_url(self):
         return reverse('album_detail', kwargs={'slug': self.slug})
 
+    def get_search_fields(self):
+        return self.title, self.artist, f"{self.genre} {self.get_genre_display()} {self.description}"
+
     def __str__(self):
         return f"{self.title} by {self.artist}"
 
 class Track(models.Model):
+    # Column values as last read from / written to the database, used for counter deltas
+    _loaded_values = {}
+    # Kept current by F() updates and background jobs; saving an edited copy
+    # writes them only when named in update_fields (or reset by new audio).
+    MANAGED_FIELDS = ('downloads', 'like_count', 'hls_status', 'hls_manifest', 'hls_packaged_at', 'waveform')
+
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, max_length=200)
     album = models.ForeignKey(Album, on_delete=models.CASCADE, related_name='tracks', null=True, blank=True)
     artist = models.CharField(max_length=200)
+    artist_ref = models.ForeignKey(Artist, on_delete=models.SET_NULL, related_name='tracks', null=True, blank=True)
     genre = models.CharField(max_length=20, choices=GENRE_CHOICES, blank=True)
     audio_file = models.FileField(upload_to='tracks/')
     cover_art = models.ImageField(upload_to='track_covers/')
     duration = models.DurationField(blank=True, null=True)
+    bitrate = models.PositiveIntegerField(null=True, blank=True, help_text="Average bitrate in kbps")
+    sample_rate = models.PositiveIntegerField(null=True, blank=True)
+    channels = models.PositiveSmallIntegerField(null=True, blank=True)
+    audio_tags = JSONField(null=True, blank=True, help_text="Embedded ID3/RIFF tags")
+    metadata_extracted_at = models.DateTimeField(null=True, blank=True)
+    audio_sha256 = models.CharField(max_length=64, blank=True, help_text="SHA-256 of the audio file, set by import_catalog")
     track_number = models.PositiveIntegerField(null=True, blank=True)
     uploader = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     downloads = models.PositiveIntegerField(default=0)
     likes = models.ManyToManyField(User, related_name='liked_tracks', blank=True)
+    like_count = models.PositiveIntegerField(default=0, help_text="Denormalised size of likes")
+    hls_status = models.CharField(max_length=20, choices=HLS_STATUS_CHOICES, default='pending')
+    hls_manifest = models.CharField(max_length=255, blank=True, help_text="Master playlist path relative to MEDIA_ROOT")
+    hls_packaged_at = models.DateTimeField(null=True, blank=True)
+    waveform = models.FileField(upload_to='waveforms/', blank=True, help_text="int8 min/max peak pairs")
 
     class Meta:
         indexes = [
@@ -202,6 +344,9 @@ class Track(models.Model):
             models.Index(fields=['created_at'], name='idx_track_created_at'),
             models.Index(fields=['uploader'], name='idx_track_uploader'),
             models.Index(fields=['downloads'], name='idx_track_downloads'),
+            models.Index(fields=['hls_status'], name='idx_track_hls_status'),
+            models.Index(fields=['title', 'id'], name='idx_track_title'),
+            models.Index(fields=['audio_sha256'], name='idx_track_audio_sha256'),
         ]
 
     def save(self, *args, **kwargs):
@@ -215,11 +360,63 @@ class Track(models.Model):
             self.slug = slug
         if not self.genre and self.album:
             self.genre = self.album.genre
+        if self.artist_ref_id is None or self.artist != self._loaded_values.get('artist'):
+            self.artist_ref = Artist.for_name(self.artist)
+        stale_waveform = ''
+        new_audio = 'audio_file' in self._loaded_values and self.audio_file.name != self._loaded_values['audio_file']
+        if new_audio:
+            # New audio: queue it for HLS packaging and waveform generation again
+            self.hls_status = 'pending'
+            self.hls_manifest = ''
+            self.hls_packaged_at = None
+            stale_waveform, self.waveform = self.waveform.name, ''
+        if not self._state.adding and not kwargs.get('force_insert'):
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in self.MANAGED_FIELDS
+                ]
+            if new_audio:
+                update_fields = {*update_fields, 'hls_status', 'hls_manifest', 'hls_packaged_at', 'waveform'}
+            kwargs['update_fields'] = update_fields
         super().save(*args, **kwargs)
+        if stale_waveform:
+            storage = self.waveform.storage
+            transaction.on_commit(lambda: storage.delete(stale_waveform))
+        self._loaded_values = dict(self._loaded_values, audio_file=self.audio_file.name)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not DEFERRED
+        }
+        return instance
 
     def get_absolute_url(self):
         return reverse('track_detail', kwargs={'slug': self.slug})
 
+    def get_waveform_url(self):
+        if self.waveform:
+            # Versioned by the file name so a regenerated waveform is refetched
+            version = os.path.splitext(os.path.basename(self.waveform.name))[0]
+            return f"{reverse('track_waveform', kwargs={'slug': self.slug})}?v={version}"
+        return ''
+
+    def get_hls_url(self):
+        if self.hls_status == 'ready' and self.hls_manifest:
+            return settings.MEDIA_URL + self.hls_manifest
+        return ''
+
+    def get_stream_url(self):
+        return reverse('stream_track', kwargs={'slug': self.slug})
+
+    def get_search_fields(self):
+        album = self.album.title if self.album else ''
+        genre = f"{self.genre} {self.get_genre_display()}" if self.genre else ''
+        return self.title, self.artist, f"{album} {genre}"
+
     def get_formatted_duration(self):
         if self.duration:
             total_seconds = int(self.duration.total_seconds())
@@ -321,4 +518,365 @@ class PaymentTransaction(models.Model):
         indexes = [
             models.Index(fields=['charge_id']),
             models.Index(fields=['status']),
-        ]
\ No newline at end of file
+            # reconcile_payments scans pending charges by age
+            models.Index(fields=['status', 'created_at'], name='idx_payment_status_created'),
+        ]
+
+class HomepageSnapshot(models.Model):
+    """Precomputed homepage sections, rebuilt lazily after catalog writes."""
+    key = models.CharField(max_length=50, unique=True)
+    payload = JSONField(null=True, blank=True, help_text="Serialized homepage sections and player payload")
+    version = models.PositiveIntegerField(default=0)
+    built_version = models.PositiveIntegerField(null=True, blank=True)
+    built_at = models.DateTimeField(null=True, blank=True)
+
+    def is_stale(self):
+        return self.payload is None or self.built_version != self.version
+
+    def __str__(self):
+        return f"{self.key} snapshot (v{self.version})"
+
+class SearchDocument(models.Model):
+    """
+    Denormalised text for tracks, albums and blog posts, kept current by the
+    signal receivers below. The full-text index over it (MySQL FULLTEXT or an
+    SQLite FTS5 table) is created in migration 0018 and queried by core.search.
+    """
+    KIND_CHOICES = (
+        ('track', 'Track'),
+        ('album', 'Album'),
+        ('blog', 'Blog post'),
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    title = models.CharField(max_length=255)
+    people = models.CharField(max_length=255, blank=True, help_text="Artist or author name")
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='uniq_searchdocument_object'),
+        ]
+
+    @classmethod
+    def for_object(cls, kind, obj):
+        title, people, body = obj.get_search_fields()
+        return cls(kind=kind, object_id=obj.pk, title=title[:255], people=people[:255], body=body.strip())
+
+    @classmethod
+    def index_object(cls, kind, obj):
+        document = cls.for_object(kind, obj)
+        cls.objects.update_or_create(
+            kind=kind,
+            object_id=obj.pk,
+            defaults={'title': document.title, 'people': document.people, 'body': document.body},
+        )
+
+    @classmethod
+    def remove_object(cls, kind, pk):
+        cls.objects.filter(kind=kind, object_id=pk).delete()
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}: {self.title}"
+
+class OutboundEmail(models.Model):
+    """
+    An email waiting in the outbox. Views queue rows with
+    ``core.outbox.queue_email``; the ``send_outbox`` worker renders the
+    template and sends over a reused SMTP connection, retrying with backoff.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    subject = models.CharField(max_length=255)
+    template = models.CharField(max_length=200, help_text="HTML template rendered at send time")
+    context = JSONField(null=True, blank=True, help_text="Template context; model instances are stored as references")
+    recipients = JSONField(help_text="List of addresses")
+    from_email = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True, help_text="Claim held by a worker while sending")
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='idx_outboundemail_due'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.recipients or [])} ({self.status})"
+
+class DailyMetrics(models.Model):
+    """
+    One row per day of site activity, filled by ``manage.py rollup_metrics``
+    and read by the admin dashboard. Past days are written once with
+    ``is_final`` set and never recomputed; only today's row is refreshed.
+    ``*_total`` columns are as of the end of the day; ``requests_by_status``
+    counts the requests that existed by then, by their status when the row
+    was written.
+    """
+    date = models.DateField(unique=True)
+    new_users = models.PositiveIntegerField(default=0)
+    new_albums = models.PositiveIntegerField(default=0)
+    new_tracks = models.PositiveIntegerField(default=0)
+    new_blog_posts = models.PositiveIntegerField(default=0)
+    new_requests = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, help_text="Distribution requests paid that day")
+    downloads = models.PositiveBigIntegerField(null=True, blank=True, help_text="Unknown for days backfilled after the fact")
+    downloads_total = models.PositiveBigIntegerField(null=True, blank=True)
+    users_total = models.PositiveIntegerField(default=0)
+    albums_total = models.PositiveIntegerField(default=0)
+    tracks_total = models.PositiveIntegerField(default=0)
+    blog_posts_total = models.PositiveIntegerField(default=0)
+    requests_total = models.PositiveIntegerField(default=0)
+    revenue_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    requests_by_status = JSONField(default=dict, blank=True)
+    is_final = models.BooleanField(default=False)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        verbose_name_plural = 'daily metrics'
+
+    def __str__(self):
+        return f"Metrics for {self.date}{'' if self.is_final else ' (partial)'}"
+
+class RevenueEntry(models.Model):
+    """
+    One line of the append-only revenue ledger: a successful payment's share
+    for one platform (or the whole amount, unallocated, when its request has
+    no platforms). Written once by ``core.ledger.post_payment``; never
+    updated or deleted. ``charge_id`` is copied so entries outlive a deleted
+    account's payments.
+    """
+    payment = models.ForeignKey(PaymentTransaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='revenue_entries')
+    charge_id = models.CharField(max_length=50)
+    platform = models.ForeignKey(DistributionPlatform, on_delete=models.PROTECT, null=True, blank=True, related_name='revenue_entries')
+    # platform_id, or 0 when unallocated: unique indexes treat NULLs as distinct
+    platform_key = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3, default='MWK')
+    booked_on = models.DateField(help_text="Local date the payment completed")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['charge_id', 'platform_key'], name='uniq_revenueentry_charge_platform'),
+        ]
+        indexes = [
+            models.Index(fields=['booked_on'], name='idx_revenueentry_booked_on'),
+        ]
+        verbose_name_plural = 'revenue entries'
+
+    def __str__(self):
+        return f"{self.amount} {self.currency} from {self.charge_id} to {self.platform_id or 'unallocated'}"
+
+class RevenueAggregate(models.Model):
+    """
+    Running ledger totals per day, month and all time, overall and per
+    platform, bumped in the same transaction as the entries they sum.
+    """
+    PERIOD_CHOICES = (
+        ('day', 'Day'),
+        ('month', 'Month'),
+        ('all', 'All time'),
+    )
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField(help_text="First day of the period; 1970-01-01 for all time")
+    platform = models.ForeignKey(DistributionPlatform, on_delete=models.PROTECT, null=True, blank=True, related_name='revenue_aggregates')
+    # platform_id, or 0 for the all-platform rows: MySQL unique indexes treat NULLs as distinct
+    platform_key = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['period', 'period_start', 'platform_key'], name='uniq_revenueaggregate_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_period_display()} from {self.period_start} ({self.platform or 'all platforms'}): {self.amount}"
+
+@receiver([post_save, post_delete], sender=Album)
+@receiver([post_save, post_delete], sender=Track)
+def invalidate_homepage_snapshot(sender, **kwargs):
+    # Bumping the version is a single UPDATE; the next homepage hit rebuilds.
+    HomepageSnapshot.objects.update(version=F('version') + 1)
+
+def _claim_artist_cover(artist_id, cover_art):
+    if cover_art:
+        Artist.objects.filter(pk=artist_id, cover_art='').update(cover_art=cover_art.name)
+
+@receiver(post_save, sender=Track)
+def update_artist_track_counters(sender, instance, update_fields=None, **kwargs):
+    old_artist_id = instance._loaded_values.get('artist_ref_id')
+    old_downloads = instance._loaded_values.get('downloads', 0)
+    downloads_written = update_fields is None or 'downloads' in update_fields
+    if not downloads_written and old_artist_id != instance.artist_ref_id:
+        # This copy's downloads was not written and may be stale; move the live total
+        instance.downloads = old_downloads = Track.objects.filter(pk=instance.pk).values_list('downloads', flat=True).get()
+    if old_artist_id != instance.artist_ref_id:
+        if old_artist_id:
+            Artist.objects.filter(pk=old_artist_id).update(
+                track_count=F('track_count') - 1,
+                total_downloads=F('total_downloads') - old_downloads,
+            )
+        if instance.artist_ref_id:
+            Artist.objects.filter(pk=instance.artist_ref_id).update(
+                track_count=F('track_count') + 1,
+                total_downloads=F('total_downloads') + instance.downloads,
+            )
+            _claim_artist_cover(instance.artist_ref_id, instance.cover_art)
+    elif downloads_written and instance.artist_ref_id and instance.downloads != old_downloads:
+        Artist.objects.filter(pk=instance.artist_ref_id).update(
+            total_downloads=F('total_downloads') + (instance.downloads - old_downloads)
+        )
+    instance._loaded_values = dict(
+        instance._loaded_values,
+        artist=instance.artist,
+        artist_ref_id=instance.artist_ref_id,
+        downloads=instance.downloads,
+    )
+
+@receiver(post_delete, sender=Track)
+def release_artist_track_counters(sender, instance, **kwargs):
+    if instance.artist_ref_id:
+        Artist.objects.filter(pk=instance.artist_ref_id).update(
+            track_count=F('track_count') - 1,
+            total_downloads=F('total_downloads') - instance.downloads,
+        )
+
+@receiver(post_save, sender=Album)
+def update_artist_album_counters(sender, instance, **kwargs):
+    old_artist_id = instance._loaded_values.get('artist_ref_id')
+    if old_artist_id != instance.artist_ref_id:
+        if old_artist_id:
+            Artist.objects.filter(pk=old_artist_id).update(album_count=F('album_count') - 1)
+        if instance.artist_ref_id:
+            Artist.objects.filter(pk=instance.artist_ref_id).update(album_count=F('album_count') + 1)
+            _claim_artist_cover(instance.artist_ref_id, instance.cover_art)
+    instance._loaded_values = dict(
+        instance._loaded_values,
+        artist=instance.artist,
+        artist_ref_id=instance.artist_ref_id,
+    )
+
+@receiver(post_delete, sender=Album)
+def release_artist_album_counters(sender, instance, **kwargs):
+    if instance.artist_ref_id:
+        Artist.objects.filter(pk=instance.artist_ref_id).update(album_count=F('album_count') - 1)
+
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=Track)
+def generate_cover_derivatives(sender, instance, **kwargs):
+    queue_derivatives(instance.cover_art)
+
+@receiver(post_save, sender=Profile)
+def generate_profile_picture_derivatives(sender, instance, **kwargs):
+    queue_derivatives(instance.profile_picture)
+
+@receiver(post_save, sender=BlogPost)
+def generate_featured_image_derivatives(sender, instance, **kwargs):
+    queue_derivatives(instance.featured_image)
+
+@receiver(post_save, sender=Track)
+def index_track(sender, instance, **kwargs):
+    SearchDocument.index_object('track', instance)
+
+@receiver(post_save, sender=Album)
+def index_album(sender, instance, **kwargs):
+    SearchDocument.index_object('album', instance)
+    old_title = instance._loaded_values.get('title')
+    if old_title is not None and old_title != instance.title:
+        # Track documents carry the album title
+        for track in instance.tracks.all():
+            SearchDocument.index_object('track', track)
+    instance._loaded_values = dict(instance._loaded_values, title=instance.title)
+
+@receiver(post_save, sender=BlogPost)
+def index_blog_post(sender, instance, **kwargs):
+    SearchDocument.index_object('blog', instance)
+
+@receiver(post_save, sender=BlogCategory)
+def reindex_category_posts(sender, instance, created, **kwargs):
+    if not created:
+        for post in instance.blogpost_set.select_related('author'):
+            SearchDocument.index_object('blog', post)
+
+@receiver(post_delete, sender=Track)
+@receiver(post_delete, sender=Album)
+@receiver(post_delete, sender=BlogPost)
+def remove_search_document(sender, instance, **kwargs):
+    kind = {Track: 'track', Album: 'album', BlogPost: 'blog'}[sender]
+    SearchDocument.remove_object(kind, instance.pk)
+
+@receiver(post_save, sender=Album)
+@receiver(post_save, sender=Artist)
+def touch_dependent_tracks(sender, instance, created, **kwargs):
+    # Track cards show album and artist details; moving updated_at gives them a new cache key
+    if not created:
+        instance.tracks.update(updated_at=timezone.now())
+
+@receiver([post_save, post_delete], sender=Track)
+def touch_track_albums(sender, instance, **kwargs):
+    # Album cards show a track count; moving updated_at gives them a new cache key
+    album_ids = {instance.album_id, instance._loaded_values.get('album_id')} - {None}
+    if album_ids:
+        Album.objects.filter(pk__in=album_ids).update(updated_at=timezone.now())
+    instance._loaded_values = dict(instance._loaded_values, album_id=instance.album_id)
+
+@receiver(post_save, sender=Track)
+def update_track_typeahead(sender, instance, **kwargs):
+    def update():
+        typeahead.update_entry(('track', instance.pk), typeahead.track_entry(instance))
+        if instance.artist_ref_id:
+            typeahead.update_entry(('artist', instance.artist_ref_id), typeahead.artist_entry(instance.artist_ref))
+    transaction.on_commit(update)
+
+@receiver(post_save, sender=Album)
+def update_album_typeahead(sender, instance, **kwargs):
+    transaction.on_commit(lambda: typeahead.update_entry(('album', instance.pk), typeahead.album_entry(instance)))
+
+@receiver(post_save, sender=Artist)
+def update_artist_typeahead(sender, instance, created, **kwargs):
+    # New artists have no tracks yet; the track receiver adds them
+    if not created:
+        transaction.on_commit(lambda: typeahead.update_entry(('artist', instance.pk), typeahead.artist_entry(instance)))
+
+@receiver(post_delete, sender=Track)
+@receiver(post_delete, sender=Album)
+@receiver(post_delete, sender=Artist)
+def remove_typeahead_entry(sender, instance, **kwargs):
+    # delete() clears instance.pk before the commit callback runs
+    entry_id = ({Track: 'track', Album: 'album', Artist: 'artist'}[sender], instance.pk)
+    transaction.on_commit(lambda: typeahead.remove_entry(entry_id))
+
+def recount_likes(track_ids):
+    """Recompute ``like_count`` for ``track_ids`` in one UPDATE."""
+    through = Track.likes.through
+    counts = through.objects.filter(track_id=OuterRef('pk')).values('track_id').annotate(total=Count('*')).values('total')
+    Track.objects.filter(pk__in=track_ids).update(like_count=Coalesce(Subquery(counts), 0))
+
+@receiver(m2m_changed, sender=Track.likes.through)
+def sync_like_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    # likes.toggle_like writes the through table directly; this covers
+    # track.likes.add/remove/clear and user.liked_tracks.* everywhere else
+    if action == 'pre_clear':
+        field = 'track_id' if reverse else 'user_id'
+        lookup = {'user_id': instance.pk} if reverse else {'track_id': instance.pk}
+        instance._cleared_likes = list(sender.objects.filter(**lookup).values_list(field, flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    others = pk_set if action != 'post_clear' else getattr(instance, '_cleared_likes', [])
+    track_ids, user_ids = (others, [instance.pk]) if reverse else ([instance.pk], others)
+    recount_likes(track_ids)
+    forget_liked_tracks(user_ids)
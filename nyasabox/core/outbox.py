@@ -0,0 +1,203 @@
+"""
+Email outbox: queue on the request path, send from a worker.
+
+``queue_email`` only inserts an ``OutboundEmail`` row, inside the caller's
+transaction, so a signup or approval no longer waits on a TLS handshake and
+SMTP round-trip. Model instances in the context are stored as references and
+loaded again when the template is rendered by the worker.
+
+``OutboxWorker`` (run by ``manage.py send_outbox``) claims due rows in
+batches, sends them over one SMTP connection that stays open between
+batches, and reschedules failures with exponential backoff until
+``EMAIL_OUTBOX_MAX_ATTEMPTS``. The ``locked_until`` value written by a
+claim is the worker's lease: results are recorded only while the row still
+carries it, so a worker whose lease expired cannot overwrite the outcome of
+the worker that took the row over.
+"""
+import logging
+import random
+import smtplib
+import time
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import models, transaction
+from django.db.models import Q
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+logger = logging.getLogger(__name__)
+
+MODEL_KEY = '__model__'
+
+
+def _setting(name, default):
+    return getattr(settings, f'EMAIL_OUTBOX_{name}', default)
+
+
+def serialize_context(context):
+    data = {}
+    for key, value in (context or {}).items():
+        if isinstance(value, models.Model):
+            value = {MODEL_KEY: value._meta.label_lower, 'pk': value.pk}
+        data[key] = value
+    return data
+
+
+def load_context(data):
+    context = {}
+    for key, value in (data or {}).items():
+        if isinstance(value, dict) and MODEL_KEY in value:
+            model = apps.get_model(value[MODEL_KEY])
+            value = model._default_manager.filter(pk=value['pk']).first()
+        context[key] = value
+    return context
+
+
+def queue_email(subject, template, context, recipients, from_email=None):
+    """
+    Queue an HTML email. The row is written in the caller's transaction, so
+    it only becomes visible to ``send_outbox`` (and is sent on its next
+    poll) if that transaction commits; a rollback discards it.
+    """
+    from .models import OutboundEmail
+
+    return OutboundEmail.objects.create(
+        subject=subject,
+        template=template,
+        context=serialize_context(context),
+        recipients=[address for address in recipients if address],
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def retry_delay(attempts):
+    base = _setting('RETRY_BASE_SECONDS', 30)
+    delay = min(base * 2 ** (attempts - 1), _setting('RETRY_MAX_SECONDS', 3600))
+    # Jitter keeps a backlog from retrying in lockstep against a recovering host
+    return delay + random.uniform(0, delay / 10)
+
+
+def build_message(email):
+    html = render_to_string(email.template, load_context(email.context))
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=strip_tags(html),
+        from_email=email.from_email or settings.DEFAULT_FROM_EMAIL,
+        to=email.recipients,
+    )
+    message.attach_alternative(html, 'text/html')
+    return message
+
+
+class OutboxWorker:
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or _setting('BATCH_SIZE', 50)
+        self.connection = None
+        self.last_used = 0.0
+
+    def claim(self):
+        """Lock up to ``batch_size`` due rows for this worker."""
+        from .models import OutboundEmail
+
+        now = timezone.now()
+        due = OutboundEmail.objects.filter(
+            Q(status='pending', next_attempt_at__lte=now)
+            # A worker that died mid-send left these behind
+            | Q(status='sending', locked_until__lt=now)
+        ).order_by('next_attempt_at')
+        with transaction.atomic():
+            emails = list(due.select_for_update(skip_locked=True)[:self.batch_size])
+            if emails:
+                lease = now + timedelta(seconds=_setting('LEASE_SECONDS', 300))
+                OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+                    status='sending', locked_until=lease,
+                )
+                for email in emails:
+                    email.status, email.locked_until = 'sending', lease
+        return emails
+
+    def finish(self, email, **fields):
+        """Record a send result; returns False if the lease was lost meanwhile."""
+        from .models import OutboundEmail
+
+        held = OutboundEmail.objects.filter(pk=email.pk, status='sending', locked_until=email.locked_until)
+        if held.update(locked_until=None, **fields):
+            return True
+        logger.warning(f"Email {email.pk} lease expired before its result was recorded; result dropped")
+        return False
+
+    def open(self):
+        if self.connection is None:
+            self.connection = get_connection(backend=_setting('BACKEND', settings.EMAIL_BACKEND))
+        self.connection.open()
+        self.last_used = time.monotonic()
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def close_if_idle(self):
+        if self.connection is not None and time.monotonic() - self.last_used > _setting('IDLE_SECONDS', 30):
+            self.close()
+
+    def send(self, email):
+        message = build_message(email)
+        try:
+            message.connection = self.open()
+            message.send()
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The server dropped the kept-alive connection; one fresh try
+            self.close()
+            message.connection = self.open()
+            message.send()
+        self.last_used = time.monotonic()
+
+    def run_batch(self):
+        """Send one batch; returns ``(sent, failed)``."""
+        emails = self.claim()
+        sent = failed = 0
+        for email in emails:
+            if timezone.now() >= email.locked_until:
+                # The rest of the batch may already belong to another worker
+                break
+            attempts = email.attempts + 1
+            try:
+                self.send(email)
+            except (TemplateDoesNotExist, TemplateSyntaxError, smtplib.SMTPRecipientsRefused) as e:
+                # Retrying cannot fix these
+                logger.error(f"Email {email.pk} failed permanently: {e}")
+                self.finish(email, status='failed', attempts=attempts, last_error=str(e))
+                failed += 1
+            except Exception as e:
+                self.close()
+                final = attempts >= _setting('MAX_ATTEMPTS', 8)
+                logger.warning(f"Email {email.pk} attempt {attempts} failed: {e}")
+                self.finish(
+                    email,
+                    status='failed' if final else 'pending',
+                    attempts=attempts,
+                    last_error=str(e),
+                    next_attempt_at=timezone.now() + timedelta(seconds=retry_delay(attempts)),
+                )
+                failed += 1
+            else:
+                self.finish(email, status='sent', attempts=attempts, sent_at=timezone.now(), last_error='')
+                sent += 1
+        return sent, failed
+
+    def purge(self):
+        """Delete sent rows older than ``EMAIL_OUTBOX_KEEP_DAYS``."""
+        from .models import OutboundEmail
+
+        cutoff = timezone.now() - timedelta(days=_setting('KEEP_DAYS', 30))
+        deleted, _ = OutboundEmail.objects.filter(status='sent', sent_at__lt=cutoff).delete()
+        return deleted
@@ -0,0 +1,140 @@
+"""
+Keyset (cursor) pagination for catalog listings.
+
+Pages are addressed by an opaque cursor holding the sort-key values of the
+last (or first) row seen, so fetching any page is an index range scan of
+``per_page + 1`` rows no matter how deep it is -- there is no ``OFFSET`` and
+no ``COUNT(*)``. Orderings must end in a unique column (``id``) so ties on
+the leading keys are broken deterministically.
+"""
+import base64
+import json
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _dump(value):
+    # isoformat keeps microseconds, which the keyset comparison needs
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, [_dump(value) for value in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, fields):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, raw_values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in ('next', 'prev') or len(raw_values) != len(fields):
+            raise ValueError('Cursor does not match the ordering')
+        values = [model._meta.get_field(field).to_python(value) for field, value in zip(fields, raw_values)]
+    except Exception as e:
+        raise InvalidCursor(str(e))
+    return direction, values
+
+
+def _after(ordering, values):
+    """Rows strictly after ``values`` in ``ordering``, as a lexicographic Q."""
+    condition = None
+    for position, key in enumerate(ordering):
+        field = key.lstrip('-')
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        clause = Q(**{f'{field}__{lookup}': values[position]})
+        for previous, value in zip(ordering[:position], values):
+            clause &= Q(**{previous.lstrip('-'): value})
+        condition = clause if condition is None else condition | clause
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginate(queryset, ordering, cursor=None, per_page=20):
+    """
+    Return the ``KeysetPage`` of ``queryset`` in ``ordering`` that follows
+    (or precedes) ``cursor``. A missing or invalid cursor gives the first page.
+    """
+    fields = [key.lstrip('-') for key in ordering]
+    direction, values = 'next', None
+    if cursor:
+        try:
+            direction, values = decode_cursor(cursor, queryset.model, fields)
+        except InvalidCursor:
+            pass
+
+    if direction == 'prev':
+        # Walk backwards from the cursor, then restore display order
+        scan = [key[1:] if key.startswith('-') else f'-{key}' for key in ordering]
+    else:
+        scan = list(ordering)
+    rows = queryset.order_by(*scan)
+    if values is not None:
+        rows = rows.filter(_after(scan, values))
+    rows = list(rows[:per_page + 1])
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == 'prev':
+        rows.reverse()
+    if not rows:
+        return KeysetPage(rows)
+
+    def key_of(obj):
+        return [getattr(obj, field) for field in fields]
+
+    has_next = more if direction == 'next' else values is not None
+    has_previous = values is not None if direction == 'next' else more
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor('next', key_of(rows[-1])) if has_next else None,
+        previous_cursor=encode_cursor('prev', key_of(rows[0])) if has_previous else None,
+    )
+
+
+def estimate_count(queryset):
+    """
+    A cheap row count for listing headers, as ``(count, is_lower_bound)``.
+
+    Unfiltered MySQL tables use the InnoDB statistics estimate; everything
+    else is counted exactly but only up to ``LISTING_COUNT_CAP`` rows.
+    """
+    if not queryset.query.where and connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] is not None:
+            return row[0], False
+    cap = getattr(settings, 'LISTING_COUNT_CAP', 1000)
+    count = queryset.order_by()[:cap + 1].count()
+    return min(count, cap), count > cap
@@ -0,0 +1,355 @@
+"""
+PayChangu integration: one pooled API client, the cached mobile-money
+operator list and charge verification.
+
+``PayChanguClient`` keeps a ``requests.Session`` per process, so calls reuse
+kept-alive TLS connections instead of handshaking every time. Each endpoint
+has its own timeout (``PAYCHANGU_<ENDPOINT>_TIMEOUT``) and latency
+histogram, and every failure is raised as a ``PayChanguError`` saying which
+endpoint failed and how. ``PAYCHANGU_API_URL`` points the client at
+``manage.py paychangu_stub`` for offline load tests.
+
+The operator list changes rarely but is needed on every payment page and
+payment submission. It is kept in the shared cache with a freshness TTL
+(``PAYCHANGU_OPERATORS_TTL``); once stale it is still served while one
+background thread per process refreshes it, so a slow provider never sits on
+the request path. Only a cold cache waits for the provider, with a short
+timeout and no retries.
+
+Each endpoint has its own circuit breaker, so a slow operator list cannot
+stop charges from being initialized or verified: after
+``PAYCHANGU_BREAKER_FAILURES`` consecutive failures (timeouts, connection
+errors, 5xx) it opens for ``PAYCHANGU_BREAKER_RESET_SECONDS`` and calls to
+that endpoint fail immediately, then one trial call decides whether it
+closes again.
+
+Hit/miss counts, latencies and errors are kept per process (``metrics()``)
+and shown on ``/adminxy/perf/``.
+"""
+import bisect
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+API_URL = 'https://api.paychangu.com'
+OPERATORS_CACHE_KEY = 'paychangu:operators'
+
+DEFAULT_TIMEOUTS = {'operators': 5, 'initialize': 15, 'verify': 10}
+
+
+class PayChanguError(Exception):
+    """
+    A failed PayChangu call. ``kind`` is one of ``timeout``, ``connection``,
+    ``server`` (5xx), ``rejected`` (4xx or an unsuccessful response),
+    ``invalid_response`` or ``circuit_open``.
+    """
+    RETRYABLE = ('timeout', 'connection', 'server')
+
+    def __init__(self, endpoint, kind, message, status_code=None, data=None):
+        super().__init__(f'PayChangu {endpoint}: {message}')
+        self.endpoint = endpoint
+        self.kind = kind
+        self.message = message
+        self.status_code = status_code
+        self.data = data
+
+    @property
+    def retryable(self):
+        return self.kind in self.RETRYABLE
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def _allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_running:
+                # Exactly one caller probes the provider
+                self.trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def call(self, function, *args, **kwargs):
+        if not self._allow():
+            raise CircuitOpen(f'{self.name} circuit is open')
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.trial_running = False
+                self.failures += 1
+                if self.opened_at is not None or self.failures >= self.failure_threshold:
+                    if self.opened_at is None:
+                        logger.warning(f"{self.name} circuit opened after {self.failures} failures")
+                    self.opened_at = time.monotonic()
+            raise
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"{self.name} circuit closed")
+            self.trial_running = False
+            self.failures = 0
+            self.opened_at = None
+        return result
+
+
+class Histogram:
+    """Latency histogram with fixed millisecond buckets."""
+    BUCKETS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(self.BUCKETS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the ``fraction`` quantile."""
+        if not self.total:
+            return None
+        threshold = fraction * self.total
+        running = 0
+        for bound, count in zip(self.BUCKETS + (None,), self.counts):
+            running += count
+            if running >= threshold:
+                return bound if bound is not None else self.max_ms
+        return self.max_ms
+
+    def snapshot(self):
+        return {
+            'count': self.total,
+            'mean_ms': round(self.sum_ms / self.total, 1) if self.total else None,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'max_ms': round(self.max_ms, 1),
+            'buckets': dict(zip([f'<={bound}' for bound in self.BUCKETS] + ['>'], self.counts)),
+        }
+
+
+breakers = {
+    endpoint: CircuitBreaker(
+        f'paychangu {endpoint}',
+        failure_threshold=getattr(settings, 'PAYCHANGU_BREAKER_FAILURES', 5),
+        reset_timeout=getattr(settings, 'PAYCHANGU_BREAKER_RESET_SECONDS', 30),
+    )
+    for endpoint in DEFAULT_TIMEOUTS
+}
+
+
+class PayChanguClient:
+    def __init__(self, api_key=None, base_url=None, timeouts=None, pool_size=None, circuits=None):
+        self.base_url = (base_url or getattr(settings, 'PAYCHANGU_API_URL', API_URL)).rstrip('/')
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        for endpoint in DEFAULT_TIMEOUTS:
+            configured = getattr(settings, f'PAYCHANGU_{endpoint.upper()}_TIMEOUT', None)
+            if configured is not None:
+                self.timeouts[endpoint] = configured
+        self.timeouts.update(timeouts or {})
+        self.circuits = circuits or breakers
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size or getattr(settings, 'PAYCHANGU_POOL_SIZE', 20))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'accept': 'application/json',
+            'Authorization': f'Bearer {(api_key or settings.PAYCHANGU_API_KEY).strip()}',
+        })
+
+        self._lock = threading.Lock()
+        self.latency = defaultdict(Histogram)
+        self.errors = defaultdict(Counter)
+
+    def _send(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', timeout=self.timeouts[endpoint], **kwargs)
+        except requests.Timeout as e:
+            raise PayChanguError(endpoint, 'timeout', str(e)) from e
+        except requests.RequestException as e:
+            raise PayChanguError(endpoint, 'connection', str(e)) from e
+        finally:
+            with self._lock:
+                self.latency[endpoint].observe((time.perf_counter() - started) * 1000)
+        if response.status_code >= 500:
+            raise PayChanguError(endpoint, 'server', f'HTTP {response.status_code}', response.status_code)
+        return response
+
+    def request(self, endpoint, method, path, **kwargs):
+        """The decoded JSON body; raises ``PayChanguError``."""
+        try:
+            try:
+                # 4xx answers mean the provider is up, so only these count
+                # towards opening the circuit
+                response = self.circuits[endpoint].call(self._send, endpoint, method, path, **kwargs)
+            except CircuitOpen as e:
+                raise PayChanguError(endpoint, 'circuit_open', str(e)) from e
+            try:
+                data = response.json()
+            except ValueError as e:
+                raise PayChanguError(endpoint, 'invalid_response', 'response is not JSON', response.status_code) from e
+            if response.status_code >= 400:
+                message = data.get('message', f'HTTP {response.status_code}') if isinstance(data, dict) else str(data)
+                raise PayChanguError(endpoint, 'rejected', message, response.status_code, data)
+            if not isinstance(data, dict):
+                raise PayChanguError(endpoint, 'invalid_response', 'response is not a JSON object', response.status_code, data)
+            return data
+        except PayChanguError as e:
+            with self._lock:
+                self.errors[endpoint][e.kind] += 1
+            raise
+
+    def operators(self):
+        operators = self.request('operators', 'GET', '/mobile-money').get('data') or []
+        if not isinstance(operators, list):
+            raise PayChanguError('operators', 'invalid_response', 'operator list is not a JSON array')
+        return operators
+
+    def initialize(self, payload):
+        """Start a mobile-money charge; the provider prompts the payer's phone."""
+        data = self.request('initialize', 'POST', '/mobile-money/payments/initialize', json=payload)
+        if data.get('status') != 'success':
+            with self._lock:
+                self.errors['initialize']['rejected'] += 1
+            raise PayChanguError('initialize', 'rejected', data.get('message', 'Unknown error'), 200, data)
+        return data
+
+    def verify(self, charge_id):
+        return self.request('verify', 'GET', f'/mobile-money/payments/{charge_id}/verify')
+
+    def metrics(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    'latency': self.latency[endpoint].snapshot(),
+                    'errors': dict(self.errors[endpoint]),
+                    'timeout': self.timeouts[endpoint],
+                    'breaker': {
+                        'state': self.circuits[endpoint].state,
+                        'failures': self.circuits[endpoint].failures,
+                        'rejected': self.circuits[endpoint].rejected,
+                    },
+                }
+                for endpoint in self.timeouts
+            }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def client():
+    """This process's shared client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = PayChanguClient()
+        return _client
+
+
+_metrics_lock = threading.Lock()
+_counters = {'hit': 0, 'stale': 0, 'miss': 0, 'refresh_ok': 0, 'refresh_failed': 0}
+_refreshing = threading.Lock()
+
+
+def _count(name):
+    with _metrics_lock:
+        _counters[name] += 1
+
+
+def refresh_operators():
+    """Fetch and store; returns the list or None on failure."""
+    try:
+        operators = client().operators()
+    except PayChanguError as e:
+        if e.kind != 'circuit_open':
+            _count('refresh_failed')
+            logger.error(f"Failed to fetch operators: {e}")
+        return None
+    _count('refresh_ok')
+    if operators:
+        # Kept well past the TTL so there is something to serve while the
+        # provider is down
+        cache.set(
+            OPERATORS_CACHE_KEY,
+            {'operators': operators, 'fetched_at': time.time()},
+            getattr(settings, 'PAYCHANGU_OPERATORS_STALE_SECONDS', 86400),
+        )
+    return operators
+
+
+def _refresh_in_background():
+    if not _refreshing.acquire(blocking=False):
+        return  # this process is already refreshing
+
+    def run():
+        try:
+            refresh_operators()
+        finally:
+            _refreshing.release()
+
+    threading.Thread(target=run, name='paychangu-operators', daemon=True).start()
+
+
+def get_mobile_money_operators():
+    """Operators from the cache, refreshed in the background once stale; [] if unavailable."""
+    cached = cache.get(OPERATORS_CACHE_KEY)
+    if cached is not None:
+        if time.time() - cached['fetched_at'] < getattr(settings, 'PAYCHANGU_OPERATORS_TTL', 600):
+            _count('hit')
+        else:
+            _count('stale')
+            _refresh_in_background()
+        return cached['operators']
+    _count('miss')
+    return refresh_operators() or []
+
+
+def verify_charge(charge_id):
+    """The provider's current record of ``charge_id``; raises ``PayChanguError``."""
+    return client().verify(charge_id)
+
+
+def metrics():
+    with _metrics_lock:
+        operators = dict(_counters)
+    return {
+        'operators': operators,
+        'endpoints': client().metrics(),
+    }
@@ -0,0 +1,271 @@
+"""
+Applying PayChangu payment outcomes to our records.
+
+A payment is a short saga. ``process_distribution_payment`` commits a
+pending ``PaymentTransaction``, calls the provider outside any database
+transaction, then records the answer with ``record_initialized`` or
+``record_initialize_failed``: single conditional updates keyed on
+``charge_id`` that never overwrite a charge that has already settled.
+
+The webhook receiver, the ``reconcile_payments`` command and anything else
+that learns a charge's fate call ``apply_result``. It locks the
+``PaymentTransaction`` row, ignores charges that are already final (so
+duplicate webhooks and a webhook racing the reconciler are harmless), and
+updates the transaction, its distribution request, the revenue ledger and
+the notification outbox in one short transaction.
+
+``reconcile`` is the safety net for lost webhooks: it verifies pending
+charges that have waited longer than ``PAYCHANGU_RECONCILE_AFTER_SECONDS``
+with the API, a batch at a time over a few threads.
+
+Every settled charge is published on its ``payment_channel`` once the
+transaction commits; ``event_stream`` relays that to the payment page as
+server-sent events, so the page waits on one open connection instead of
+polling.
+"""
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import PaymentTransaction
+from .outbox import queue_email
+from . import events, ledger, paychangu
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ('success', 'failed', 'cancelled')
+
+
+def classify(data):
+    """
+    Map a PayChangu payload to success/failed/cancelled/pending. Verify
+    responses wrap the charge in ``data`` and only count as paid when the
+    gateway confirms it; signed webhook payloads are flat.
+    """
+    data = data or {}
+    wrapped = isinstance(data.get('data'), dict)
+    details = data['data'] if wrapped else data
+    status = str(details.get('status') or '').lower()
+    message = str(details.get('message') or '').lower()
+    if wrapped:
+        if data.get('status') == 'successful':
+            return 'success'
+        if status == 'success':
+            gateway = data.get('gateway_response') or {}
+            return 'success' if (gateway.get('status') or {}).get('success') else 'pending'
+    elif status in ('success', 'successful'):
+        return 'success'
+    if status == 'cancelled' or 'user_cancelled' in message:
+        return 'cancelled'
+    if status == 'failed':
+        return 'failed'
+    return 'pending'
+
+
+def amount_matches(payment, data):
+    """Whether ``data`` reports the amount (and currency, when given) we charged."""
+    data = data or {}
+    details = data['data'] if isinstance(data.get('data'), dict) else data
+    amount = details.get('amount', data.get('amount'))
+    currency = details.get('currency', data.get('currency'))
+    try:
+        if amount is None or Decimal(str(amount)) != payment.amount:
+            return False
+    except InvalidOperation:
+        return False
+    return currency is None or str(currency).upper() == payment.currency
+
+
+def charge_id_of(payload):
+    payload = payload or {}
+    details = payload.get('data') if isinstance(payload.get('data'), dict) else {}
+    return payload.get('charge_id') or details.get('charge_id') or payload.get('tx_ref') or details.get('tx_ref')
+
+
+def payment_channel(charge_id):
+    return f'payment:{charge_id}'
+
+
+def status_payload(payment):
+    """What the payment page is told about ``payment``."""
+    if payment.status == 'success':
+        return {'status': 'success'}
+    if payment.status == 'failed':
+        details = (payment.response_data or {}).get('data')
+        message = details.get('message') if isinstance(details, dict) else None
+        return {'status': 'failed', 'message': message or 'Transaction failed'}
+    if payment.status == 'cancelled':
+        return {'status': 'cancelled', 'message': 'You cancelled the payment'}
+    return {'status': 'pending'}
+
+
+def send_distribution_payment_notification(payment, success=True):
+    request = payment.distribution_request
+    status = 'Successful' if success else 'Failed'
+    site_url = getattr(settings, 'SITE_URL', 'http://localhost:8000')  # Default to localhost if not set
+    queue_email(f"Distribution Payment {status}: Request #{request.id}", 'emails/distribution_payment_notification.html', {
+        'request': request,
+        'transaction': payment,
+        'success': success,
+        'site_url': site_url,
+    }, [request.artist.email])
+
+
+def record_initialized(charge_id, data):
+    """Store the initialize response unless a webhook has already settled the charge."""
+    return PaymentTransaction.objects.filter(charge_id=charge_id, status='pending').update(response_data=data)
+
+
+def record_initialize_failed(charge_id, error):
+    """
+    Close a charge whose initialize call failed. Only failures that prove the
+    provider never took the charge (a rejection, an open circuit) close it;
+    after a timeout or 5xx the phone prompt may still be live, so the charge
+    stays pending for the webhook or the reconciler to settle.
+    """
+    if error.kind not in ('rejected', 'circuit_open'):
+        return 0
+    return PaymentTransaction.objects.filter(charge_id=charge_id, status='pending').update(
+        status='failed',
+        completed_at=timezone.now(),
+        response_data=error.data or {'status': 'failed', 'message': error.message},
+    )
+
+
+def apply_result(charge_id, data, source=''):
+    """
+    Record the provider's ``data`` for ``charge_id``.
+
+    Returns ``(payment, changed)``; ``payment`` is None for unknown charges.
+    """
+    outcome = classify(data)
+    with transaction.atomic():
+        payment = (
+            PaymentTransaction.objects.select_for_update()
+            .select_related('distribution_request__artist')
+            .filter(charge_id=charge_id)
+            .first()
+        )
+        if payment is None or payment.status in FINAL_STATUSES:
+            return payment, False
+        if outcome == 'success' and not amount_matches(payment, data):
+            logger.error(f"Payment {charge_id} reported paid with a different amount or currency ({source}); left pending")
+            return payment, False
+        payment.response_data = data
+        if outcome == 'pending':
+            payment.save(update_fields=['response_data'])
+            return payment, False
+
+        now = timezone.now()
+        payment.status = outcome
+        payment.completed_at = now
+        payment.save(update_fields=['response_data', 'status', 'completed_at'])
+        if outcome == 'success':
+            request = payment.distribution_request
+            request.status = 'paid'
+            request.payment_date = now
+            request.save(update_fields=['status', 'payment_date'])
+            ledger.post_payment(payment)
+        send_distribution_payment_notification(payment, success=outcome == 'success')
+        payload = status_payload(payment)
+        transaction.on_commit(lambda: events.publish(payment_channel(charge_id), payload))
+    logger.info(f"Payment {charge_id} marked {outcome} ({source or 'unknown source'})")
+    return payment, True
+
+
+def stale_pending(now=None):
+    now = now or timezone.now()
+    return PaymentTransaction.objects.filter(
+        status='pending',
+        created_at__lte=now - timedelta(seconds=getattr(settings, 'PAYCHANGU_RECONCILE_AFTER_SECONDS', 60)),
+        # Older charges are abandoned; the provider expires them long before this
+        created_at__gte=now - timedelta(hours=getattr(settings, 'PAYCHANGU_RECONCILE_MAX_AGE_HOURS', 48)),
+    ).exclude(charge_id='')
+
+
+def _verify(charge_id):
+    try:
+        return charge_id, paychangu.verify_charge(charge_id)
+    except paychangu.PayChanguError as e:
+        if e.kind == 'rejected' and e.status_code == 404:
+            # The initialize call never reached the provider (the process
+            # died, or it timed out before arriving)
+            return charge_id, {'status': 'failed', 'data': {'status': 'failed', 'message': 'Payment was not started'}}
+        logger.warning(f"Could not verify {charge_id}: {e}")
+        return charge_id, None
+
+
+def reconcile(batch_size=100, workers=4, after=None):
+    """
+    Verify one page of stale pending charges, oldest first, starting after
+    the ``(created_at, pk)`` cursor ``after``. Returns ``(checked, settled,
+    cursor)``; ``cursor`` is None once the last page has been read, so a
+    pass ends even while the provider keeps reporting charges as pending.
+    """
+    pending = stale_pending()
+    if after:
+        created_at, pk = after
+        pending = pending.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+    rows = list(pending.order_by('created_at', 'pk').values_list('created_at', 'pk', 'charge_id')[:batch_size])
+    checked = settled = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for charge_id, data in pool.map(_verify, [charge_id for _, _, charge_id in rows]):
+            if data is None:
+                continue
+            checked += 1
+            _, changed = apply_result(charge_id, data, source='reconciler')
+            settled += changed
+    cursor = rows[-1][:2] if len(rows) == batch_size else None
+    return checked, settled, cursor
+
+
+def _sse(payload, event=None):
+    lines = [f'event: {event}'] if event else []
+    lines.append(f'data: {json.dumps(payload)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+async def _current_payload(charge_id):
+    payment = await PaymentTransaction.objects.filter(charge_id=charge_id).only('status', 'response_data').afirst()
+    return status_payload(payment) if payment else {'status': 'pending'}
+
+
+async def event_stream(charge_id):
+    """
+    Server-sent events for one charge: a single ``message`` with its final
+    status, or a ``timeout`` event after ``PAYMENT_EVENTS_TIMEOUT`` seconds.
+
+    The row is re-read on every heartbeat as well, so a result recorded by
+    a process the broker does not reach (the reconciler, or another worker
+    under ``LocalBroker``) is picked up within one heartbeat.
+    """
+    timeout = getattr(settings, 'PAYMENT_EVENTS_TIMEOUT', 300)
+    heartbeat = getattr(settings, 'PAYMENT_EVENTS_HEARTBEAT_SECONDS', 15)
+    async with events.subscribe(payment_channel(charge_id)) as queue:
+        # Read after subscribing so a result recorded in between is not missed
+        payload = await _current_payload(charge_id)
+        if payload['status'] != 'pending':
+            yield _sse(payload)
+            return
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                payload = await asyncio.wait_for(queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                payload = await _current_payload(charge_id)
+                if payload['status'] != 'pending':
+                    yield _sse(payload)
+                    return
+                # Keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            yield _sse(payload)
+            return
+        yield _sse({'status': 'pending'}, event='timeout')
@@ -0,0 +1,244 @@
+"""
+Per-request SQL accounting and N+1 detection.
+
+``QueryBudgetMiddleware`` wraps every database connection for the duration
+of a request (``connection.execute_wrapper``) and records how many queries
+ran, how long they took in total, and how often each query *fingerprint*
+repeated. A fingerprint is the SQL text with placeholders only, so
+``SELECT ... WHERE album_id = %s`` run once per row of a listing collapses
+into one entry with a high count -- the signature of an N+1.
+
+Requests over ``PERF_QUERY_BUDGET`` queries, ``PERF_SQL_TIME_BUDGET_MS`` of
+SQL time, or with any fingerprint repeated ``PERF_REPEATED_QUERY_THRESHOLD``
+times are logged and counted against their view; per-view overrides go in
+``PERF_VIEW_BUDGETS``. Totals are kept per worker process and shown at
+``/adminxy/perf/``. A ``Server-Timing`` header with the SQL totals is added
+for staff and when ``DEBUG`` is on, never for other visitors.
+
+``query_budget`` and ``QueryBudgetMixin`` apply the same checks in tests.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE_RE = re.compile(r'\s+')
+# "IN (%s, %s, %s)" varies with the batch size; it is still the same query
+IN_LIST_RE = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+# Literals inlined by raw SQL
+NUMBER_RE = re.compile(r'\b\d+\b')
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+
+# Fingerprints kept per view, and offending requests kept for the perf page
+MAX_FINGERPRINTS = 20
+MAX_RECENT = 50
+
+
+def fingerprint(sql):
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('(...)', sql.replace('?', '%s'))
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def enabled():
+    return getattr(settings, 'PERF_MONITORING', False)
+
+
+def budget_for(view_name):
+    """``(max_queries, max_sql_ms, max_repeats)`` for ``view_name``."""
+    budget = {
+        'queries': getattr(settings, 'PERF_QUERY_BUDGET', 30),
+        'sql_ms': getattr(settings, 'PERF_SQL_TIME_BUDGET_MS', 200),
+        'repeats': getattr(settings, 'PERF_REPEATED_QUERY_THRESHOLD', 5),
+    }
+    budget.update(getattr(settings, 'PERF_VIEW_BUDGETS', {}).get(view_name, {}))
+    return budget['queries'], budget['sql_ms'], budget['repeats']
+
+
+class QueryRecorder:
+    """Collects every query run on any connection while installed."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duration_ms(self):
+        return self.duration * 1000
+
+    def repeated(self, threshold):
+        """Fingerprints run at least ``threshold`` times, most frequent first."""
+        return [(key, count) for key, count in self.fingerprints.most_common() if count >= threshold]
+
+    def violations(self, max_queries=None, max_sql_ms=None, max_repeats=None):
+        problems = []
+        if max_queries is not None and self.count > max_queries:
+            problems.append(f'{self.count} queries (budget {max_queries})')
+        if max_sql_ms is not None and self.duration_ms > max_sql_ms:
+            problems.append(f'{self.duration_ms:.1f}ms of SQL (budget {max_sql_ms}ms)')
+        if max_repeats is not None:
+            for key, count in self.repeated(max_repeats):
+                problems.append(f'{count}x {key[:200]}')
+        return problems
+
+
+@contextmanager
+def recording():
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+class ViewStats:
+    def __init__(self, name):
+        self.name = name
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.sql_ms = 0.0
+        self.max_sql_ms = 0.0
+        self.over_budget = 0
+        self.fingerprints = Counter()
+
+    @property
+    def avg_queries(self):
+        return self.queries / self.requests if self.requests else 0
+
+    @property
+    def avg_sql_ms(self):
+        return self.sql_ms / self.requests if self.requests else 0
+
+    def repeated(self):
+        return self.fingerprints.most_common(5)
+
+
+_lock = threading.Lock()
+_views = {}
+_recent = []
+
+
+def record(view_name, path, recorder, problems):
+    _, _, max_repeats = budget_for(view_name)
+    with _lock:
+        stats = _views.get(view_name)
+        if stats is None:
+            stats = _views[view_name] = ViewStats(view_name)
+        stats.requests += 1
+        stats.queries += recorder.count
+        stats.max_queries = max(stats.max_queries, recorder.count)
+        stats.sql_ms += recorder.duration_ms
+        stats.max_sql_ms = max(stats.max_sql_ms, recorder.duration_ms)
+        for key, count in recorder.repeated(max_repeats):
+            # Track the worst single-request repeat count per fingerprint
+            stats.fingerprints[key] = max(stats.fingerprints[key], count)
+        if len(stats.fingerprints) > MAX_FINGERPRINTS:
+            stats.fingerprints = Counter(dict(stats.fingerprints.most_common(MAX_FINGERPRINTS)))
+        if problems:
+            stats.over_budget += 1
+            _recent.insert(0, {
+                'view': view_name,
+                'path': path,
+                'queries': recorder.count,
+                'sql_ms': recorder.duration_ms,
+                'problems': problems,
+                'at': time.time(),
+            })
+            del _recent[MAX_RECENT:]
+
+
+def snapshot():
+    """Per-view stats (worst first) and recent over-budget requests."""
+    with _lock:
+        views = sorted(_views.values(), key=lambda stats: (stats.over_budget, stats.max_queries), reverse=True)
+        return views, list(_recent)
+
+
+def reset():
+    with _lock:
+        _views.clear()
+        _recent.clear()
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not enabled():
+            return self.get_response(request)
+        with recording() as recorder:
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        if match is None and not recorder.count:
+            # Static files served by WhiteNoise, 404s before any lookup
+            return response
+        view_name = match.view_name if match else '<unresolved>'
+        problems = recorder.violations(*budget_for(view_name))
+        if problems:
+            logger.warning(f"SQL budget exceeded in {view_name} ({request.path}): {'; '.join(problems)}")
+        record(view_name, request.path, recorder, problems)
+        if settings.DEBUG or getattr(getattr(request, 'user', None), 'is_staff', False):
+            response['Server-Timing'] = f'sql;dur={recorder.duration_ms:.1f};desc="{recorder.count} queries"'
+        return response
+
+
+@contextmanager
+def query_budget(max_queries=None, max_sql_ms=None, max_repeats=None):
+    """
+    Fail with ``AssertionError`` if the block exceeds the given budget::
+
+        with query_budget(max_queries=12, max_repeats=3):
+            client.get(reverse('index'))
+
+    Leave ``max_repeats`` set even when the count is generous: it is what
+    catches a new per-row query in a template.
+    """
+    with recording() as recorder:
+        yield recorder
+    problems = recorder.violations(max_queries, max_sql_ms, max_repeats)
+    if problems:
+        lines = '\n'.join(f'  {problem}' for problem in problems)
+        raise AssertionError(f'SQL budget exceeded:\n{lines}')
+
+
+class QueryBudgetMixin:
+    """
+    ``TestCase`` mixin: ``self.assertQueryBudget(url, max_queries=...)``
+    requests ``url`` with ``self.client`` under the view's configured budget,
+    or the one given.
+    """
+
+    def assertQueryBudget(self, url, max_queries=None, max_sql_ms=None, max_repeats=None, **get_kwargs):
+        with recording() as recorder:
+            response = self.client.get(url, **get_kwargs)
+        match = response.resolver_match
+        defaults = budget_for(match.view_name if match else '<unresolved>')
+        # SQL time is too noisy on CI to enforce unless asked for
+        problems = recorder.violations(
+            max_queries if max_queries is not None else defaults[0],
+            max_sql_ms,
+            max_repeats if max_repeats is not None else defaults[2],
+        )
+        if problems:
+            self.fail(f'SQL budget exceeded for {url}:\n' + '\n'.join(f'  {problem}' for problem in problems))
+        return response
@@ -0,0 +1,136 @@
+"""
+Daily activity rollups behind the admin dashboard.
+
+``rollup`` fills ``DailyMetrics`` from the day after the last final row up to
+today, with one grouped query per source table however many days are
+missing. Days before today are written as final and never touched again;
+today's row is rewritten on every run. Totals are the current exact counts
+minus what was created later, so the newest row always matches the tables.
+
+Revenue comes from the ledger's day aggregates (``core.ledger``), the same
+figures ``/adminxy/revenue/`` shows.
+
+Downloads only exist as running counters on tracks, so a day's
+downloads are the difference between two snapshots, and days filled in
+after the fact have none.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .ledger import ALL_TIME
+from .models import Album, BlogPost, DailyMetrics, DistributionRequest, RevenueAggregate, Track
+
+# Rollup name -> (model, creation timestamp)
+SOURCES = {
+    'users': (User, 'date_joined'),
+    'albums': (Album, 'created_at'),
+    'tracks': (Track, 'created_at'),
+    'blog_posts': (BlogPost, 'created_at'),
+    'requests': (DistributionRequest, 'requested_at'),
+}
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _per_day(queryset, field, since):
+    rows = (
+        queryset.filter(**{f'{field}__gte': since})
+        .annotate(day=TruncDate(field))
+        .values('day')
+        .annotate(value=Count('pk'))
+    )
+    return {row['day']: row['value'] for row in rows}
+
+
+def downloads_total():
+    # Album.downloads rolls up its tracks' downloads; adding it would count them twice
+    return Track.objects.aggregate(total=Sum('downloads'))['total'] or 0
+
+
+def first_activity_date():
+    dates = [model.objects.aggregate(first=Min(field))['first'] for model, field in SOURCES.values()]
+    dates = [timezone.localdate(value) for value in dates if value]
+    return min(dates) if dates else None
+
+
+def rollup(today=None):
+    """Write the missing days and today's row; returns the rows written."""
+    today = today or timezone.localdate()
+    last_final = DailyMetrics.objects.filter(is_final=True).order_by('-date').first()
+    start = last_final.date + timedelta(days=1) if last_final else (first_activity_date() or today)
+    start = min(start, today)
+    since = _start_of(start)
+    days = [start + timedelta(days=offset) for offset in range((today - start).days + 1)]
+
+    ledger = RevenueAggregate.objects.filter(platform_key=0)
+    created = {name: _per_day(model.objects.all(), field, since) for name, (model, field) in SOURCES.items()}
+    revenue = dict(ledger.filter(period='day', period_start__gte=start).values_list('period_start', 'amount'))
+    statuses_created = defaultdict(Counter)
+    for row in (
+        DistributionRequest.objects.filter(requested_at__gte=since)
+        .annotate(day=TruncDate('requested_at')).values('day', 'status').annotate(count=Count('pk'))
+    ):
+        statuses_created[row['day']][row['status']] += row['count']
+
+    # Current figures; walking back from today subtracts each day's additions
+    totals = {name: model.objects.count() for name, (model, _) in SOURCES.items()}
+    revenue_total = ledger.filter(period='all', period_start=ALL_TIME).values_list('amount', flat=True).first() or Decimal('0')
+    statuses = Counter(dict(DistributionRequest.objects.values_list('status').annotate(Count('pk'))))
+
+    existing = {row.date: row for row in DailyMetrics.objects.filter(date__gte=start)}
+    rows = []
+    for day in reversed(days):
+        row = existing.get(day) or DailyMetrics(date=day)
+        for name in SOURCES:
+            setattr(row, f'new_{name}', created[name].get(day, 0))
+            setattr(row, f'{name}_total', max(totals[name], 0))
+            totals[name] -= created[name].get(day, 0)
+        row.revenue = revenue.get(day) or Decimal('0')
+        row.revenue_total = revenue_total
+        revenue_total -= row.revenue
+        row.requests_by_status = {status: count for status, count in statuses.items() if count > 0}
+        statuses.subtract(statuses_created[day])
+        if day == today:
+            row.downloads_total = downloads_total()
+        row.is_final = day < today
+        rows.append(row)
+    rows.reverse()
+
+    previous = last_final.downloads_total if last_final else None
+    for row in rows:
+        if row.downloads_total is not None and previous is not None:
+            row.downloads = max(row.downloads_total - previous, 0)
+        previous = row.downloads_total
+
+    with transaction.atomic():
+        for row in rows:
+            row.save()
+    return rows
+
+
+def recent(days=90):
+    """Rollup rows for the last ``days`` days, oldest first."""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return list(DailyMetrics.objects.filter(date__gte=since).order_by('date'))
+
+
+def series(rows):
+    """Chart-ready values for ``rows``."""
+    return [
+        {
+            'date': row.date.isoformat(),
+            'new_users': row.new_users,
+            'uploads': row.new_albums + row.new_tracks,
+            'downloads': row.downloads,
+            'revenue': float(row.revenue),
+            'new_requests': row.new_requests,
+        }
+        for row in rows
+    ]
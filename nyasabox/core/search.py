@@ -0,0 +1,279 @@
+"""
+Full-text search over ``SearchDocument``.
+
+Each backend ranks documents by a weighted sum of per-field relevance,
+using the boosts in ``SEARCH_FIELD_BOOSTS``:
+
+* MySQL: InnoDB ``FULLTEXT`` indexes on ``title``, ``people``, ``body`` and
+  all three together, queried in boolean mode with prefix terms.
+* SQLite: an external-content FTS5 table kept in sync by triggers, ranked
+  with ``bm25()``.
+* Anything else: ``LIKE`` over the single denormalised table, which still
+  avoids the joins of searching the catalog tables directly.
+
+All terms must match (prefix match on each term).
+"""
+import re
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.expressions import RawSQL
+from .models import Album, BlogPost, SearchDocument, Track
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Long queries get no better with more terms, only slower
+MAX_TERMS = 8
+
+FIELDS = ('title', 'people', 'body')
+
+
+def _boosts():
+    boosts = getattr(settings, 'SEARCH_FIELD_BOOSTS', {})
+    defaults = {'title': 3.0, 'people': 2.0, 'body': 1.0}
+    return [float(boosts.get(field, defaults[field])) for field in FIELDS]
+
+
+def _max_results():
+    return getattr(settings, 'SEARCH_MAX_RESULTS', 500)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())[:MAX_TERMS]
+
+
+class SearchBackend:
+    """
+    Builds the SQL that matches documents (aliased ``d``) against the query
+    terms and scores them; ``SearchResults`` wraps it with filters, facets,
+    ordering and paging.
+    """
+    table = SearchDocument._meta.db_table
+
+    def source(self):
+        return f'{self.table} d'
+
+    def match(self, terms):
+        """Return ``(where_sql, where_params, score_sql, score_params)``."""
+        raise NotImplementedError
+
+
+class MySQLBackend(SearchBackend):
+    def match(self, terms):
+        expression = ' '.join(f'+{term}*' for term in terms)
+        title_boost, people_boost, body_boost = _boosts()
+        score = (
+            '%s * MATCH(d.title) AGAINST (%s IN BOOLEAN MODE)'
+            ' + %s * MATCH(d.people) AGAINST (%s IN BOOLEAN MODE)'
+            ' + %s * MATCH(d.body) AGAINST (%s IN BOOLEAN MODE)'
+        )
+        score_params = [title_boost, expression, people_boost, expression, body_boost, expression]
+        return 'MATCH(d.title, d.people, d.body) AGAINST (%s IN BOOLEAN MODE)', [expression], score, score_params
+
+
+class SQLiteBackend(SearchBackend):
+    @property
+    def fts_table(self):
+        return f'{self.table}_fts'
+
+    def source(self):
+        return f'{self.fts_table} JOIN {self.table} d ON d.id = {self.fts_table}.rowid'
+
+    def match(self, terms):
+        expression = ' '.join(f'"{term}"*' for term in terms)
+        return f'{self.fts_table} MATCH %s', [expression], f'-bm25({self.fts_table}, %s, %s, %s)', _boosts()
+
+
+class LikeBackend(SearchBackend):
+    """Portable fallback: substring matches over the one denormalised table."""
+
+    def match(self, terms):
+        where, where_params, score, score_params = [], [], [], []
+        for term in terms:
+            pattern = f'%{term}%'
+            where.append('(' + ' OR '.join(f'LOWER(d.{field}) LIKE %s' for field in FIELDS) + ')')
+            where_params += [pattern] * len(FIELDS)
+            for field, boost in zip(FIELDS, _boosts()):
+                score.append(f'CASE WHEN LOWER(d.{field}) LIKE %s THEN %s ELSE 0 END')
+                score_params += [pattern, boost]
+        return ' AND '.join(where), where_params, ' + '.join(score), score_params
+
+
+BACKENDS = {
+    'mysql': MySQLBackend,
+    'sqlite': SQLiteBackend,
+}
+
+
+def get_backend():
+    return BACKENDS.get(connection.vendor, LikeBackend)()
+
+
+# Catalog rows joined by primary key for genre facets and non-relevance sorts
+JOINS = f"""
+    LEFT JOIN {Track._meta.db_table} t ON d.kind = 'track' AND t.id = d.object_id
+    LEFT JOIN {Album._meta.db_table} a ON d.kind = 'album' AND a.id = d.object_id
+    LEFT JOIN {BlogPost._meta.db_table} b ON d.kind = 'blog' AND b.id = d.object_id
+"""
+GENRE_SQL = "COALESCE(t.genre, a.genre, '')"
+ORDERINGS = {
+    'relevance': 'score DESC, d.id',
+    'newest': 'COALESCE(t.created_at, a.created_at, b.created_at) DESC, d.id',
+    'popular': 'COALESCE(t.downloads, a.downloads, b.views) DESC, score DESC',
+}
+
+
+def _querysets():
+    return {
+        'track': Track.objects.select_related('album'),
+        'album': Album.objects.annotate(track_total=Count('tracks')),
+        'blog': BlogPost.objects.select_related('author', 'category'),
+    }
+
+
+class SearchHit:
+    def __init__(self, kind, obj, score):
+        self.kind = kind
+        self.object = obj
+        self.score = score
+
+
+class SearchResults:
+    """
+    Ranked matches across tracks, albums and blog posts, optionally limited
+    to one ``kind`` and one ``genre``.
+
+    Slicing runs a single windowed query and hydrates only that window, so it
+    can be handed straight to ``Paginator``. Facet counts for type and genre
+    come from one grouped aggregate over the whole match set: type counts
+    honour the genre filter and genre counts honour the type filter.
+    """
+
+    def __init__(self, query, kind=None, genre=None, sort='relevance'):
+        self.terms = tokenize(query)
+        self.kind = kind
+        self.genre = genre
+        self.ordering = ORDERINGS.get(sort, ORDERINGS['relevance'])
+        self.backend = get_backend()
+        self._facets = None
+
+    def facets(self):
+        if self._facets is not None:
+            return self._facets
+        types, genres, total = {}, {}, 0
+        if self.terms:
+            where, params, _, _ = self.backend.match(self.terms)
+            sql = f"""
+                SELECT d.kind, {GENRE_SQL}, COUNT(*)
+                FROM {self.backend.source()} {JOINS}
+                WHERE {where}
+                GROUP BY d.kind, {GENRE_SQL}
+            """
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+            for kind, genre, count in rows:
+                kind_matches = not self.kind or kind == self.kind
+                genre_matches = not self.genre or genre == self.genre
+                if genre_matches:
+                    types[kind] = types.get(kind, 0) + count
+                if kind_matches and genre:
+                    genres[genre] = genres.get(genre, 0) + count
+                if kind_matches and genre_matches:
+                    total += count
+        self._facets = {
+            'types': types,
+            'genres': sorted(genres.items(), key=lambda item: (-item[1], item[0])),
+            'total': total,
+        }
+        return self._facets
+
+    def count(self):
+        return self.facets()['total']
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else start + _max_results()
+        if not self.terms or stop <= start:
+            return []
+
+        where, params, score, score_params = self.backend.match(self.terms)
+        filters = [where]
+        if self.kind:
+            filters.append('d.kind = %s')
+            params = params + [self.kind]
+        if self.genre:
+            filters.append(f'{GENRE_SQL} = %s')
+            params = params + [self.genre]
+        sql = f"""
+            SELECT d.kind, d.object_id, {score} AS score
+            FROM {self.backend.source()} {JOINS}
+            WHERE {' AND '.join(filters)}
+            ORDER BY {self.ordering}
+            LIMIT %s OFFSET %s
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, score_params + params + [stop - start, start])
+            rows = cursor.fetchall()
+        return self._hydrate(rows)
+
+    def _hydrate(self, rows):
+        ids = {}
+        for kind, object_id, _ in rows:
+            ids.setdefault(kind, []).append(object_id)
+        querysets = _querysets()
+        objects = {kind: querysets[kind].in_bulk(pks) for kind, pks in ids.items()}
+        return [
+            SearchHit(kind, objects[kind][object_id], float(score))
+            for kind, object_id, score in rows
+            if object_id in objects[kind]
+        ]
+
+
+def matching_ids(query, kind):
+    """
+    Subquery of ``kind`` primary keys matching ``query``, for filtering a
+    catalog queryset with ``pk__in`` while keeping its own ordering.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return RawSQL(f'SELECT object_id FROM {SearchDocument._meta.db_table} WHERE 1 = 0', [])
+    backend = get_backend()
+    where, params, _, _ = backend.match(terms)
+    return RawSQL(f'SELECT d.object_id FROM {backend.source()} WHERE {where} AND d.kind = %s', params + [kind])
+
+
+def rebuild_index(batch_size=500):
+    """
+    Regenerate every document from the catalog tables. It runs in one
+    transaction, so searches keep seeing the old index until it commits and
+    a failure part way through leaves it untouched.
+    """
+    sources = [
+        ('track', Track.objects.select_related('album')),
+        ('album', Album.objects.all()),
+        ('blog', BlogPost.objects.select_related('author', 'category')),
+    ]
+    total = 0
+    with transaction.atomic():
+        SearchDocument.objects.all().delete()
+        for kind, queryset in sources:
+            batch = []
+            for obj in queryset.iterator(chunk_size=batch_size):
+                batch.append(SearchDocument.for_object(kind, obj))
+                if len(batch) >= batch_size:
+                    SearchDocument.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            SearchDocument.objects.bulk_create(batch)
+            total += len(batch)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                fts_table = SQLiteBackend().fts_table
+                cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+    return total
@@ -0,0 +1,174 @@
+"""
+Range-aware audio streaming for ``Track.audio_file``.
+
+Supports single-range ``Range``/``206`` responses, ``ETag``/``Last-Modified``
+conditional requests and ``If-Range``. When ``AUDIO_STREAM_OFFLOAD`` is set the
+response only carries an ``X-Accel-Redirect`` (nginx) or ``X-Sendfile``
+(Apache/lighttpd) header and the front-end server sends the bytes. Otherwise
+the file is returned through ``FileResponse``, which WSGI servers with
+``wsgi.file_wrapper`` support (gunicorn, uWSGI) hand to ``sendfile()``.
+"""
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, Http404
+from django.shortcuts import get_object_or_404, redirect
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_http_methods
+from .models import Track
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """
+    File wrapper limited to ``length`` bytes from ``start``.
+
+    The underlying file is positioned at ``start`` and ``fileno()`` is
+    exposed, so servers that use ``sendfile()`` for ``wsgi.file_wrapper``
+    send the range without copying it through Python.
+    """
+
+    def __init__(self, fileobj, start, length):
+        self.fileobj = fileobj
+        self.remaining = length
+        fileobj.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fileobj.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.fileobj.fileno()
+
+    def close(self):
+        self.fileobj.close()
+
+
+def parse_range(header, size):
+    """
+    Return ``(start, end)`` (inclusive) for a single byte range, ``None`` when
+    the header should be ignored, or raise ``ValueError`` if unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        # Missing, malformed or multi-range requests get the full file
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError('Empty suffix range or empty file')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('Range not satisfiable')
+    return start, min(end, size - 1)
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # Weak comparison, as required for If-None-Match
+    candidates = [tag.strip() for tag in header.split(',')]
+    return any((tag[2:] if tag.startswith('W/') else tag) == etag for tag in candidates)
+
+
+def _offload_response(track, content_type):
+    offload = getattr(settings, 'AUDIO_STREAM_OFFLOAD', None)
+    if offload == 'x-accel':
+        prefix = getattr(settings, 'AUDIO_STREAM_ACCEL_PREFIX', '/protected-media/')
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + track.audio_file.name.lstrip('/')
+        return response
+    if offload == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = track.audio_file.path
+        return response
+    return None
+
+
+@require_http_methods(['GET', 'HEAD'])
+def stream_track(request, slug):
+    track = get_object_or_404(Track, slug=slug)
+    if not track.audio_file:
+        raise Http404('Audio file not found.')
+
+    try:
+        path = track.audio_file.path
+    except NotImplementedError:
+        # Remote storage: let the storage backend serve it
+        return redirect(track.audio_file.url)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('Audio file not found.')
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    etag = quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    last_modified = int(stat.st_mtime)
+    cache_headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'public, max-age=86400',
+    }
+    attachment = request.GET.get('download') == '1'
+
+    # Conditional GET
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    if _etag_matches(if_none_match, etag) or (
+        not if_none_match and if_modified_since is not None and last_modified <= if_modified_since
+    ):
+        response = HttpResponseNotModified()
+        for header, value in cache_headers.items():
+            response[header] = value
+        return response
+
+    offloaded = _offload_response(track, content_type)
+    if offloaded is not None:
+        # The front-end server handles Range itself
+        response = offloaded
+    else:
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if range_header and (not if_range or if_range.strip() == etag or
+                             parse_http_date_safe(if_range) == last_modified):
+            try:
+                byte_range = parse_range(range_header, stat.st_size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{stat.st_size}'
+                response['Accept-Ranges'] = 'bytes'
+                return response
+
+        fileobj = open(path, 'rb')
+        if byte_range is None:
+            response = FileResponse(fileobj, content_type=content_type)
+            response['Content-Length'] = str(stat.st_size)
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = FileResponse(RangeFile(fileobj, start, length), status=206, content_type=content_type)
+            response['Content-Length'] = str(length)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+
+    for header, value in cache_headers.items():
+        response[header] = value
+    if attachment:
+        response['Content-Disposition'] = content_disposition_header(True, os.path.basename(track.audio_file.name))
+    return response
@@ -0,0 +1,17 @@
+from django import template
+from django.utils.safestring import mark_safe
+from core.cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def card(context, obj, template_name, **extra):
+    """Render one cached card; ``extra`` values are passed to it and keyed on."""
+    return mark_safe(render_cards([obj], template_name, context.get('request'), **extra))
+
+
+@register.simple_tag(takes_context=True)
+def cards(context, objects, template_name):
+    """Render a list of cached cards with a single cache round trip."""
+    return mark_safe(render_cards(objects, template_name, context.get('request')))
@@ -0,0 +1,44 @@
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+from core.images import available_widths, derivative_formats, derivative_name
+
+register = template.Library()
+
+
+def _source_name(image):
+    """Accept an ImageField value or a stored name/URL (as kept in snapshots)."""
+    name = getattr(image, 'name', image) or ''
+    if name.startswith(settings.MEDIA_URL):
+        name = name[len(settings.MEDIA_URL):]
+    return name
+
+
+@register.simple_tag
+def responsive_img(image, alt='', sizes='(max-width: 600px) 50vw, 320px', css_class=''):
+    """
+    Render a ``<picture>`` with AVIF/WebP ``srcset`` candidates for ``image``.
+
+    Falls back to a plain ``<img>`` of the original until derivatives exist.
+    """
+    name = _source_name(image)
+    if not name:
+        return ''
+    original_url = default_storage.url(name)
+    img = format_html(
+        '<img src="{}" alt="{}"{} loading="lazy" decoding="async">',
+        original_url, alt, format_html(' class="{}"', css_class) if css_class else '',
+    )
+    widths = available_widths(name)
+    if not widths:
+        return img
+
+    sources = format_html_join('', '<source type="image/{}" srcset="{}" sizes="{}">', (
+        (extension, ', '.join(
+            f'{default_storage.url(derivative_name(name, width, extension))} {width}w' for width in widths
+        ), sizes)
+        for extension, _ in derivative_formats()
+    ))
+    # display: contents keeps the <img> as the box that existing CSS sizes
+    return format_html('<picture style="display: contents">{}{}</picture>', sources, img)
@@ -1,3 +1,873 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import cards, counters, hls, images, ledger, outbox, pagination, paychangu, payments, rollups, search, streaming
+from .audio_meta import AudioMetadataError, extract_metadata
+from .management.commands import generate_waveforms, import_catalog
+from .models import (
+    Album, Artist, DistributionPlatform, DistributionRequest, HomepageSnapshot, OutboundEmail, PaymentTransaction,
+    RevenueEntry, SearchDocument, Track,
+)
+from .perf import QueryBudgetMixin
+
+
+def make_catalog(uploader, albums=3, tracks_per_album=4):
+    for a in range(albums):
+        album = Album.objects.create(
+            title=f'Album {a}', artist=f'Artist {a}', genre='afrobeat', release_date='2024-01-01',
+            cover_art='album_covers/cover.jpg', uploader=uploader,
+        )
+        for t in range(tracks_per_album):
+            Track.objects.create(
+                title=f'Song {a}-{t}', album=album, artist=album.artist, audio_file='tracks/song.mp3',
+                cover_art='track_covers/cover.jpg', uploader=uploader,
+            )
+
+
+class CatalogQueryBudgetTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('uploader', password='pw')
+        make_catalog(cls.user)
+
+    def test_listing_pages_do_not_query_per_row(self):
+        for name in ('index', 'search'):
+            with self.subTest(name=name):
+                response = self.assertQueryBudget(reverse(name), max_repeats=3, data={'q': 'song'})
+                self.assertEqual(response.status_code, 200)
+
+    def test_album_cards_do_not_count_tracks_per_album(self):
+        cache.clear()
+        response = self.assertQueryBudget(reverse('album_list'), max_repeats=2)
+        self.assertContains(response, '<span class="meta-number">4</span>', count=3, html=False)
+
+    def test_album_detail_within_budget(self):
+        album = Album.objects.first()
+        self.assertQueryBudget(album.get_absolute_url(), max_queries=30, max_repeats=3)
+
+
+@override_settings(PERF_MONITORING=True, DEBUG=False)
+class ServerTimingTests(TestCase):
+    def test_header_only_for_staff(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('website')))
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        self.assertIn('Server-Timing', self.client.get(reverse('website')))
+
+
+class PaymentTestMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = User.objects.create_user('payer', email='payer@example.com', password='pw')
+        cls.platforms = [DistributionPlatform.objects.create(name=name) for name in ('Spotify', 'Boomplay', 'Audiomack')]
+
+    def make_payment(self, charge_id='charge-1', amount='100.00', platforms=None, age=None):
+        request = DistributionRequest.objects.create(artist=self.artist, total_amount=Decimal(amount))
+        request.platforms.set(self.platforms if platforms is None else platforms)
+        payment = PaymentTransaction.objects.create(
+            distribution_request=request, charge_id=charge_id, amount=Decimal(amount),
+            mobile='0991234567', operator_ref_id='op',
+        )
+        if age:
+            PaymentTransaction.objects.filter(pk=payment.pk).update(created_at=timezone.now() - age)
+        return payment
+
+
+def webhook_payload(charge_id, status='success', amount='100.00'):
+    return {'charge_id': charge_id, 'status': status, 'amount': amount, 'currency': 'MWK'}
+
+
+class ClassifyTests(TestCase):
+    def test_verify_response_needs_gateway_confirmation(self):
+        unconfirmed = {'status': 'success', 'data': {'status': 'success'}}
+        confirmed = dict(unconfirmed, gateway_response={'status': {'success': True}})
+        self.assertEqual(payments.classify(unconfirmed), 'pending')
+        self.assertEqual(payments.classify(confirmed), 'success')
+        self.assertEqual(payments.classify({'status': 'successful', 'data': {'status': 'success'}}), 'success')
+
+    def test_flat_webhook_payloads(self):
+        self.assertEqual(payments.classify({'status': 'success'}), 'success')
+        self.assertEqual(payments.classify({'status': 'failed'}), 'failed')
+        self.assertEqual(payments.classify({'status': 'cancelled'}), 'cancelled')
+        self.assertEqual(payments.classify({'status': 'pending', 'message': 'user_cancelled'}), 'cancelled')
+        self.assertEqual(payments.classify({}), 'pending')
+        self.assertEqual(payments.classify(None), 'pending')
+
+
+class ApplyResultTests(PaymentTestMixin, TestCase):
+    def test_success_is_applied_once(self):
+        payment = self.make_payment()
+        _, changed = payments.apply_result(payment.charge_id, webhook_payload(payment.charge_id), source='test')
+        self.assertTrue(changed)
+        _, changed = payments.apply_result(payment.charge_id, webhook_payload(payment.charge_id), source='test')
+        self.assertFalse(changed)
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'success')
+        self.assertEqual(payment.distribution_request.status, 'paid')
+        self.assertEqual(RevenueEntry.objects.filter(charge_id=payment.charge_id).count(), len(self.platforms))
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+        self.assertEqual(ledger.check(), [])
+
+    def test_final_status_is_not_overwritten(self):
+        payment = self.make_payment()
+        payments.apply_result(payment.charge_id, webhook_payload(payment.charge_id, status='failed'))
+        _, changed = payments.apply_result(payment.charge_id, webhook_payload(payment.charge_id))
+        self.assertFalse(changed)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+        self.assertFalse(RevenueEntry.objects.exists())
+
+    def test_amount_mismatch_stays_pending(self):
+        payment = self.make_payment()
+        _, changed = payments.apply_result(payment.charge_id, webhook_payload(payment.charge_id, amount='1.00'))
+        self.assertFalse(changed)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'pending')
+
+
+@override_settings(PAYCHANGU_WEBHOOK_SECRET='webhook-secret')
+class WebhookTests(PaymentTestMixin, TestCase):
+    def post(self, body, signature):
+        return self.client.post(
+            reverse('paychangu_webhook'), body, content_type='application/json', HTTP_SIGNATURE=signature,
+        )
+
+    def test_bad_signature_is_rejected(self):
+        payment = self.make_payment()
+        response = self.post(json.dumps(webhook_payload(payment.charge_id)), 'not-the-signature')
+        self.assertEqual(response.status_code, 403)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'pending')
+
+    def test_signed_payload_is_applied(self):
+        payment = self.make_payment()
+        body = json.dumps(webhook_payload(payment.charge_id))
+        signature = hmac.new(b'webhook-secret', body.encode(), hashlib.sha256).hexdigest()
+        response = self.post(body, signature)
+        self.assertEqual(response.status_code, 200)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'success')
+
+
+class ReconcileTests(PaymentTestMixin, TestCase):
+    def test_pass_ends_while_provider_reports_pending(self):
+        for number in range(5):
+            self.make_payment(charge_id=f'stale-{number}', age=timedelta(minutes=10))
+        still_pending = {'status': 'success', 'data': {'status': 'pending'}}
+        with mock.patch.object(payments.paychangu, 'verify_charge', return_value=still_pending):
+            cursor, pages, checked = None, 0, 0
+            while True:
+                page_checked, settled, cursor = payments.reconcile(batch_size=2, workers=1, after=cursor)
+                pages += 1
+                checked += page_checked
+                self.assertEqual(settled, 0)
+                if cursor is None:
+                    break
+                self.assertLess(pages, 10, 'reconcile kept returning a cursor')
+        self.assertEqual(checked, 5)
+        self.assertEqual(pages, 3)
+
+
+class AllocateTests(TestCase):
+    def test_shares_sum_to_the_payment(self):
+        for amount in ('100.00', '100.01', '0.02', '99999.99', '5000.00'):
+            for platform_ids in ([1], [3, 1, 2], [4, 5, 6, 7, 8, 9, 10]):
+                with self.subTest(amount=amount, platforms=platform_ids):
+                    shares = ledger.allocate(Decimal(amount), platform_ids)
+                    self.assertEqual(sum(shares.values()), Decimal(amount))
+                    self.assertEqual(set(shares), set(platform_ids))
+                    self.assertLessEqual(max(shares.values()) - min(shares.values()), Decimal('0.01'))
+
+    def test_no_platforms_keeps_the_whole_amount_unallocated(self):
+        self.assertEqual(ledger.allocate(Decimal('10.00'), []), {None: Decimal('10.00')})
+
+
+class CounterTestMixin:
+    def setUp(self):
+        super().setUp()
+        # Flush by hand; the background thread would use its own connection
+        patcher = mock.patch.object(counters, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(counters._pending.clear)
+        counters._pending.clear()
+
+
+class RollupTests(CounterTestMixin, TestCase):
+    def test_album_track_download_counts_once(self):
+        user = User.objects.create_user('uploader', password='pw')
+        make_catalog(user, albums=1, tracks_per_album=1)
+        counters.record_download(Track.objects.get())
+        counters.flush()
+        self.assertEqual(Album.objects.get().downloads, 1)
+
+        row = rollups.rollup()[-1]
+        self.assertEqual(row.downloads_total, 1)
+
+
+class CounterTests(CounterTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user('uploader', password='pw')
+        make_catalog(user, albums=1, tracks_per_album=1)
+        self.track = Track.objects.get()
+        self.snapshot = HomepageSnapshot.objects.create(key='home')
+        self.addCleanup(setattr, counters, '_last_snapshot_bump', counters._last_snapshot_bump)
+
+    def totals(self):
+        track = Track.objects.get()
+        return track.downloads, Album.objects.get().downloads, Artist.objects.get(pk=track.artist_ref_id).total_downloads
+
+    def test_downloads_are_buffered_until_flush(self):
+        for _ in range(3):
+            counters.record_download(self.track)
+        self.assertEqual(counters.pending_count(), 3)
+        self.assertEqual(self.totals(), (0, 0, 0))
+
+        self.assertEqual(counters.flush(), 3)
+        self.assertEqual(counters.pending_count(), 0)
+        self.assertEqual(self.totals(), (3, 3, 3))
+
+    @override_settings(COUNTER_FLUSH_THRESHOLD=3)
+    def test_threshold_wakes_the_flusher(self):
+        self.addCleanup(counters._wakeup.clear)
+        counters._wakeup.clear()
+        counters.increment(Track, self.track.pk, 'downloads')
+        self.assertFalse(counters._wakeup.is_set())
+        counters.record_download(self.track)
+        self.assertTrue(counters._wakeup.is_set())
+
+    def test_failed_flush_keeps_increments(self):
+        counters.record_download(self.track)
+        with mock.patch.object(counters.transaction, 'atomic', side_effect=DatabaseError('gone')), \
+                self.assertLogs('core.counters', 'ERROR'):
+            self.assertEqual(counters.flush(), 0)
+        self.assertEqual(counters.pending_count(), 3)
+        counters.flush()
+        self.assertEqual(self.totals(), (1, 1, 1))
+
+    @override_settings(COUNTER_SNAPSHOT_REFRESH_SECONDS=300)
+    def test_flush_bumps_homepage_version_at_most_once_per_interval(self):
+        counters._last_snapshot_bump = time.monotonic() - 301
+        counters.record_download(self.track)
+        counters.flush()
+        self.snapshot.refresh_from_db()
+        self.assertEqual(self.snapshot.version, 1)
+
+        counters.record_download(self.track)
+        counters.flush()
+        self.snapshot.refresh_from_db()
+        self.assertEqual(self.snapshot.version, 1)
+
+    def test_track_edit_keeps_flushed_downloads(self):
+        edited = Track.objects.get()
+        counters.record_download(self.track)
+        counters.flush()
+        edited.title = 'Renamed'
+        edited.save()
+        self.assertEqual(Track.objects.get().downloads, 1)
+
+class AudioMetadataTests(TestCase):
+    def assertUnreadable(self, data):
+        with self.assertRaises(AudioMetadataError):
+            extract_metadata(io.BytesIO(data), len(data), 'upload')
+
+    def test_truncated_wav_fmt_chunk(self):
+        self.assertUnreadable(
+            b'RIFF' + struct.pack('<I', 100) + b'WAVE' + b'fmt ' + struct.pack('<I', 16) + b'\x01\x00\x02\x00'
+        )
+
+    def test_truncated_id3_extended_header(self):
+        # ID3v2.3 with the extended-header flag set and the tag cut short
+        self.assertUnreadable(b'ID3\x03\x00\x40' + bytes([0, 0, 0, 20]) + b'\x00\x00')
+
+
+def wav_bytes(seconds=1, rate=8000):
+    data = b'\x00\x00' * rate * seconds
+    fmt = struct.pack('<HHIIHH', 1, 1, rate, rate * 2, 2, 16)
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'data' + struct.pack('<I', len(data)) + data
+    return b'RIFF' + struct.pack('<I', len(body)) + body
+
+
+class ImportCatalogTests(TestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.media)
+        User.objects.create_user('importer', password='pw')
+        album_dir = os.path.join(self.source, 'Artist', 'Album')
+        os.makedirs(album_dir)
+        for number in (1, 2):
+            with open(os.path.join(album_dir, f'0{number} Song.wav'), 'wb') as handle:
+                handle.write(wav_bytes())
+
+    def test_truncated_file_is_still_inspected(self):
+        path = os.path.join(self.source, 'broken.wav')
+        with open(path, 'wb') as handle:
+            handle.write(wav_bytes()[:30])
+        _, digest, metadata, error = import_catalog._inspect(path)
+        self.assertIsNone(error)
+        self.assertIsNone(metadata)
+        self.assertTrue(digest)
+
+    def test_failed_insert_leaves_no_files(self):
+        create_tracks = import_catalog.Command.create_tracks
+
+        def fail_after_storing(command, *args):
+            create_tracks(command, *args)
+            raise RuntimeError('insert failed')
+
+        with override_settings(MEDIA_ROOT=self.media), \
+                mock.patch.object(import_catalog.Command, 'create_tracks', fail_after_storing):
+            with self.assertRaises(RuntimeError):
+                call_command('import_catalog', self.source, uploader='importer', workers=1, stdout=io.StringIO())
+        self.assertFalse(Album.objects.exists())
+        self.assertEqual([files for _, _, files in os.walk(self.media) if files], [])
+
+
+class HlsPackagingTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+        user = User.objects.create_user('uploader', password='pw')
+        self.track = Track.objects.create(
+            title='Song', artist='Artist', audio_file='tracks/one.mp3', cover_art='track_covers/cover.jpg', uploader=user,
+        )
+
+    def fake_build(self, replace_audio=False):
+        def build(track):
+            if replace_audio:
+                track = Track.objects.get(pk=track.pk)
+                track.audio_file = 'tracks/two.mp3'
+                track.save()
+            work_dir = tempfile.mkdtemp()
+            with open(os.path.join(work_dir, 'master.m3u8'), 'w') as handle:
+                handle.write('#EXTM3U\n')
+            return work_dir
+        return build
+
+    def test_rendition_is_published(self):
+        with mock.patch.object(hls, 'build_rendition', self.fake_build()):
+            self.assertTrue(hls.process_track(self.track.pk))
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.hls_status, 'ready')
+        self.assertTrue(os.path.exists(os.path.join(self.media, self.track.hls_manifest)))
+
+    def test_audio_replaced_while_packaging_is_requeued(self):
+        with mock.patch.object(hls, 'build_rendition', self.fake_build(replace_audio=True)):
+            self.assertFalse(hls.process_track(self.track.pk))
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.hls_status, 'pending')
+        self.assertEqual(self.track.hls_manifest, '')
+        self.assertFalse(os.path.exists(os.path.join(self.media, hls.HLS_DIR, str(self.track.pk))))
+
+    def test_hung_ffmpeg_fails_the_track(self):
+        with mock.patch.object(hls.subprocess, 'run', side_effect=hls.subprocess.TimeoutExpired('ffmpeg', 1)), \
+                mock.patch.object(Track.audio_file.field.storage, 'path', return_value='/dev/null'):
+            self.assertFalse(hls.process_track(self.track.pk))
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.hls_status, 'failed')
+
+
+class GenerateWaveformsTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = override_settings(MEDIA_ROOT=self.media)
+        media.enable()
+        self.addCleanup(media.disable)
+        user = User.objects.create_user('uploader', password='pw')
+        self.track = Track.objects.create(
+            title='Song', artist='Artist', audio_file='tracks/one.mp3', cover_art='track_covers/cover.jpg', uploader=user,
+        )
+
+    def run_jobs(self, replace_audio=False):
+        track = self.track
+
+        class InlineExecutor:
+            def __init__(self, max_workers=None):
+                pass
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def map(self, fn, jobs):
+                for track_id, path, audio_name in jobs:
+                    if replace_audio:
+                        track.audio_file = 'tracks/two.mp3'
+                        track.save()
+                    yield track_id, audio_name, b'peaks', None
+
+        command = generate_waveforms.Command(stdout=io.StringIO(), stderr=io.StringIO())
+        with mock.patch.object(generate_waveforms, 'ProcessPoolExecutor', InlineExecutor):
+            command._run([(track.pk, '/dev/null', 'tracks/one.mp3')], None)
+
+    def stored_waveforms(self):
+        directory = os.path.join(self.media, 'waveforms')
+        return os.listdir(directory) if os.path.isdir(directory) else []
+
+    def test_waveform_is_recorded(self):
+        self.run_jobs()
+        self.track.refresh_from_db()
+        self.assertTrue(self.track.waveform.name)
+        self.assertEqual(len(self.stored_waveforms()), 1)
+
+    def test_audio_replaced_mid_run_discards_waveform(self):
+        self.run_jobs(replace_audio=True)
+        self.track.refresh_from_db()
+        self.assertEqual(self.track.waveform.name, '')
+        self.assertEqual(self.stored_waveforms(), [])
+
+
+class TrackSaveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('uploader', password='pw')
+        self.track = Track.objects.create(
+            title='Song', artist='Artist', audio_file='tracks/one.mp3', cover_art='track_covers/cover.jpg', uploader=self.user,
+        )
+
+    def test_edit_keeps_counters_bumped_meanwhile(self):
+        stale = Track.objects.get(pk=self.track.pk)
+        Track.objects.filter(pk=self.track.pk).update(downloads=F('downloads') + 5, like_count=F('like_count') + 2, hls_status='ready')
+        stale.title = 'Renamed'
+        stale.save()
+        fresh = Track.objects.get(pk=self.track.pk)
+        self.assertEqual((fresh.title, fresh.downloads, fresh.like_count, fresh.hls_status), ('Renamed', 5, 2, 'ready'))
+
+    def test_named_counter_is_written(self):
+        self.track.downloads = 7
+        self.track.save(update_fields=['downloads'])
+        self.assertEqual(Track.objects.get(pk=self.track.pk).downloads, 7)
+
+    def test_new_audio_resets_packaging(self):
+        Track.objects.filter(pk=self.track.pk).update(hls_status='ready', hls_manifest='hls/1/master.m3u8')
+        track = Track.objects.get(pk=self.track.pk)
+        track.audio_file = 'tracks/two.mp3'
+        track.save()
+        fresh = Track.objects.get(pk=self.track.pk)
+        self.assertEqual((fresh.hls_status, fresh.hls_manifest), ('pending', ''))
+
+    def test_artist_change_moves_live_downloads(self):
+        stale = Track.objects.get(pk=self.track.pk)
+        Track.objects.filter(pk=self.track.pk).update(downloads=4)
+        Artist.objects.filter(name='Artist').update(total_downloads=4)
+        stale.artist = 'Someone Else'
+        stale.save()
+        totals = dict(Artist.objects.values_list('name', 'total_downloads'))
+        self.assertEqual((totals['Artist'], totals['Someone Else']), (0, 4))
+
+
+class ParseRangeTests(TestCase):
+    def test_single_range(self):
+        self.assertEqual(streaming.parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(streaming.parse_range('bytes=900-5000', 1000), (900, 999))
+
+    def test_suffix_range(self):
+        self.assertEqual(streaming.parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(streaming.parse_range('bytes=-5000', 1000), (0, 999))
+
+    def test_open_ended_range(self):
+        self.assertEqual(streaming.parse_range('bytes=500-', 1000), (500, 999))
+
+    def test_ignored_headers(self):
+        for header in (None, '', 'items=0-1', 'bytes=-', 'bytes=0-1,5-6'):
+            self.assertIsNone(streaming.parse_range(header, 1000))
+
+    def test_unsatisfiable(self):
+        for header, size in (('bytes=1000-', 1000), ('bytes=5-4', 1000), ('bytes=-0', 1000),
+                             ('bytes=-10', 0), ('bytes=0-', 0)):
+            with self.assertRaises(ValueError):
+                streaming.parse_range(header, size)
+
+
+class StreamTrackTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media = override_settings(MEDIA_ROOT=self.media, AUDIO_STREAM_OFFLOAD=None)
+        media.enable()
+        self.addCleanup(media.disable)
+        os.makedirs(os.path.join(self.media, 'tracks'))
+        self.data = bytes(range(256)) * 4
+        with open(os.path.join(self.media, 'tracks', 'one.mp3'), 'wb') as handle:
+            handle.write(self.data)
+        user = User.objects.create_user('uploader', password='pw')
+        track = Track.objects.create(
+            title='Song', artist='Artist', audio_file='tracks/one.mp3', cover_art='track_covers/cover.jpg', uploader=user,
+        )
+        self.url = reverse('stream_track', kwargs={'slug': track.slug})
+
+    def test_range_request(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content), self.data[10:20])
+
+    def test_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.data[-4:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '1024')
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    @override_settings(AUDIO_STREAM_OFFLOAD='x-accel', AUDIO_STREAM_ACCEL_PREFIX='/protected-media/')
+    def test_x_accel_offload(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/tracks/one.mp3')
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(EMAIL_OUTBOX_LEASE_SECONDS=300, EMAIL_OUTBOX_MAX_ATTEMPTS=3,
+                   EMAIL_OUTBOX_RETRY_BASE_SECONDS=30, EMAIL_OUTBOX_RETRY_MAX_SECONDS=3600)
+class OutboxTests(TestCase):
+    def queue(self, **fields):
+        email = outbox.queue_email('Hello', 'emails/welcome.html', {}, ['fan@example.com'])
+        if fields:
+            OutboundEmail.objects.filter(pk=email.pk).update(**fields)
+        return email
+
+    def run_batch(self, send=None):
+        worker = outbox.OutboxWorker()
+        with mock.patch.object(outbox.OutboxWorker, 'send', side_effect=send):
+            return worker.run_batch()
+
+    def test_claim_takes_due_and_expired_rows(self):
+        now = timezone.now()
+        due = self.queue()
+        self.queue(next_attempt_at=now + timedelta(minutes=5))
+        self.queue(status='sending', locked_until=now + timedelta(minutes=5))
+        expired = self.queue(status='sending', locked_until=now - timedelta(seconds=1))
+
+        claimed = outbox.OutboxWorker().claim()
+        self.assertEqual({email.pk for email in claimed}, {due.pk, expired.pk})
+        self.assertEqual(outbox.OutboxWorker().claim(), [])
+        lease = OutboundEmail.objects.get(pk=due.pk).locked_until
+        self.assertEqual(lease, claimed[0].locked_until)
+        self.assertGreater(lease, now)
+
+    def test_sent_email_releases_lease(self):
+        email = self.queue()
+        self.assertEqual(self.run_batch(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.locked_until), ('sent', 1, None))
+        self.assertIsNotNone(email.sent_at)
+
+    def test_failure_backs_off_then_gives_up(self):
+        email = self.queue()
+        with self.assertLogs('core.outbox', 'WARNING'):
+            self.assertEqual(self.run_batch(send=ConnectionError('refused')), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertGreaterEqual(email.next_attempt_at, timezone.now() + timedelta(seconds=29))
+
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now(), attempts=2)
+        with self.assertLogs('core.outbox', 'WARNING'):
+            self.run_batch(send=ConnectionError('refused'))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('failed', 3, 'refused'))
+
+    def test_retry_delay_doubles_up_to_the_cap(self):
+        with mock.patch.object(outbox.random, 'uniform', return_value=0):
+            self.assertEqual([outbox.retry_delay(n) for n in (1, 2, 3, 20)], [30, 60, 120, 3600])
+
+    def test_result_after_lost_lease_is_dropped(self):
+        email = self.queue()
+        takeover = timezone.now() + timedelta(minutes=10)
+
+        def send(claimed):
+            # Another worker reclaimed the row after this worker's lease expired
+            OutboundEmail.objects.filter(pk=claimed.pk).update(locked_until=takeover)
+            raise ConnectionError('refused')
+
+        with self.assertLogs('core.outbox', 'WARNING') as logs:
+            self.run_batch(send=send)
+        self.assertIn('lease expired', logs.output[-1])
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts, email.locked_until), ('sending', 0, takeover))
+
+    def test_expired_lease_is_not_sent(self):
+        self.queue()
+        worker = outbox.OutboxWorker()
+        with mock.patch.object(outbox.OutboxWorker, 'send') as send, \
+                override_settings(EMAIL_OUTBOX_LEASE_SECONDS=0):
+            self.assertEqual(worker.run_batch(), (0, 0))
+        send.assert_not_called()
+
+
+def provider_response(data, status_code=200):
+    response = mock.Mock(status_code=status_code)
+    response.json.return_value = data
+    return response
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.breaker = paychangu.CircuitBreaker('test', failure_threshold=2, reset_timeout=30)
+        self.now = 1000.0
+        patcher = mock.patch.object(paychangu.time, 'monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fail(self):
+        with self.assertRaises(ValueError):
+            self.breaker.call(mock.Mock(side_effect=ValueError))
+
+    def test_opens_after_consecutive_failures(self):
+        self.fail()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.fail()
+        self.assertEqual(self.breaker.state, 'open')
+        with self.assertRaises(paychangu.CircuitOpen):
+            self.breaker.call(mock.Mock())
+        self.assertEqual(self.breaker.rejected, 1)
+
+    def test_one_trial_closes_it_again(self):
+        self.fail()
+        self.fail()
+        self.now += 30
+        self.assertEqual(self.breaker.state, 'half-open')
+        self.assertEqual(self.breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual((self.breaker.state, self.breaker.failures), ('closed', 0))
+
+    def test_failed_trial_reopens(self):
+        self.fail()
+        self.fail()
+        self.now += 30
+        self.fail()
+        self.assertEqual(self.breaker.state, 'open')
+
+
+class PayChanguClientTests(TestCase):
+    def setUp(self):
+        self.circuits = {
+            endpoint: paychangu.CircuitBreaker(endpoint, failure_threshold=1, reset_timeout=30)
+            for endpoint in paychangu.DEFAULT_TIMEOUTS
+        }
+        self.client = paychangu.PayChanguClient(api_key='test', base_url='http://provider', circuits=self.circuits)
+        patcher = mock.patch.object(self.client.session, 'request')
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_breakers_are_per_endpoint(self):
+        self.request.side_effect = paychangu.requests.Timeout('slow')
+        with self.assertRaises(paychangu.PayChanguError):
+            self.client.operators()
+        self.assertEqual(self.circuits['operators'].state, 'open')
+
+        self.request.side_effect = None
+        self.request.return_value = provider_response({'status': 'success', 'data': {'charge_id': 'c1'}})
+        self.assertEqual(self.client.initialize({})['data']['charge_id'], 'c1')
+        with self.assertRaises(paychangu.PayChanguError) as raised:
+            self.client.operators()
+        self.assertEqual(raised.exception.kind, 'circuit_open')
+
+    def test_non_object_body_is_an_invalid_response(self):
+        for body in (['not', 'an', 'object'], 'text', None):
+            self.request.return_value = provider_response(body)
+            with self.assertRaises(paychangu.PayChanguError) as raised:
+                self.client.initialize({})
+            self.assertEqual(raised.exception.kind, 'invalid_response')
+
+    def test_operator_list_must_be_an_array(self):
+        self.request.return_value = provider_response({'data': {'id': 1}})
+        with self.assertRaises(paychangu.PayChanguError) as raised:
+            self.client.operators()
+        self.assertEqual(raised.exception.kind, 'invalid_response')
+
+
+@override_settings(PAYCHANGU_OPERATORS_TTL=600)
+class OperatorCacheTests(TestCase):
+    operators = [{'id': 1, 'name': 'Airtel Money'}]
+
+    def setUp(self):
+        cache.delete(paychangu.OPERATORS_CACHE_KEY)
+        self.addCleanup(cache.delete, paychangu.OPERATORS_CACHE_KEY)
+        self.fetch = mock.Mock(return_value=self.operators)
+        patcher = mock.patch.object(paychangu, 'client', return_value=mock.Mock(operators=self.fetch))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cold_cache_fetches_once(self):
+        self.assertEqual(paychangu.get_mobile_money_operators(), self.operators)
+        self.assertEqual(paychangu.get_mobile_money_operators(), self.operators)
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_stale_entry_is_served_while_refreshing(self):
+        cache.set(paychangu.OPERATORS_CACHE_KEY, {'operators': ['old'], 'fetched_at': time.time() - 601})
+        with mock.patch.object(paychangu, '_refresh_in_background') as refresh:
+            self.assertEqual(paychangu.get_mobile_money_operators(), ['old'])
+        refresh.assert_called_once_with()
+        self.fetch.assert_not_called()
+
+    def test_failed_cold_fetch_is_not_cached(self):
+        self.fetch.side_effect = paychangu.PayChanguError('operators', 'timeout', 'slow')
+        with self.assertLogs('core.paychangu', 'ERROR'):
+            self.assertEqual(paychangu.get_mobile_money_operators(), [])
+        self.assertIsNone(cache.get(paychangu.OPERATORS_CACHE_KEY))
+
+
+@override_settings(SEARCH_FIELD_BOOSTS={'title': 3, 'people': 2, 'body': 1})
+class SearchQueryTests(TestCase):
+    def test_tokenize(self):
+        self.assertEqual(search.tokenize('  Lucius BANDA: "Cell"-phone '), ['lucius', 'banda', 'cell', 'phone'])
+        self.assertEqual(len(search.tokenize(' '.join(['word'] * 20))), search.MAX_TERMS)
+
+    def test_mysql_boolean_prefix_terms(self):
+        where, params, score, score_params = search.MySQLBackend().match(['lucius', 'banda'])
+        self.assertEqual(params, ['+lucius* +banda*'])
+        self.assertIn('MATCH(d.title, d.people, d.body)', where)
+        self.assertEqual(score_params, [3.0, '+lucius* +banda*', 2.0, '+lucius* +banda*', 1.0, '+lucius* +banda*'])
+
+    def test_sqlite_fts5_prefix_terms(self):
+        backend = search.SQLiteBackend()
+        where, params, score, score_params = backend.match(['lucius', 'banda'])
+        self.assertEqual(params, ['"lucius"* "banda"*'])
+        self.assertEqual(where, f'{backend.fts_table} MATCH %s')
+        self.assertEqual(score_params, [3.0, 2.0, 1.0])
+
+    def test_like_fallback_requires_every_term(self):
+        where, params, score, score_params = search.LikeBackend().match(['lucius', 'banda'])
+        self.assertEqual(where.count(' AND '), 1)
+        self.assertEqual(params, ['%lucius%'] * 3 + ['%banda%'] * 3)
+        self.assertEqual(score_params[:2], ['%lucius%', 3.0])
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        make_catalog(User.objects.create_user('uploader', password='pw'), albums=2, tracks_per_album=2)
+
+    def test_rebuild_and_search(self):
+        self.assertEqual(search.rebuild_index(batch_size=3), 6)
+        hits = search.SearchResults('song')[:10]
+        self.assertEqual(sorted(hit.object.title for hit in hits), ['Song 0-0', 'Song 0-1', 'Song 1-0', 'Song 1-1'])
+        self.assertEqual(search.SearchResults('album', kind='album').facets()['types'], {'album': 2, 'track': 4})
+
+    def test_failed_rebuild_keeps_the_old_index(self):
+        search.rebuild_index()
+        with mock.patch.object(SearchDocument.objects, 'bulk_create', side_effect=DatabaseError('disk full')):
+            with self.assertRaises(DatabaseError):
+                search.rebuild_index()
+        self.assertEqual(SearchDocument.objects.count(), 6)
+        self.assertEqual(search.SearchResults('song').count(), 4)
+
+
+class KeysetPaginationTests(TestCase):
+    def test_cursor_round_trip(self):
+        created = timezone.now().replace(microsecond=123456)
+        cursor = pagination.encode_cursor('prev', [created, 42])
+        self.assertEqual(pagination.decode_cursor(cursor, Track, ['created_at', 'id']), ('prev', [created, 42]))
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', pagination.encode_cursor('sideways', [1]), pagination.encode_cursor('next', [1, 2])):
+            with self.assertRaises(pagination.InvalidCursor):
+                pagination.decode_cursor(cursor, Track, ['id'])
+
+    def test_pages_forward_and_back(self):
+        make_catalog(User.objects.create_user('uploader', password='pw'), albums=1, tracks_per_album=5)
+        Track.objects.filter(title__in=['Song 0-1', 'Song 0-3']).update(title='Same')
+        ordering = ['title', 'id']
+        expected = list(Track.objects.order_by(*ordering).values_list('pk', flat=True))
+
+        first = pagination.paginate(Track.objects.all(), ordering, per_page=2)
+        second = pagination.paginate(Track.objects.all(), ordering, first.next_cursor, per_page=2)
+        third = pagination.paginate(Track.objects.all(), ordering, second.next_cursor, per_page=2)
+        self.assertEqual([track.pk for page in (first, second, third) for track in page], expected)
+        self.assertFalse(first.has_previous)
+        self.assertFalse(third.has_next)
+
+        back = pagination.paginate(Track.objects.all(), ordering, third.previous_cursor, per_page=2)
+        self.assertEqual([track.pk for track in back], [track.pk for track in second])
+        self.assertTrue(back.has_next and back.has_previous)
+
+
+@override_settings(IMAGE_KNOWN_MAX_ENTRIES=2, IMAGE_MISSING_RECHECK_SECONDS=60)
+class ImageMemoTests(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        for patcher in (
+            mock.patch.object(images.time, 'monotonic', side_effect=lambda: self.now),
+            mock.patch.dict(images._known, clear=True),
+            mock.patch.object(images.default_storage, 'exists', return_value=False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.exists = images.default_storage.exists
+
+    def test_misses_are_remembered_briefly(self):
+        self.assertIsNone(images.available_widths('covers/a.jpg'))
+        self.assertIsNone(images.available_widths('covers/a.jpg'))
+        self.assertEqual(self.exists.call_count, 1)
+
+        self.now += 60
+        self.assertIsNone(images.available_widths('covers/a.jpg'))
+        self.assertEqual(self.exists.call_count, 2)
+
+    def test_memo_keeps_the_most_recently_used(self):
+        images._remember('a', [160])
+        images._remember('b', [160])
+        images.available_widths('a')
+        images._remember('c', [160])
+        self.assertEqual(list(images._known), ['a', 'c'])
+
+
+class CardKeyTests(TestCase):
+    def setUp(self):
+        make_catalog(User.objects.create_user('uploader', password='pw'), albums=1, tracks_per_album=2)
+        self.album = Album.objects.get()
+
+    def track_keys(self):
+        return [cards.card_key('partials/track_card.html', track) for track in Track.objects.order_by('pk')]
+
+    def test_album_save_moves_its_track_cards(self):
+        before = self.track_keys()
+        self.album.title = 'Renamed'
+        self.album.save()
+        self.assertTrue(all(old != new for old, new in zip(before, self.track_keys())))
+
+    def test_artist_save_moves_its_track_cards(self):
+        before = self.track_keys()
+        artist = Artist.objects.get(pk=self.album.artist_ref_id)
+        artist.cover_art = 'artist_covers/new.jpg'
+        artist.save()
+        self.assertTrue(all(old != new for old, new in zip(before, self.track_keys())))
+
+    def test_touching_an_album_moves_its_track_cards(self):
+        before = self.track_keys()
+        cards.touch(Album, [self.album.pk])
+        self.assertTrue(all(old != new for old, new in zip(before, self.track_keys())))
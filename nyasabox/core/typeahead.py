@@ -0,0 +1,237 @@
+"""
+In-memory typeahead for the live search dropdown (``search?format=json``).
+
+Each worker process holds a sorted array of normalised keys -- one for every
+word position in track titles, album titles and artist names -- so a prefix
+lookup is a ``bisect`` plus a short forward scan, with no database access.
+
+The index is built in a background thread started by each worker process's
+first request (so a pre-forking server builds it after the fork), patched
+in place by the save/delete receivers in ``core.models`` once the
+transaction commits, and rebuilt in a background thread every
+``TYPEAHEAD_REFRESH_SECONDS`` so writes made by other workers and counter
+changes show up too.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from django.conf import settings
+from django.urls import reverse
+
+logger = logging.getLogger(__name__)
+
+NON_WORD_RE = re.compile(r'[\W_]+')
+
+# Candidates examined per lookup; bounds the cost of one-letter prefixes
+SCAN_LIMIT = 500
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return NON_WORD_RE.sub(' ', text.lower()).strip()
+
+
+def _keys(*names):
+    """Every word-start suffix of each name: "nasty c" -> "nasty c", "c"."""
+    keys = set()
+    for name in names:
+        words = normalize(name).split()
+        for position in range(len(words)):
+            keys.add(' '.join(words[position:]))
+    return keys
+
+
+def _file_url(field):
+    return field.url if field else None
+
+
+def track_entry(track):
+    cover = track.cover_art or (track.album.cover_art if track.album else None)
+    return {
+        'type': 'track',
+        'title': track.title,
+        'artist': track.artist,
+        'cover_url': _file_url(cover),
+        'url': reverse('track_detail', kwargs={'slug': track.slug}),
+    }, track.downloads, _keys(track.title, track.artist)
+
+
+def album_entry(album):
+    return {
+        'type': 'album',
+        'title': album.title,
+        'artist': album.artist,
+        'cover_url': _file_url(album.cover_art),
+        'url': reverse('album_detail', kwargs={'slug': album.slug}),
+    }, album.downloads, _keys(album.title, album.artist)
+
+
+def artist_entry(artist):
+    return {
+        'type': 'artist',
+        'title': artist.name,
+        'artist': 'Artist',
+        'cover_url': _file_url(artist.cover_art),
+        'url': reverse('artist_detail', kwargs={'slug': artist.slug}),
+    }, artist.total_downloads, _keys(artist.name)
+
+
+class PrefixIndex:
+    def __init__(self):
+        self.keys = []        # sorted (key, entry id)
+        self.entries = {}     # entry id -> (payload, weight, keys)
+
+    def add(self, entry_id, payload, weight, keys):
+        self.remove(entry_id)
+        self.entries[entry_id] = (payload, weight, keys)
+        for key in keys:
+            bisect.insort(self.keys, (key, entry_id))
+
+    def remove(self, entry_id):
+        entry = self.entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for key in entry[2]:
+            position = bisect.bisect_left(self.keys, (key, entry_id))
+            if position < len(self.keys) and self.keys[position] == (key, entry_id):
+                del self.keys[position]
+
+    def bulk_load(self, items):
+        for entry_id, payload, weight, keys in items:
+            self.entries[entry_id] = (payload, weight, keys)
+            self.keys.extend((key, entry_id) for key in keys)
+        self.keys.sort()
+
+    def suggest(self, query, limit):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        matches = {}
+        position = bisect.bisect_left(self.keys, (prefix,))
+        for key, entry_id in self.keys[position:position + SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            entry = self.entries.get(entry_id)
+            if entry is not None and entry_id not in matches:
+                payload, weight, _ = entry
+                # Exact name matches first, then by popularity
+                matches[entry_id] = (key == prefix, weight, payload)
+        ranked = sorted(matches.values(), key=lambda match: (match[0], match[1]), reverse=True)
+        return [payload for _, _, payload in ranked[:limit]]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def build_index():
+    from .models import Album, Artist, Track
+
+    def items():
+        for track in Track.objects.select_related('album').only(
+            'id', 'title', 'slug', 'artist', 'cover_art', 'downloads', 'album__cover_art'
+        ).iterator(chunk_size=2000):
+            yield (('track', track.pk),) + track_entry(track)
+        for album in Album.objects.only('id', 'title', 'slug', 'artist', 'cover_art', 'downloads').iterator(chunk_size=2000):
+            yield (('album', album.pk),) + album_entry(album)
+        for artist in Artist.objects.filter(track_count__gt=0).iterator(chunk_size=2000):
+            yield (('artist', artist.pk),) + artist_entry(artist)
+
+    index = PrefixIndex()
+    index.bulk_load(items())
+    return index
+
+
+_index = None
+_built_at = 0.0
+_lock = threading.Lock()
+_ready = threading.Event()
+_refreshing = threading.Event()
+# Receiver updates made while a rebuild is running, replayed onto the new index
+_pending = []
+
+
+def _refresh_interval():
+    return getattr(settings, 'TYPEAHEAD_REFRESH_SECONDS', 300)
+
+
+def _rebuild():
+    global _index, _built_at, _pending
+    try:
+        index = build_index()
+    except Exception as e:
+        logger.error(f"Typeahead index rebuild failed: {e}")
+        index = None
+    with _lock:
+        if index is not None:
+            for update in _pending:
+                update(index)
+            _index = index
+            _built_at = time.monotonic()
+            _ready.set()
+        _pending = []
+        _refreshing.clear()
+    if index is not None:
+        logger.info(f"Typeahead index built with {len(index)} entries")
+
+
+def warm(background=True):
+    """Build the index, in a thread unless ``background`` is False."""
+    with _lock:
+        if _refreshing.is_set():
+            return
+        _refreshing.set()
+    if background:
+        threading.Thread(target=_rebuild, name='typeahead-refresh', daemon=True).start()
+    else:
+        _rebuild()
+
+
+def warm_on_request(**kwargs):
+    """``request_started`` receiver: start this process's first build."""
+    if not _ready.is_set():
+        warm()
+
+
+def _after_fork():
+    global _lock, _refreshing, _pending
+    # The parent's refresh thread (and any lock it held) did not survive the
+    # fork; an index built before it is kept, copy-on-write
+    _lock = threading.Lock()
+    _refreshing = threading.Event()
+    _pending = []
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def suggest(query, limit=8):
+    """Never waits: answers [] until this process's first build finishes."""
+    if _index is None:
+        warm()
+        return []
+    if time.monotonic() - _built_at > _refresh_interval():
+        warm()
+    return _index.suggest(query, limit)
+
+
+def _apply(update):
+    with _lock:
+        if _index is not None:
+            update(_index)
+        if _refreshing.is_set():
+            _pending.append(update)
+
+
+def update_entry(entry_id, entry):
+    payload, weight, keys = entry
+    _apply(lambda index: index.add(entry_id, payload, weight, keys))
+
+
+def remove_entry(entry_id):
+    _apply(lambda index: index.remove(entry_id))
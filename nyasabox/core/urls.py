@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views, admin_views
+from . import views, admin_views, streaming
 
 urlpatterns = [
     # Public routes
@@ -36,6 +36,8 @@ urlpatterns = [
     path('track/<slug:slug>/delete/', views.delete_track, name='delete_track'),
     path('track/<slug:slug>/like/', views.like_track, name='like_track'),
     path('track/<slug:slug>/download/', views.download_track, name='download_track'),
+    path('track/<slug:slug>/stream/', streaming.stream_track, name='stream_track'),
+    path('track/<slug:slug>/waveform/', views.track_waveform, name='track_waveform'),
     path('comment/<int:comment_id>/delete/', views.delete_comment, name='delete_comment'),
 
     # Distribution routes
@@ -43,6 +45,8 @@ urlpatterns = [
     path('payment/<int:request_id>/', views.distribution_payment, name='distribution_payment'),
     path('process-payment/<int:request_id>/', views.process_distribution_payment, name='process_distribution_payment'),
     path('payment-status/<str:transaction_id>/', views.check_distribution_payment_status, name='check_distribution_payment_status'),
+    path('payment-status/<str:transaction_id>/events/', views.payment_status_events, name='payment_status_events'),
+    path('payments/paychangu/webhook/', views.paychangu_webhook, name='paychangu_webhook'),
     path('status/<int:request_id>/', views.distribution_status, name='distribution_status'),
     path('history/', views.distribution_history, name='distribution_history'),
 
@@ -57,6 +61,7 @@ urlpatterns = [
     path('adminxy/blog-management/', admin_views.admin_blog_management, name='admin_blog_management'),
     path('adminxy/blog-create/', admin_views.admin_create_blog, name='create_blog'),
     path('adminxy/revenue/', admin_views.admin_revenue, name='admin_revenue'),
+    path('adminxy/perf/', admin_views.admin_perf, name='admin_perf'),
     path('adminxy/edit-blog/<int:post_id>/', admin_views.admin_edit_blog, name='admin_edit_blog'),
     path('adminxy/create-blog-preview/', admin_views.admin_create_blog_preview, name='admin_create_blog_preview'),
     path('adminxy/artist-approvals/', views.admin_artist_approvals, name='admin_artist_approvals'),
@@ -68,6 +73,7 @@ urlpatterns = [
 
     path('tracks/', views.track_list, name='track_list'),
     path('albums/', views.album_list, name='album_list'),
+    path('artist/<slug:slug>/', views.artist_detail, name='artist_detail'),
     # ... your other URLs
 
 ]
\ No newline at end of file
@@ -3,17 +3,24 @@ from django.contrib.auth import login, authenticate, logout, update_session_auth
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm, PasswordChangeForm
 from django.contrib.auth.models import User
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden, HttpResponseNotModified, Http404
 from django.db.models import Q, Count, Sum
 from django.contrib import messages
 from django.conf import settings
-from django.core.mail import send_mail
+from .outbox import queue_email
+from django.utils.http import quote_etag
+from django.core.paginator import Paginator
 import json
-from .models import Album, Track, Comment, BlogPost, BlogCategory, DistributionRequest, DistributionPlatform, OTP, Profile
+from .models import Album, Track, Comment, BlogPost, BlogCategory, DistributionRequest, DistributionPlatform, OTP, Profile, GENRE_CHOICES
+from .homepage import get_homepage_snapshot
+from .counters import record_download, record_blog_view
+from .audio_meta import fill_track_metadata
+from .likes import liked_track_ids, toggle_like
+from .search import SearchResults
+from . import typeahead
 from .forms import AlbumForm, TrackForm, CommentForm, CustomUserCreationForm, CustomAuthenticationForm, UserUpdateForm, ProfileUpdateForm, DistributionRequestForm, OTPVerificationForm, ArtistUpgradeForm, PasswordResetRequestForm, PasswordResetConfirmForm
 from functools import wraps
 from django.utils import timezone
-from django.template.loader import render_to_string
 
 
 def artist_required(view_func):
@@ -29,60 +36,14 @@ def artist_required(view_func):
     return wrapper
 
 def index(request):
-    # Existing code remains the same
-    latest_albums = Album.objects.all().order_by('-created_at')[:8].annotate(track_count=Count('tracks'))
-
-    latest_tracks = Track.objects.filter(album__isnull=True).order_by('-created_at')[:12]
-
-    popular_tracks = Track.objects.all().order_by('-downloads')[:10]
-
-    popular_albums = Album.objects.annotate(
-        total_downloads=Sum('tracks__downloads')
-    ).order_by('-total_downloads')[:6]
-
-    top_artists_data = Track.objects.values('artist').annotate(
-        track_count=Count('id'),
-        total_downloads=Sum('downloads')
-    ).order_by('-track_count')[:8]
-
-    artists_with_data = []
-    for artist in top_artists_data:
-        sample_track = Track.objects.filter(artist=artist['artist']).first()
-        artists_with_data.append({
-            'name': artist['artist'],
-            'track_count': artist['track_count'],
-            'total_downloads': artist['total_downloads'] or 0,
-            'sample_track': sample_track
-        })
-
-    tracks_data = []
-    all_tracks = list(latest_tracks) + list(popular_tracks)
-
-    for track in all_tracks:
-        cover_url = ''
-        if track.album and track.album.cover_art:
-            cover_url = track.album.cover_art.url
-        elif hasattr(track, 'cover_art') and track.cover_art:
-            cover_url = track.cover_art.url
-
-        audio_url = track.audio_file.url if track.audio_file else ''
-
-        tracks_data.append({
-            'id': track.id,
-            'title': track.title,
-            'artist': track.artist,
-            'url': audio_url,
-            'cover_image': cover_url,
-            'duration': track.get_formatted_duration() if hasattr(track, 'get_formatted_duration') and track.duration else '0:00'
-        })
-
+    snapshot = get_homepage_snapshot()
     context = {
-        'latest_albums': latest_albums,
-        'latest_tracks': latest_tracks,
-        'popular_tracks': popular_tracks,
-        'popular_albums': popular_albums,
-        'top_artists': artists_with_data,
-        'tracks_json': json.dumps(tracks_data),
+        'latest_albums': snapshot['latest_albums'],
+        'latest_tracks': snapshot['latest_tracks'],
+        'popular_tracks': snapshot['popular_tracks'],
+        'popular_albums': snapshot['popular_albums'],
+        'top_artists': snapshot['top_artists'],
+        'tracks_json': snapshot['tracks_json'],
     }
     return render(request, 'index.html', context)
 
@@ -112,9 +73,12 @@ def track_detail(request, slug):
     track = get_object_or_404(Track, slug=slug)
     comment_form = CommentForm()
 
-    similar_tracks = Track.objects.filter(
-        Q(genre=track.genre) | Q(artist=track.artist) | Q(album=track.album)
-    ).exclude(id=track.id).distinct()[:5]
+    similar_filter = Q(genre=track.genre)
+    if track.artist_ref_id:
+        similar_filter |= Q(artist_ref_id=track.artist_ref_id)
+    if track.album_id:
+        similar_filter |= Q(album_id=track.album_id)
+    similar_tracks = Track.objects.filter(similar_filter).exclude(id=track.id)[:5]
 
     if request.method == 'POST' and request.user.is_authenticated:
         comment_form = CommentForm(request.POST)
@@ -130,19 +94,15 @@ def track_detail(request, slug):
         'track': track,
         'comment_form': comment_form,
         'similar_tracks': similar_tracks,
+        'is_liked': track.pk in liked_track_ids(request.user),
     }
     return render(request, 'track_detail.html', context)
 
 @login_required
 def like_track(request, slug):
     track = get_object_or_404(Track, slug=slug)
-    liked = track.likes.filter(id=request.user.id).exists()
-    if liked:
-        track.likes.remove(request.user)
-    else:
-        track.likes.add(request.user)
-
-    return JsonResponse({'liked': not liked, 'likes_count': track.likes.count()})
+    liked, like_count = toggle_like(track, request.user)
+    return JsonResponse({'liked': liked, 'likes_count': like_count})
 
 def download_track(request, slug):
     track = get_object_or_404(Track, slug=slug)
@@ -150,9 +110,24 @@ def download_track(request, slug):
         messages.error(request, 'Audio file not found.')
         return redirect('track_detail', slug=track.slug)
     
-    track.downloads += 1
-    track.save()
-    return redirect(track.audio_file.url)
+    record_download(track)
+    return redirect(f"{track.get_stream_url()}?download=1")
+
+def track_waveform(request, slug):
+    track = get_object_or_404(Track.objects.only('id', 'slug', 'waveform'), slug=slug)
+    if not track.waveform:
+        raise Http404('Waveform not generated yet.')
+
+    # generate_waveforms names files by content hash, so the name is the ETag
+    etag = quote_etag(track.waveform.name)
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        with track.waveform.open('rb') as waveform:
+            response = HttpResponse(waveform.read(), content_type='application/octet-stream')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=86400'
+    return response
 
 @artist_required
 def upload_music(request):
@@ -171,15 +146,18 @@ def upload_music(request):
 
                 for track_file, track_number, track_title in zip(track_files, track_numbers, track_titles):
                     if track_file and track_title:
-                        Track.objects.create(
+                        track = Track(
                             title=track_title,
                             album=album,
                             artist=album.artist,
+                            artist_ref=album.artist_ref,
                             genre=album.genre,
                             audio_file=track_file,
                             track_number=track_number,
                             uploader=request.user
                         )
+                        fill_track_metadata(track)
+                        track.save()
 
                 messages.success(request, f'Album "{album.title}" uploaded with {len(track_files)} tracks!')
                 return redirect('album_detail', slug=album.slug)
@@ -191,6 +169,7 @@ def upload_music(request):
                 track.uploader = request.user
                 if not track.genre and track.album:
                     track.genre = track.album.genre
+                fill_track_metadata(track)
                 track.save()
                 messages.success(request, f'Track "{track.title}" uploaded successfully!')
                 return redirect('track_detail', slug=track.slug)
@@ -205,112 +184,35 @@ def upload_music(request):
 
 def search(request):
     query = request.GET.get('q', '')
+    if request.GET.get('format') == 'json':
+        # Live dropdown: answered from the in-memory prefix index
+        return JsonResponse({'results': typeahead.suggest(query) if query.strip() else []})
+
     content_type = request.GET.get('type', 'all')
     sort_by = request.GET.get('sort', 'relevance')
-
-    track_results = album_results = blog_results = None
-
-    if query:
-        if content_type in ['all', 'tracks']:
-            track_results = Track.objects.filter(
-                Q(title__icontains=query) |
-                Q(artist__icontains=query) |
-                Q(album__title__icontains=query) |
-                Q(genre__icontains=query)
-            ).distinct()
-
-        if content_type in ['all', 'albums']:
-            album_results = Album.objects.filter(
-                Q(title__icontains=query) |
-                Q(artist__icontains=query) |
-                Q(description__icontains=query) |
-                Q(genre__icontains=query)
-            ).distinct()
-
-        if content_type in ['all', 'blogs']:
-            blog_results = BlogPost.objects.filter(
-                Q(title__icontains=query) |
-                Q(content__icontains=query) |
-                Q(author__username__icontains=query) |
-                Q(category__name__icontains=query)
-            ).distinct()
-
-        if sort_by == 'newest':
-            if track_results: track_results = track_results.order_by('-created_at')
-            if album_results: album_results = album_results.order_by('-created_at')
-            if blog_results: blog_results = blog_results.order_by('-created_at')
-        elif sort_by == 'popular':
-            if track_results: track_results = track_results.order_by('-downloads')
-            if album_results: album_results = album_results.order_by('-downloads')
-            if blog_results: blog_results = blog_results.order_by('-views')
-        else:
-            if track_results: track_results = track_results.order_by('-downloads', '-created_at')
-            if album_results: album_results = album_results.order_by('-downloads', '-created_at')
-            if blog_results: blog_results = blog_results.order_by('-views', '-created_at')
-
-    total_results = sum(qs.count() for qs in [track_results, album_results, blog_results] if qs is not None)
-
-    is_json = request.GET.get('format') == 'json'
+    genre = request.GET.get('genre', '')
 
     if not query:
-        if is_json:
-            return JsonResponse({'results': []})
         return render(request, 'search.html', {'query': query})
 
-    # Search in tracks
-    tracks = Track.objects.filter(
-        Q(title__icontains=query) |
-        Q(artist__icontains=query) |
-        Q(album__title__icontains=query)
-    )[:5]
-
-    # Search in albums
-    albums = Album.objects.filter(
-        Q(title__icontains=query) |
-        Q(artist__icontains=query)
-    )[:5]
-
-    if is_json:
-        results = []
-        
-        # Add track results
-        for track in tracks:
-            cover_url = track.cover_art.url if track.cover_art else (
-                track.album.cover_art.url if track.album and track.album.cover_art else None
-            )
-            results.append({
-                'type': 'track',
-                'title': track.title,
-                'artist': track.artist,
-                'cover_url': cover_url,
-                'url': reverse('track_detail', kwargs={'slug': track.slug})
-            })
-        
-        # Add album results
-        for album in albums:
-            results.append({
-                'type': 'album',
-                'title': album.title,
-                'artist': album.artist,
-                'cover_url': album.cover_art.url if album.cover_art else None,
-                'url': reverse('album_detail', kwargs={'slug': album.slug})
-            })
-
-        return JsonResponse({
-            'results': results[:8]  # Limit total results to 8
-        })
+    kinds = {'tracks': 'track', 'albums': 'album', 'blogs': 'blog'}
+    results = SearchResults(query, kind=kinds.get(content_type), genre=genre or None, sort=sort_by)
+    paginator = Paginator(results, getattr(settings, 'SEARCH_RESULTS_PER_PAGE', 24))
+    page = paginator.get_page(request.GET.get('page'))
+    facets = results.facets()
+    genre_names = dict(GENRE_CHOICES)
 
     context = {
-        'track_results': track_results or Track.objects.none(),
-        'album_results': album_results or Album.objects.none(),
-        'blog_results': blog_results or BlogPost.objects.none(),
+        'results': page,
+        'result_objects': [hit.object for hit in page],
         'query': query,
         'content_type': content_type,
         'sort_by': sort_by,
-        'total_results': total_results,
-
-        'tracks': tracks,
-        'albums': albums,
+        'selected_genre': genre,
+        'total_results': facets['total'],
+        'all_count': sum(facets['types'].values()),
+        'type_counts': facets['types'],
+        'genre_facets': [(key, genre_names.get(key, key), count) for key, count in facets['genres']],
     }
     return render(request, 'search.html', context)
 
@@ -323,8 +225,8 @@ def blog_list(request):
 
 def blog_detail(request, slug):
     post = get_object_or_404(BlogPost, slug=slug)
-    post.views += 1
-    post.save()
+    record_blog_view(post)
+    post.views += 1  # display only; the buffered increment is written on flush
     return render(request, 'blog_detail.html', {'post': post})
 
 def register_view(request):
@@ -342,12 +244,11 @@ def register_view(request):
 
             # Generate and send OTP
             otp = OTP.objects.create(user=user, purpose='email_verification' if not profile.is_artist else 'artist_verification')
-            send_mail(
+            queue_email(
                 'Verify Your NyasaBox Account',
-                '',
-                settings.DEFAULT_FROM_EMAIL,
+                'emails/otp_verification.html',
+                {'otp': otp.code, 'user': user},
                 [user.email],
-                html_message=render_to_string('emails/otp_verification.html', {'otp': otp.code, 'user': user}),
             )
             messages.success(request, 'Please check your email to verify your account.')
             return redirect('verify_otp', user_id=user.id)
@@ -398,12 +299,11 @@ def become_artist(request):
 
             # Generate and send OTP
             otp = OTP.objects.create(user=request.user, purpose='artist_verification')
-            send_mail(
+            queue_email(
                 'Verify Your NyasaBox Artist Account',
-                '',
-                settings.DEFAULT_FROM_EMAIL,
+                'emails/artist_verification.html',
+                {'otp': otp.code, 'user': request.user},
                 [request.user.email],
-                html_message=render_to_string('emails/artist_verification.html', {'otp': otp.code, 'user': request.user}),
             )
             messages.success(request, 'Please check your email to verify your artist account.')
             return redirect('verify_otp', user_id=request.user.id)
@@ -432,23 +332,21 @@ def admin_approve_artist(request, profile_id):
         if action == 'approve':
             profile.artist_status = 'verified'
             profile.save()
-            send_mail(
+            queue_email(
                 'NyasaBox Artist Application Approved',
-                '',
-                settings.DEFAULT_FROM_EMAIL,
+                'emails/artist_approved.html',
+                {'user': profile.user},
                 [profile.user.email],
-                html_message=render_to_string('emails/artist_approved.html', {'user': profile.user}),
             )
             messages.success(request, f'Artist {profile.user.username} approved.')
         elif action == 'reject':
             profile.artist_status = 'rejected'
             profile.save()
-            send_mail(
+            queue_email(
                 'NyasaBox Artist Application Rejected',
-                '',
-                settings.DEFAULT_FROM_EMAIL,
+                'emails/artist_rejected.html',
+                {'user': profile.user},
                 [profile.user.email],
-                html_message=render_to_string('emails/artist_rejected.html', {'user': profile.user}),
             )
             messages.success(request, f'Artist {profile.user.username} rejected.')
     return redirect('admin_artist_approvals')
@@ -460,12 +358,11 @@ def forgot_password(request):
             email = form.cleaned_data['email']
             user = User.objects.get(email=email)
             otp = OTP.objects.create(user=user, purpose='password_reset')
-            send_mail(
+            queue_email(
                 'Reset Your NyasaBox Password',
-                '',
-                settings.DEFAULT_FROM_EMAIL,
+                'emails/password_reset.html',
+                {'otp': otp.code, 'user': user},
                 [email],
-                html_message=render_to_string('emails/password_reset.html', {'otp': otp.code, 'user': user}),
             )
             messages.success(request, 'A password reset OTP has been sent to your email.')
             return redirect('reset_password', user_id=user.id)
@@ -533,7 +430,7 @@ def profile_view(request):
 
     stats = Track.objects.filter(uploader=request.user).aggregate(
         total_downloads=Sum('downloads'),
-        total_likes=Count('likes'),
+        total_likes=Sum('like_count'),
         total_tracks=Count('id')
     )
     total_albums = Album.objects.filter(uploader=request.user).count()
@@ -553,12 +450,12 @@ def profile_view(request):
 
 @login_required
 def my_uploads_view(request):
-    user_albums = Album.objects.filter(uploader=request.user).order_by('-created_at')
+    user_albums = Album.objects.filter(uploader=request.user).annotate(track_total=Count('tracks')).order_by('-created_at')
     user_tracks = Track.objects.filter(uploader=request.user, album__isnull=True).order_by('-created_at')
 
     stats = Track.objects.filter(uploader=request.user).aggregate(
         total_downloads=Sum('downloads'),
-        total_likes=Count('likes')
+        total_likes=Sum('like_count')
     )
 
     context = {
@@ -611,7 +508,10 @@ def edit_track(request, slug):
     if request.method == 'POST':
         form = TrackForm(request.POST, request.FILES, instance=track)
         if form.is_valid():
-            form.save()
+            track = form.save(commit=False)
+            if 'audio_file' in form.changed_data:
+                fill_track_metadata(track)
+            track.save()
             messages.success(request, 'Track updated successfully!')
             return redirect('track_detail', slug=track.slug)
     
@@ -669,8 +569,7 @@ from django.http import JsonResponse, HttpResponseForbidden
 from django.db.models import Q, Count, Sum
 from django.contrib import messages
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from .outbox import queue_email
 import json
 from .models import *
 from .forms import *
@@ -722,24 +621,21 @@ import uuid
 import requests
 from django.conf import settings
 from .models import DistributionRequest, PaymentTransaction
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 import time
+from .paychangu import get_mobile_money_operators
+from . import paychangu
+from .payments import (
+    apply_result, charge_id_of, event_stream, record_initialize_failed, record_initialized, status_payload,
+)
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+import hashlib
+import hmac
 
 logger = logging.getLogger(__name__)
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(requests.exceptions.RequestException))
-def get_mobile_money_operators():
-    url = "https://api.paychangu.com/mobile-money"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {settings.PAYCHANGU_API_KEY.strip()}"
-    }
-    response = requests.get(url, headers=headers, timeout=15)
-    if response.status_code == 200:
-        return response.json().get('data', [])
-    logger.error(f"Failed to fetch operators: {response.status_code} - {response.text}")
-    return []
-
 @login_required
 def distribution_payment(request, request_id):
     distribution_request = get_object_or_404(DistributionRequest, id=request_id, artist=request.user)
@@ -764,8 +660,10 @@ def distribution_payment(request, request_id):
     return render(request, 'distribution/payment.html', context)
 
 @login_required
-@transaction.atomic
 def process_distribution_payment(request, request_id):
+    # No surrounding transaction: the pending row is committed before the
+    # provider call, which can take many seconds, so no locks or connection
+    # are held across it. payments.record_initialized/_failed settle it after.
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'Method not allowed'}, status=405)
 
@@ -789,7 +687,7 @@ def process_distribution_payment(request, request_id):
             last_name = form.cleaned_data['last_name']
             charge_id = f"nyasa-{uuid.uuid4()}-{int(time.time())}"  # Added timestamp for extra uniqueness
 
-            transaction = PaymentTransaction.objects.create(
+            PaymentTransaction.objects.create(
                 distribution_request=distribution_request,
                 charge_id=charge_id,
                 amount=amount,
@@ -814,40 +712,35 @@ def process_distribution_payment(request, request_id):
 
             logger.debug(f"Sending payload to PayChangu: {payload}")
 
-            url = "https://api.paychangu.com/mobile-money/payments/initialize"
-            headers = {
-                "accept": "application/json",
-                "content-type": "application/json",
-                "Authorization": f"Bearer {settings.PAYCHANGU_API_KEY.strip()}"
-            }
-
-            @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(requests.exceptions.RequestException))
-            def make_payment_request():
-                return requests.post(url, json=payload, headers=headers, timeout=15)
-
             try:
-                response = make_payment_request()
-                response_data = response.json()
-                logger.debug(f"PayChangu response: {response_data}")
-
-                if response.status_code == 200 and response_data.get('status') == 'success':
-                    transaction.response_data = response_data
-                    transaction.save()
-                    logger.info(f"Payment initiated for distribution request {request_id}, transaction {charge_id}")
+                # One attempt only: after a timeout or 5xx the charge may
+                # already be live on the payer's phone, and a resend with the
+                # same charge_id is rejected as a duplicate
+                response_data = paychangu.client().initialize(payload)
+            except paychangu.PayChanguError as e:
+                record_initialize_failed(charge_id, e)
+                if e.kind == 'rejected':
+                    logger.error(f"PayChangu API error: {e.message}")
+                    return JsonResponse({'status': 'error', 'message': e.message}, status=400)
+                if e.retryable:
+                    # Left pending; the webhook or reconcile_payments settles it
+                    logger.warning(f"PayChangu initialize outcome unknown for {charge_id}: {e}")
                     return JsonResponse({
                         'status': 'success',
                         'message': 'Payment initiated',
                         'transaction_id': charge_id
                     })
-                else:
-                    transaction.delete()
-                    error_message = response_data.get('message', 'Unknown error')
-                    logger.error(f"PayChangu API error: {error_message}")
-                    return JsonResponse({'status': 'error', 'message': error_message}, status=400)
-            except requests.exceptions.RequestException as e:
-                transaction.delete()
-                logger.error(f"PayChangu API request failed after retries: {str(e)}")
+                logger.error(f"PayChangu API request failed: {e}")
                 return JsonResponse({'status': 'error', 'message': 'Payment service is temporarily unavailable. Please try again later.'}, status=503)
+
+            logger.debug(f"PayChangu response: {response_data}")
+            record_initialized(charge_id, response_data)
+            logger.info(f"Payment initiated for distribution request {request_id}, transaction {charge_id}")
+            return JsonResponse({
+                'status': 'success',
+                'message': 'Payment initiated',
+                'transaction_id': charge_id
+            })
         else:
             logger.warning(f"Form validation failed: {form.errors.as_json()}")
             return JsonResponse({'status': 'error', 'message': form.errors.as_json()}, status=400)
@@ -856,84 +749,61 @@ def process_distribution_payment(request, request_id):
         return JsonResponse({'status': 'error', 'message': 'An unexpected error occurred. Please try again later.'}, status=500)
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
 def check_distribution_payment_status(request, transaction_id):
-    try:
-        transaction = PaymentTransaction.objects.get(charge_id=transaction_id)
-        
-        if transaction.status == 'success':
-            return JsonResponse({'status': 'success'})
-        elif transaction.status == 'failed':
-            return JsonResponse({'status': 'failed', 'message': transaction.response_data.get('message', 'Transaction failed') if transaction.response_data else 'Transaction failed'})
-        elif transaction.status == 'cancelled':
-            return JsonResponse({'status': 'cancelled', 'message': 'You cancelled the payment'})
-
-        url = f"https://api.paychangu.com/mobile-money/payments/{transaction_id}/verify"
-        headers = {
-            "accept": "application/json",
-            "Authorization": f"Bearer {settings.PAYCHANGU_API_KEY.strip()}"
-        }
-        
-        response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            logger.debug(f"PayChangu verify response for {transaction_id}: {data}")
-            transaction.response_data = data
-            transaction.save()
-
-            transaction_data = data.get('data', {})
-            if data.get('status') == 'successful' or (transaction_data.get('status') == 'success' and data.get('gateway_response', {}).get('status', {}).get('success')):
-                transaction.status = 'success'
-                transaction.completed_at = timezone.now()
-                transaction.save()
-                transaction.distribution_request.status = 'paid'
-                transaction.distribution_request.payment_date = timezone.now()
-                transaction.distribution_request.save()
-                send_distribution_payment_notification(transaction, success=True)
-                return JsonResponse({'status': 'success'})
-            elif transaction_data.get('status') == 'failed':
-                transaction.status = 'failed'
-                transaction.completed_at = timezone.now()
-                transaction.save()
-                send_distribution_payment_notification(transaction, success=False)
-                return JsonResponse({'status': 'failed', 'message': transaction_data.get('message', 'Transaction failed')})
-            elif transaction_data.get('status') == 'cancelled' or 'user_cancelled' in transaction_data.get('message', '').lower():
-                transaction.status = 'cancelled'
-                transaction.completed_at = timezone.now()
-                transaction.save()
-                send_distribution_payment_notification(transaction, success=False)
-                return JsonResponse({'status': 'cancelled', 'message': 'You cancelled the payment'})
-            else:
-                return JsonResponse({'status': 'pending'})
-        else:
-            return JsonResponse({'status': 'pending'})
-    except PaymentTransaction.DoesNotExist:
+    # A plain read: the webhook and reconcile_payments keep the row current
+    transaction = PaymentTransaction.objects.filter(charge_id=transaction_id).only('status', 'response_data').first()
+    if transaction is None:
         return JsonResponse({'status': 'error', 'message': 'Transaction not found'}, status=404)
-    except Exception as e:
-        logger.error(f"Unexpected error checking distribution payment status: {str(e)}", exc_info=True)
-        return JsonResponse({'status': 'error', 'message': 'An unexpected error occurred'}, status=500)
-
-def send_distribution_payment_notification(transaction, success=True):
-    request = transaction.distribution_request
-    emails = [request.artist.email]
-    status = 'Successful' if success else 'Failed'
-    subject = f"Distribution Payment {status}: Request #{request.id}"
-    site_url = getattr(settings, 'SITE_URL', 'http://localhost:8000')  # Default to localhost if not set
-    message = render_to_string('emails/distribution_payment_notification.html', {
-        'request': request,
-        'transaction': transaction,
-        'success': success,
-        'site_url': site_url,
-    })
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=settings.DEFAULT_FROM_EMAIL,
-        recipient_list=emails,
-        html_message=message,
-        fail_silently=False,
+    return JsonResponse(status_payload(transaction))
+
+async def payment_status_events(request, transaction_id):
+    """Pushes the payment's outcome as server-sent events; the page polls when this is unavailable."""
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI a held-open stream would pin a worker thread
+        return HttpResponse(status=204)
+    if not await PaymentTransaction.objects.filter(charge_id=transaction_id).aexists():
+        return JsonResponse({'status': 'error', 'message': 'Transaction not found'}, status=404)
+    return StreamingHttpResponse(
+        event_stream(transaction_id),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
     )
 
+@csrf_exempt
+@require_POST
+def paychangu_webhook(request):
+    """
+    PayChangu calls this when a charge settles. Signed payloads are applied
+    as-is; without PAYCHANGU_WEBHOOK_SECRET the charge is re-verified with
+    the API first. Always answers 200 for well-formed calls so the provider
+    does not retry what we have already recorded.
+    """
+    secret = getattr(settings, 'PAYCHANGU_WEBHOOK_SECRET', '')
+    if secret:
+        expected = hmac.new(secret.encode(), request.body, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, request.headers.get('Signature', '')):
+            return JsonResponse({'status': 'error', 'message': 'Invalid signature'}, status=403)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+
+    charge_id = charge_id_of(payload)
+    if not charge_id:
+        return JsonResponse({'status': 'error', 'message': 'Missing charge_id'}, status=400)
+    if not secret:
+        try:
+            payload = paychangu.verify_charge(charge_id)
+        except paychangu.PayChanguError as e:
+            logger.warning(f"Webhook for {charge_id} could not be verified: {e}")
+            # Let the provider retry; the reconciler will also pick it up
+            return JsonResponse({'status': 'error', 'message': 'Verification unavailable'}, status=503)
+
+    payment, changed = apply_result(charge_id, payload, source='webhook')
+    if payment is None:
+        return JsonResponse({'status': 'ignored'})
+    return JsonResponse({'status': payment.status, 'changed': changed})
+
 @login_required
 def distribution_status(request, request_id):
     distribution_request = get_object_or_404(DistributionRequest, id=request_id, artist=request.user)
@@ -972,12 +842,11 @@ def admin_update_status(request, request_id):
             distribution_request.save()
             messages.success(request, f'Status updated to {new_status}.')
             if new_status == 'rejected':
-                send_mail(
+                queue_email(
                     'NyasaBox Distribution Request Update',
-                    '',
-                    settings.DEFAULT_FROM_EMAIL,
+                    'emails/distribution_rejected.html',
+                    {'request': distribution_request},
                     [distribution_request.artist.email],
-                    html_message=render_to_string('emails/distribution_rejected.html', {'request': distribution_request}),
                 )
     return redirect('admin_distribution_requests')
 
@@ -1013,7 +882,7 @@ def delete_account_view(request):
 def account_stats_view(request):
     stats = Track.objects.filter(uploader=request.user).aggregate(
         total_downloads=Sum('downloads'),
-        total_likes=Count('likes'),
+        total_likes=Sum('like_count'),
         total_tracks=Count('id')
     )
     context = {
@@ -1040,7 +909,7 @@ def website(request):
     """
     Renders the homepage with featured albums, popular tracks, and distribution platforms
     """
-    featured_albums = Album.objects.order_by('-created_at')[:4]
+    featured_albums = Album.objects.annotate(track_total=Count('tracks')).order_by('-created_at')[:4]
     popular_tracks = Track.objects.order_by('-downloads')[:5]
     distribution_platforms = DistributionPlatform.objects.filter(is_active=True)
     
@@ -1059,80 +928,111 @@ def website(request):
 from django.shortcuts import render, get_object_or_404
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q
-from .models import Track, Album
+from django.http import QueryDict
+from .models import Track, Album, Artist
+from .pagination import paginate, estimate_count
+from .cards import render_cards
+from .search import matching_ids
+
+LISTING_SORTS = {
+    'newest': ('Newest', ('-created_at', '-id')),
+    'popular': ('Most downloaded', ('-downloads', '-id')),
+    'title': ('Title A-Z', ('title', 'id')),
+}
+
+def _keyset_listing(request, queryset, template, name, card_template, per_page, context):
+    """
+    Render a cursor-paginated listing, or with ``?format=json`` just the next
+    batch of rendered cards for infinite scroll.
+    """
+    params = request.GET.copy()
+    if 'page' in params:
+        # Legacy offset URLs: send crawlers back to the cursor-paginated listing
+        del params['page']
+        return redirect(f"{request.path}?{params.urlencode()}" if params else request.path, permanent=True)
+
+    sort = request.GET.get('sort')
+    if sort not in LISTING_SORTS:
+        sort = 'newest'
+    page = paginate(queryset, LISTING_SORTS[sort][1], request.GET.get('cursor'), per_page)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'html': render_cards(page, card_template, request), 'next_cursor': page.next_cursor})
+
+    total_estimate, total_is_lower_bound = None, False
+    if not request.GET.get('cursor') and getattr(settings, 'LISTING_COUNT_ESTIMATES', True):
+        total_estimate, total_is_lower_bound = estimate_count(queryset)
+
+    base = QueryDict(mutable=True)
+    for key in ('q', 'genre', 'artist', 'sort'):
+        if request.GET.get(key):
+            base[key] = request.GET[key]
+    context.update({
+        name: page,
+        'genres': dict(GENRE_CHOICES),
+        'sort_choices': [(value, label) for value, (label, _) in LISTING_SORTS.items()],
+        'selected_sort': sort,
+        'query_string': base.urlencode() + '&' if base else '',
+        'total_estimate': total_estimate,
+        'total_is_lower_bound': total_is_lower_bound,
+    })
+    return render(request, template, context)
+
+def track_list(request, artist=None):
+    tracks_list = Track.objects.all()
 
-def track_list(request):
-    # Get all tracks
-    tracks_list = Track.objects.all().order_by('-created_at')
-    
     # Search functionality
     search_query = request.GET.get('q')
     if search_query:
-        tracks_list = tracks_list.filter(
-            Q(title__icontains=search_query) |
-            Q(artist__icontains=search_query) |
-            Q(genre__icontains=search_query)
-        )
-    
+        tracks_list = tracks_list.filter(pk__in=matching_ids(search_query, 'track'))
+
     # Genre filter
     genre_filter = request.GET.get('genre')
     if genre_filter:
         tracks_list = tracks_list.filter(genre=genre_filter)
-    
-    # Pagination
-    paginator = Paginator(tracks_list, 20)  # Show 20 tracks per page
-    page = request.GET.get('page')
-    
-    try:
-        tracks = paginator.page(page)
-    except PageNotAnInteger:
-        tracks = paginator.page(1)
-    except EmptyPage:
-        tracks = paginator.page(paginator.num_pages)
-    
+
+    # Artist filter
+    artist_slug = request.GET.get('artist')
+    if artist is None and artist_slug:
+        artist = Artist.objects.filter(slug=artist_slug).first()
+    if artist is not None:
+        tracks_list = tracks_list.filter(artist_ref=artist)
+
     context = {
-        'tracks': tracks,
-        'genres': dict(GENRE_CHOICES),
         'search_query': search_query or '',
         'selected_genre': genre_filter or '',
+        'artist': artist,
     }
-    
-    return render(request, 'tracks.html', context)
+    return _keyset_listing(request, tracks_list, 'tracks.html', 'tracks', 'partials/track_card.html', 20, context)
 
 def album_list(request):
-    # Get all albums
-    albums_list = Album.objects.all().order_by('-created_at')
-    
+    albums_list = Album.objects.annotate(track_total=Count('tracks'))
+
     # Search functionality
     search_query = request.GET.get('q')
     if search_query:
-        albums_list = albums_list.filter(
-            Q(title__icontains=search_query) |
-            Q(artist__icontains=search_query) |
-            Q(genre__icontains=search_query)
-        )
-    
+        albums_list = albums_list.filter(pk__in=matching_ids(search_query, 'album'))
+
     # Genre filter
     genre_filter = request.GET.get('genre')
     if genre_filter:
         albums_list = albums_list.filter(genre=genre_filter)
-    
-    # Pagination
-    paginator = Paginator(albums_list, 12)  # Show 12 albums per page
-    page = request.GET.get('page')
-    
-    try:
-        albums = paginator.page(page)
-    except PageNotAnInteger:
-        albums = paginator.page(1)
-    except EmptyPage:
-        albums = paginator.page(paginator.num_pages)
-    
+
+    # Artist filter
+    artist = None
+    artist_slug = request.GET.get('artist')
+    if artist_slug:
+        artist = Artist.objects.filter(slug=artist_slug).first()
+        if artist is not None:
+            albums_list = albums_list.filter(artist_ref=artist)
+
     context = {
-        'albums': albums,
-        'genres': dict(GENRE_CHOICES),
         'search_query': search_query or '',
         'selected_genre': genre_filter or '',
+        'artist': artist,
     }
-    
-    return render(request, 'ulbums.html', context)
\ No newline at end of file
+    return _keyset_listing(request, albums_list, 'ulbums.html', 'albums', 'partials/album_card.html', 12, context)
+
+def artist_detail(request, slug):
+    artist = get_object_or_404(Artist, slug=slug)
+    return track_list(request, artist=artist)
\ No newline at end of file
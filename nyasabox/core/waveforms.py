@@ -0,0 +1,84 @@
+"""
+Precomputed waveform peaks for the track player.
+
+Each track is decoded once to low-rate mono PCM (ffmpeg, or the ``wave``
+module for plain PCM WAV files) and reduced with NumPy to ``WAVEFORM_PEAKS``
+min/max pairs. The result is stored as a flat little-endian ``int8`` array
+``[min0, max0, min1, max1, ...]`` in ``Track.waveform``, so the browser can
+draw it straight from an ``Int8Array`` without touching the audio.
+"""
+import subprocess
+import wave
+from django.conf import settings
+
+# Decoding rate; peaks only need the envelope, not the full band
+DECODE_SAMPLE_RATE = 8000
+
+
+class WaveformError(Exception):
+    pass
+
+
+def _peak_count():
+    return getattr(settings, 'WAVEFORM_PEAKS', 800)
+
+
+def _decode_wav(path):
+    import numpy as np
+
+    with wave.open(path, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise WaveformError('Only 16-bit PCM WAV can be decoded without ffmpeg')
+        channels = wav.getnchannels()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def decode_samples(path):
+    """Return mono int16-range samples for an audio file as a NumPy array."""
+    import numpy as np
+
+    command = [
+        getattr(settings, 'FFMPEG_BINARY', 'ffmpeg'), '-hide_banner', '-loglevel', 'error',
+        '-i', path, '-map', '0:a:0', '-ac', '1', '-ar', str(DECODE_SAMPLE_RATE),
+        '-f', 's16le', '-acodec', 'pcm_s16le', '-',
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True)
+    except FileNotFoundError:
+        if path.lower().endswith('.wav'):
+            return _decode_wav(path)
+        raise WaveformError('ffmpeg is not installed')
+    if result.returncode != 0:
+        raise WaveformError(result.stderr.decode(errors='replace').strip() or 'ffmpeg failed')
+    return np.frombuffer(result.stdout, dtype='<i2')
+
+
+def compute_peaks(samples, peaks=None):
+    """Reduce samples to ``peaks`` (min, max) pairs scaled to int8."""
+    import numpy as np
+
+    peaks = peaks or _peak_count()
+    if len(samples) == 0:
+        raise WaveformError('No audio samples decoded')
+    # Pad to a whole number of buckets so the array reshapes cleanly
+    bucket = -(-len(samples) // peaks)
+    padded = np.zeros(bucket * peaks, dtype=np.float32)
+    padded[:len(samples)] = samples
+    buckets = padded.reshape(peaks, bucket)
+    pairs = np.empty((peaks, 2), dtype=np.float32)
+    pairs[:, 0] = buckets.min(axis=1)
+    pairs[:, 1] = buckets.max(axis=1)
+
+    # Normalise to the loudest peak so quiet masters still fill the canvas
+    loudest = np.abs(pairs).max()
+    if loudest > 0:
+        pairs *= 127.0 / loudest
+    return np.clip(np.round(pairs), -127, 127).astype('<i1').tobytes()
+
+
+def waveform_for_path(path):
+    """Process-pool friendly: decode and reduce one file, returning the bytes."""
+    return compute_peaks(decode_samples(path))
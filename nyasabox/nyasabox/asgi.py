@@ -3,6 +3,10 @@ ASGI config for nyasabox project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the site through this (uvicorn, daphne) to get the payment status push
+(``payment-status/<id>/events/``): its async view holds one connection per
+waiting payment page without tying up a worker thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
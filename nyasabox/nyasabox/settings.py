@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.perf.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -65,6 +66,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.liked_tracks',
+                'core.context_processors.hls_player',
             ],
         },
     },
@@ -177,8 +180,87 @@ EMAIL_HOST_USER = 'nyasabox@pezamw.com'
 EMAIL_HOST_PASSWORD = 'w{V}Jj!Go0r7'
 DEFAULT_FROM_EMAIL = 'NyasaBox <nyasabox@pezamw.com>'
 
+# Email outbox (core.outbox): views queue, `manage.py send_outbox` sends over
+# one kept-alive SMTP connection and retries failures with backoff
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_POLL_SECONDS = 2
+EMAIL_OUTBOX_IDLE_SECONDS = 30
+EMAIL_OUTBOX_MAX_ATTEMPTS = 8
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 30
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = 3600
+EMAIL_OUTBOX_LEASE_SECONDS = 300  # a claimed batch not sent by then is claimed again
+EMAIL_OUTBOX_KEEP_DAYS = 30
+
 SITE_URL = 'http://localhost:8000'
 
+# Audio streaming: None serves ranges from Django, 'x-accel' hands off to nginx
+# (internal location at AUDIO_STREAM_ACCEL_PREFIX aliased to MEDIA_ROOT),
+# 'x-sendfile' hands off to Apache/lighttpd.
+AUDIO_STREAM_OFFLOAD = os.getenv('AUDIO_STREAM_OFFLOAD') or None
+AUDIO_STREAM_ACCEL_PREFIX = '/protected-media/'
+
+# HLS packaging (manage.py package_hls)
+FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+HLS_BITRATES = [48, 96, 160]  # kbps AAC renditions, lowest first for 3G starts
+HLS_SEGMENT_SECONDS = 6
+HLS_PROCESSING_LEASE_SECONDS = 3600  # claims older than this are requeued
+HLS_FFMPEG_TIMEOUT_SECONDS = 1800  # keep below the lease
+HLS_WORK_DIR = None  # scratch output; None means the system temp directory
+# Player library; set HLS_JS_INTEGRITY to the file's SRI hash, e.g.
+# sha384-$(openssl dgst -sha384 -binary hls.min.js | openssl base64 -A)
+HLS_JS_URL = 'https://cdn.jsdelivr.net/npm/hls.js@1.5.13/dist/hls.min.js'
+HLS_JS_INTEGRITY = os.getenv('HLS_JS_INTEGRITY', '')
+
+# Waveform peaks (manage.py generate_waveforms, requires NumPy)
+WAVEFORM_PEAKS = 800
+
+# Responsive image derivatives (manage.py generate_image_derivatives backfills)
+IMAGE_DERIVATIVE_WIDTHS = [160, 320, 640]
+IMAGE_DERIVATIVE_QUALITY = 75
+IMAGE_KNOWN_MAX_ENTRIES = 10000  # per-process memo of generated widths
+IMAGE_MISSING_RECHECK_SECONDS = 60  # how long a missing manifest is remembered
+
+# Full-text search (relevance = sum of per-field scores times these boosts)
+SEARCH_FIELD_BOOSTS = {'title': 3.0, 'people': 2.0, 'body': 1.0}
+SEARCH_MAX_RESULTS = 500
+SEARCH_RESULTS_PER_PAGE = 24
+
+# Search typeahead: per-worker in-memory index, rebuilt in the background
+TYPEAHEAD_REFRESH_SECONDS = 300
+
+# Track/album listings: cursor pagination; header counts are estimates capped here
+LISTING_COUNT_ESTIMATES = True
+LISTING_COUNT_CAP = 1000
+
+# Shared cache for per-user liked sets and other cross-request state. Without
+# REDIS_URL each worker gets its own in-memory cache.
+if os.getenv('REDIS_URL'):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': os.getenv('REDIS_URL')}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+LIKED_TRACKS_CACHE_SECONDS = 600
+# Used instead when the cache is per-process, where a like toggled in one
+# worker cannot reach the others' copies
+LIKED_TRACKS_LOCAL_CACHE_SECONDS = 5
+
+# Cached card fragments (core.cards); bump the version when card markup changes
+CARD_CACHE_SECONDS = 3600
+CARD_CACHE_VERSION = 1
+
+# Per-request SQL budgets (core.perf); over-budget requests are logged and
+# listed at /adminxy/perf/. Off unless PERF_MONITORING=1. Override per
+# view name, e.g. PERF_VIEW_BUDGETS = {'admin_dashboard': {'queries': 60}}
+PERF_MONITORING = os.getenv('PERF_MONITORING') == '1'
+PERF_QUERY_BUDGET = 30
+PERF_SQL_TIME_BUDGET_MS = 200
+PERF_REPEATED_QUERY_THRESHOLD = 5
+PERF_VIEW_BUDGETS = {}
+
+# Write-behind counters (downloads, blog views), flushed by a thread per worker
+COUNTER_FLUSH_INTERVAL = 10  # seconds between batched flushes
+COUNTER_FLUSH_THRESHOLD = 100  # flush early once this many rows are buffered
+COUNTER_SNAPSHOT_REFRESH_SECONDS = 300  # most often download counts mark the homepage stale
+
 # OTP settings
 OTP_LENGTH = 6
 OTP_TIMEOUT = 300  # 5 minutes in seconds
@@ -190,6 +272,39 @@ SESSION_COOKIE_HTTPONLY = True
 
 PAYCHANGU_API_KEY = os.getenv('PAYCHANGU_API_KEY', 'sec-live-69uprGlRXNWAas30ojzLIB5RF5tdcmma')
 
+# Point at `manage.py paychangu_stub` (http://127.0.0.1:8765) for offline load tests
+PAYCHANGU_API_URL = os.getenv('PAYCHANGU_API_URL', 'https://api.paychangu.com')
+# Kept-alive connections per process, and per-endpoint timeouts in seconds
+PAYCHANGU_POOL_SIZE = 20
+PAYCHANGU_INITIALIZE_TIMEOUT = 15
+
+# Operator list: fresh for the TTL, then served stale while it refreshes in
+# the background; the breaker fails fast while the provider is down
+PAYCHANGU_OPERATORS_TTL = 600
+PAYCHANGU_OPERATORS_STALE_SECONDS = 86400
+PAYCHANGU_OPERATORS_TIMEOUT = 5
+PAYCHANGU_BREAKER_FAILURES = 5
+PAYCHANGU_BREAKER_RESET_SECONDS = 30
+PAYCHANGU_VERIFY_TIMEOUT = 10
+
+# Webhook signing secret from the PayChangu dashboard; unsigned webhooks are
+# re-verified against the API. reconcile_payments verifies pending charges
+# older than RECONCILE_AFTER, up to RECONCILE_MAX_AGE. Keep RECONCILE_AFTER
+# above PAYCHANGU_INITIALIZE_TIMEOUT: a charge the provider has never heard
+# of by then is marked failed.
+PAYCHANGU_WEBHOOK_SECRET = os.getenv('PAYCHANGU_WEBHOOK_SECRET', '')
+PAYCHANGU_RECONCILE_AFTER_SECONDS = 60
+PAYCHANGU_RECONCILE_MAX_AGE_HOURS = 48
+PAYCHANGU_RECONCILE_INTERVAL_SECONDS = 60
+
+# Payment status push (server-sent events, needs an ASGI server). Set
+# EVENTS_BROKER_URL to a Redis URL when running more than one process;
+# without it, results from other processes arrive on the next heartbeat,
+# when each stream re-reads its transaction.
+EVENTS_BROKER_URL = os.getenv('EVENTS_BROKER_URL', os.getenv('REDIS_URL', ''))
+PAYMENT_EVENTS_TIMEOUT = 300
+PAYMENT_EVENTS_HEARTBEAT_SECONDS = 15
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,